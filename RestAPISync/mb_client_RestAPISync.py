@@ -6,23 +6,28 @@ SYNCHRONOUS MODBUS REST API
 version {0}
 
 Web API to serve the read and write methods of the MODBUSClient class.
-Implements a locking mechanism for each
-device, such that reader and writer can not be invoked simulaneously.
+Readouts and writes are served from the threadpool, the requests of each
+device are queued by its scheduler, writes ahead of reads. Writes to a device
+are serialized by its client.
 """
 
-from fastapi import HTTPException, FastAPI, Path, Body
+from fastapi import HTTPException, FastAPI, Path, Body, Query
 from fastapi.responses import JSONResponse
 import logging
 import argparse
 import os
+import json
 import uvicorn
-from typing import Dict
+from threading import Lock
+from typing import Dict, List
 from distutils.util import strtobool
 from enum import Enum
-from typing import Annotated
+from typing import Annotated, Literal
 # internal
-from modbusClientSync import (MODBUSClientSync, LockGroup, MyException,
-                              __version__)
+from modbusClientSync import (MODBUSClientSync, MyException, device_class,
+                              device_profile, breaker_states, Exporter,
+                              Historian, trace_path, SnapshotReader,
+                              CONFIG_DIR, __version__)
 
 """
 version history:
@@ -39,24 +44,103 @@ henceforth version history of modbusClient adopted
 
 print(__doc__.format(__version__))
 
-hosts = os.getenv("SERVERHOST")
+
+def host_configs(
+        hosts: str | None,
+        server_configs: str | None
+) -> Dict[str, str | None]:
+    """
+    map each host to the config file of its device class. Hosts not listed
+    in server_configs are served by the config file found in configFiles/.
+    Devices behind a gateway are addressed as host[:port]/unit, all unit ids
+    of a gateway share one connection
+    :param hosts: comma separated list of hosts
+    :param server_configs: JSON {host: config file} or path to such JSON file,
+    relative config paths are taken relative to that file, or to configFiles/
+    if given inline
+    :return: Dict {host: config file | None}
+    """
+    configs: Dict = dict()
+    if server_configs:
+        if os.path.isfile(server_configs):
+            base = os.path.dirname(os.path.realpath(server_configs))
+            with open(server_configs) as f:
+                configs = json.load(f)
+        else:  # independent of the working directory the API started in
+            base = CONFIG_DIR
+            configs = json.loads(server_configs)
+        configs = {
+            host.strip(): os.path.normpath(os.path.join(base, config))
+            for host, config in configs.items()
+        }
+    if hosts:
+        for host in hosts.split(","):
+            configs.setdefault(host.strip(), None)
+
+    return configs
+
+
+hosts = host_configs(hosts=os.getenv("SERVERHOST"),
+                     server_configs=os.getenv("SERVERCONFIGS"))
 port = int(os.environ.get('SERVERPORT'))
 debug = strtobool(os.environ.get('Debug')) \
     if os.environ.get('Debug') else None
+config_cache_dir = os.environ.get('ConfigCacheDir')
+timeout_connect = float(os.environ.get('TimeoutConnect')) \
+    if os.environ.get('TimeoutConnect') else None
+timeout_min = float(os.environ.get('TimeoutMin')) \
+    if os.environ.get('TimeoutMin') else None
+timeout_max = float(os.environ.get('TimeoutMax')) \
+    if os.environ.get('TimeoutMax') else None
+max_rate = float(os.environ.get('MaxRate')) \
+    if os.environ.get('MaxRate') else None
+concurrency = int(os.environ.get('Concurrency')) \
+    if os.environ.get('Concurrency') else None
+record_dir = os.environ.get('RecordDir')
+replay_dir = os.environ.get('ReplayDir')
+replay_speed = float(os.environ.get('ReplaySpeed')) \
+    if os.environ.get('ReplaySpeed') else None
+historian_dir = os.environ.get('HistorianDir')
+historian_retention = float(os.environ.get('HistorianRetention')) \
+    if os.environ.get('HistorianRetention') else None
+write_window = float(os.environ.get('WriteWindow')) \
+    if os.environ.get('WriteWindow') else None
+skip_unchanged = strtobool(os.environ.get('SkipUnchanged')) \
+    if os.environ.get('SkipUnchanged') else None
+slow_cycle = int(os.environ.get('SlowCycle')) \
+    if os.environ.get('SlowCycle') else None
+breaker_threshold = int(os.environ.get('BreakerThreshold')) \
+    if os.environ.get('BreakerThreshold') else None
+breaker_probe_interval = float(os.environ.get('BreakerProbeInterval')) \
+    if os.environ.get('BreakerProbeInterval') else None
+# validate all device classes at start-up, shared by hosts of the same class
+devices = {
+    host: device_class(config_filename=config_filename,
+                       cache_dir=config_cache_dir)
+    for host, config_filename in hosts.items()
+}
 
-lock_mb_client = LockGroup()
+lock_clients = Lock()
 clients = dict()
+# readouts recorded by the thread of the exporter, not delaying requests
+historian = Historian(directory=historian_dir,
+                      retention=historian_retention) if historian_dir else None
+exporter = Exporter(sinks=[historian]) if historian else None
+# snapshots published by a poller process, shared by all workers
+snapshot_reader = SnapshotReader(name=os.environ.get('SnapshotSegment')) \
+    if os.environ.get('SnapshotSegment') else None
 
 DeviceEnum = Enum(
     "DeviceEnum",
-    {host.strip(): host for host in hosts.split(",")}
+    {host: host for host in hosts}
 )
 app = FastAPI(
     title="MODBUS API",
     version=__version__,
     description="Connects with MODBUS devices. Enables to read/write from/to "
                 "MODBUS registers. Register mappings to parameters are defined "
-                "in config files available in modbusClient/configFiles."
+                "in config files available in modbusClient/configFiles or "
+                "per host in SERVERCONFIGS."
 )
 
 
@@ -67,16 +151,57 @@ def mb_clients(host: str) -> MODBUSClientSync:
     :param host: device ip or name
     :return: MODBUSClient instance each device
     """
-    if host not in clients:
-        clients[host] = MODBUSClientSync(
-            host=host,
-            port=port,  # from environment variable
-            debug=debug  # from environment variable
-        )
+    with lock_clients:  # handlers run in the threadpool
+        if host not in clients:
+            clients[host] = MODBUSClientSync(
+                host=host,
+                port=port,  # from environment variable
+                config_filename=hosts[host],  # from environment variable
+                debug=debug,  # from environment variable
+                timeout_connect=timeout_connect,  # from environment variable
+                timeout_min=timeout_min,  # from environment variable
+                timeout_max=timeout_max,  # from environment variable
+                config_cache_dir=config_cache_dir,  # from environment variable
+                # from environment variable
+                breaker_threshold=breaker_threshold,
+                # from environment variable
+                breaker_probe_interval=breaker_probe_interval,
+                concurrency=concurrency,  # from environment variable
+                max_rate=max_rate,  # from environment variable
+                write_window=write_window,  # from environment variable
+                skip_unchanged=skip_unchanged,  # from environment variable
+                slow_cycle=slow_cycle,  # from environment variable
+                # trace files from environment variables
+                record=trace_path(directory=record_dir, host=host)
+                if record_dir else None,
+                replay=trace_path(directory=replay_dir, host=host)
+                if replay_dir else None,
+                replay_speed=replay_speed  # from environment variable
+            )
+            if exporter:
+                exporter.attach(clients[host])
 
     return clients[host]
 
 
+def raise_http_exception(e: MyException) -> None:
+    """
+    raise the HTTP exception of a MODBUS client exception, while the circuit
+    is open the last-known values are passed on
+    :param e: MyException
+    """
+    if e.content is not None:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail={"detail": e.detail,
+                    "snapshot": e.content}
+        )
+    raise HTTPException(
+        status_code=e.status_code,
+        detail=e.detail
+    )
+
+
 @app.get(
     "/modbus/hosts",
     summary="List all host names for present device class",
@@ -87,36 +212,205 @@ async def read_hosts() -> JSONResponse:
 
 
 @app.get(
-    "/modbus/read/{host}",
+    "/modbus/classes",
+    summary="List all device classes with their host names",
+    tags=["monitoring"]
+)
+async def read_classes() -> JSONResponse:
+    classes: Dict = dict()
+    for host, device in devices.items():
+        classes.setdefault(device.config_filename, []).append(host)
+    return JSONResponse(classes)
+
+
+@app.get(
+    "/modbus/breaker",
+    summary="State of the circuit breaker of each host",
+    tags=["monitoring"]
+)
+async def read_breakers() -> JSONResponse:
+    states = breaker_states()
+    return JSONResponse({
+        host: states.get(host, {"state": "closed", "failures": 0})
+        for host in hosts
+    })
+
+
+@app.get(
+    "/modbus/config/{host:path}",
+    summary="Device class config of MODBUS Device IP/Name",
+    tags=["monitoring"]
+)
+async def read_config(
+        host: Annotated[DeviceEnum, Path(
+            title="Device IP",
+            description="Device IP")
+        ]
+) -> JSONResponse:
+    return JSONResponse(devices[host.value].as_dict())
+
+
+@app.get(
+    "/modbus/rtt",
+    summary="Round-trip times and request timeout of each host addressed",
+    tags=["monitoring"]
+)
+async def read_rtt() -> JSONResponse:
+    return JSONResponse({
+        host: client.rtt for host, client in clients.items()
+    })
+
+
+@app.get(
+    "/modbus/scheduler",
+    summary="Request queues of each host addressed",
+    tags=["monitoring"]
+)
+async def read_scheduler() -> JSONResponse:
+    return JSONResponse({
+        host: client.scheduler for host, client in clients.items()
+    })
+
+
+@app.get(
+    "/modbus/profile/{host:path}",
+    summary="Read limits learned for the device class of MODBUS Device "
+            "IP/Name",
+    tags=["monitoring"]
+)
+async def read_profile(
+        host: Annotated[DeviceEnum, Path(
+            title="Device IP",
+            description="Device IP")
+        ]
+) -> JSONResponse:
+    return JSONResponse(
+        device_profile(device=devices[host.value],
+                       cache_dir=config_cache_dir).as_dict()
+    )
+
+
+@app.get(
+    "/modbus/read/{host:path}",
     summary="List values of all registers for MODBUS Device IP/Name",
     tags=["monitoring", "operations"]
 )
-async def read_register(
+def read_register(
         host: Annotated[DeviceEnum, Path(
             title="Device IP",
             description="Device IP")
-        ]
+        ],
+        deadline: Annotated[float | None, Query(
+            title="Deadline",
+            description="Seconds the readout may take at most",
+            gt=0)
+        ] = None,
+        on_error: Annotated[Literal["raise", "partial"], Query(
+            title="On Error",
+            description="raise: fail at the first register failing, "
+                        "partial: return all values acquired along with "
+                        "their quality")
+        ] = "raise"
 ) -> JSONResponse:
     try:
-        lock_mb_client(host.value).acquire()
         return JSONResponse(
-            mb_clients(host=host.value).read_register()
+            mb_clients(host=host.value).read_register(
+                deadline=deadline,
+                on_error=on_error
+            )
         )
     except MyException as e:
+        raise_http_exception(e)
+
+
+@app.get(
+    "/modbus/snapshot/{host:path}",
+    summary="Last readout of MODBUS Device IP/Name, updated by the writes "
+            "since",
+    tags=["monitoring"]
+)
+async def read_snapshot(
+        host: Annotated[DeviceEnum, Path(
+            title="Device IP",
+            description="Device IP")
+        ]
+) -> JSONResponse:
+    if snapshot_reader:
+        try:
+            snapshot = snapshot_reader.read(host=host.value)
+        except MyException as e:
+            raise_http_exception(e)
+    else:
+        snapshot = clients[host.value].snapshot \
+            if host.value in clients else None
+    if snapshot is None:
         raise HTTPException(
-            status_code=e.status_code,
-            detail=e.detail
+            status_code=404,
+            detail="No readout of MODBUS server: IP={0}".format(host.value)
+        )
+    return JSONResponse(snapshot)
+
+
+@app.get(
+    "/modbus/history/{host:path}",
+    summary="History of MODBUS Device IP/Name, optionally downsampled",
+    tags=["monitoring"]
+)
+def read_history(
+        host: Annotated[DeviceEnum, Path(
+            title="Device IP",
+            description="Device IP")
+        ],
+        parameter: Annotated[List[str] | None, Query(
+            title="Parameter",
+            description="Parameters (default: all)")
+        ] = None,
+        start: Annotated[str | None, Query(
+            title="Start",
+            description="ISO timestamp or epoch seconds (default: first "
+                        "one recorded)")
+        ] = None,
+        end: Annotated[str | None, Query(
+            title="End",
+            description="ISO timestamp or epoch seconds, excluded (default: "
+                        "now)")
+        ] = None,
+        step: Annotated[float | None, Query(
+            title="Step",
+            description="Seconds per bucket (default: no downsampling)",
+            gt=0)
+        ] = None,
+        aggregate: Annotated[Literal["mean", "min", "max", "first", "last",
+                                     "count"], Query(
+            title="Aggregate",
+            description="Aggregate of the values of a bucket")
+        ] = "mean"
+) -> JSONResponse:
+    """segments are decoded in the threadpool"""
+    if historian is None:
+        raise HTTPException(
+            status_code=404,
+            detail="No historian configured (HistorianDir)"
         )
-    finally:
-        lock_mb_client(host.value).release()
+    try:
+        return JSONResponse(
+            historian.query(host=host.value,
+                            parameters=parameter,
+                            start=start,
+                            end=end,
+                            step=step,
+                            aggregate=aggregate)
+        )
+    except MyException as e:
+        raise_http_exception(e)
 
 
 @app.put(
-    "/modbus/write/{host}",
+    "/modbus/write/{host:path}",
     summary="Write values to register(s) for MODBUS Device IP/Name",
     tags=["operations"]
 )
-async def write_register(
+def write_register(
         payload: Annotated[Dict, Body(
             title="Payload",
             description="Data to be written into registers")
@@ -127,17 +421,11 @@ async def write_register(
         ]
 ):
     try:
-        lock_mb_client(host.value).acquire()
         return JSONResponse(
             mb_clients(host=host.value).write_register(wr=payload)
         )
     except MyException as e:
-        raise HTTPException(
-            status_code=e.status_code,
-            detail=e.detail
-        )
-    finally:
-        lock_mb_client(host.value).release()
+        raise_http_exception(e)
 
 
 @app.on_event("shutdown")
@@ -145,6 +433,8 @@ def shutdown_event():
     for items, value in clients.items():
         logging.info("Closing client for device extention: {}".format(items))
         value.close()
+    if exporter:
+        exporter.close()  # rows held by the historian written
 
 
 def main():
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MODBUS Config Precompiler
+
+Validates device class config files and stores the compiled artifacts in a
+cache directory, e.g. at image build time, such that clients constructed
+with the same cache directory skip parsing and validation.
+
+Copyright (C) 2021-23 Dr. Ralf Antonius Timmermann, Argelander Institute for
+Astronomy (AIfA), University Bonn.
+"""
+
+import sys
+import argparse
+import os
+import logging
+# internal
+if os.environ.get('PYTHONPATH') is None:
+    sys.path.append("{0}{1}".format(
+        os.path.dirname(os.path.realpath(__file__)),
+        "/../"))
+
+'''
+precompile all configs of the async client, e.g.
+python3 mb_client_precompile.py \
+--async_mode \
+--config_cache_dir /tmp/mb_config_cache \
+../DeviceClassConfigs/mb_client_config_*.json
+'''
+
+argparser = argparse.ArgumentParser(
+    description="Precompiles config files for the (A)Synchronous MODBUS Client"
+)
+argparser.add_argument(
+    'config_filenames',
+    nargs='*',
+    help="Path(s) to config file(s) (default: config file in configFiles/)"
+)
+argparser.add_argument(
+    '--config_cache_dir',
+    required=True,
+    help="Directory of the compiled configs"
+)
+argparser.add_argument(
+    '--async_mode',
+    required=False,
+    help='Compile with the asynchronous client (default: synchronous client)',
+    action="store_true"
+)
+args = argparser.parse_args()
+
+
+def main():
+    if args.async_mode:
+        from modbusClientAsync import compile_config, MyException
+    else:
+        from modbusClientSync import compile_config, MyException
+
+    for config_filename in args.config_filenames or [None]:
+        try:
+            compiled = compile_config(config_filename=config_filename,
+                                      cache_dir=args.config_cache_dir)
+        except MyException as e:
+            print("Code={0}, detail={1}".format(e.status_code,
+                                                e.detail))
+            sys.exit(1)
+        logging.info("Compiled '{0}' -> {1}".format(
+            compiled['config_filename'],
+            compiled['sha256']))
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
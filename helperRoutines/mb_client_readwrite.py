@@ -11,22 +11,24 @@ Copyright (C) 2021-23 Dr. Ralf Antonius Timmermann, Argelander Institute for
 Astronomy (AIfA), University Bonn.
 """
 
+from timeit import default_timer as timer
+_start_time = timer()
 import json
 import sys
-from timeit import default_timer as timer
 import argparse
 import os
 import asyncio
+import importlib
 import logging
-from typing import Generator
+import datetime
+import math
+from typing import Generator, Dict, List
 import re
-# internal
+# internal, the client package selected is imported on demand
 if os.environ.get('PYTHONPATH') is None:
     sys.path.append("{0}{1}".format(
         os.path.dirname(os.path.realpath(__file__)),
         "/../"))
-from modbusClientSync import MODBUSClientSync, MyException, __version__
-from modbusClientAsync import MODBUSClientAsync
 
 '''
 test writer module with, e.g.
@@ -43,8 +45,6 @@ python3 mb_client_readwrite.py \
 \"Dummy_4\": [1,0,0,1,0,0,0,1,1,1,0,1,0,1,0,1]}"
 '''
 
-print(__doc__.format(__version__))
-
 myformat = ("%(asctime)s.%(msecs)03d :: %(levelname)s: %(filename)s - "
             "%(lineno)s - %(funcName)s()\t%(message)s")
 logging.basicConfig(format=myformat,
@@ -83,8 +83,17 @@ argparser = argparse.ArgumentParser(
 )
 argparser.add_argument(
     '--host',
-    required=True,
-    help='MODBUS Server Device IP/Name',
+    required=False,
+    action='append',
+    default=[],
+    help=('MODBUS Server Device IP/Name as host[:port][/unit], repeat for '
+          'polling multiple hosts'),
+    type=str
+)
+argparser.add_argument(
+    '--hosts_file',
+    required=False,
+    help='File with one MODBUS Server Device IP/Name per line',
     type=str
 )
 argparser.add_argument(
@@ -102,9 +111,39 @@ argparser.add_argument(
 argparser.add_argument(
     '--timeout_connect',
     required=False,
-    help='Timeout Connect (default: 3 [sec])',
+    help='Timeout Connect, and of requests until the first response '
+         '(default: 3 [sec])',
     type=float,
-    choices=Range('[1, 10]')
+    choices=Range('[0.01, 60]')
+)
+argparser.add_argument(
+    '--timeout_min',
+    required=False,
+    help='Lower bound of request timeouts derived from round-trip times '
+         '(default: 0.2 [sec])',
+    type=float,
+    choices=Range('[0.001, 60]')
+)
+argparser.add_argument(
+    '--timeout_max',
+    required=False,
+    help='Upper bound of request timeouts derived from round-trip times '
+         '(default: 10 [sec])',
+    type=float,
+    choices=Range('[0.001, 60]')
+)
+argparser.add_argument(
+    '--max_rate',
+    required=False,
+    help='Requests per second sent to a device at most (default: unlimited)',
+    type=float,
+    choices=Range('[0.1, 1000]')
+)
+argparser.add_argument(
+    '--concurrency',
+    required=False,
+    help='Requests in flight per device at most (default: 4)',
+    type=int
 )
 argparser.add_argument(
     '--payload',
@@ -123,18 +162,203 @@ argparser.add_argument(
     default=None,
     help="Path to alternative config file"
 )
+argparser.add_argument(
+    '--config_cache_dir',
+    required=False,
+    default=None,
+    help="Directory of compiled config files (optional)"
+)
+argparser.add_argument(
+    '--deadline',
+    required=False,
+    help='Seconds a readout may take at most (default: unlimited)',
+    type=float
+)
+argparser.add_argument(
+    '--partial',
+    required=False,
+    help='Return all values acquired along with their quality, instead of '
+         'failing at the first register failing',
+    action="store_true"
+)
+argparser.add_argument(
+    '--interval',
+    required=False,
+    help='Polling mode: interval between readouts of all hosts [sec] '
+         '(default: 1)',
+    type=float
+)
+argparser.add_argument(
+    '--count',
+    required=False,
+    help='Polling mode: number of readouts per host (default: unlimited)',
+    type=int
+)
+argparser.add_argument(
+    '--slow_cycle',
+    required=False,
+    help='Polling mode: parameters of poll class slow are read every Nth '
+         'readout (default: 10)',
+    type=int
+)
+argparser.add_argument(
+    '--output',
+    required=False,
+    help='Polling mode: NDJSON file the readouts are appended to '
+         '(default: stdout), same as --sink <file>',
+    type=str
+)
+argparser.add_argument(
+    '--sink',
+    required=False,
+    default=[],
+    action='append',
+    help='Polling mode: sink the readouts are exported to, either stdout, '
+         'an http(s) URL (POST of NDJSON batches), or a NDJSON file, '
+         'repeatable (default: stdout)'
+)
+argparser.add_argument(
+    '--batch_size',
+    required=False,
+    help='Polling mode: records per batch exported at most (default: 100)',
+    type=int
+)
+argparser.add_argument(
+    '--batch_interval',
+    required=False,
+    help='Polling mode: seconds a record waits for its batch at most '
+         '(default: 1)',
+    type=float
+)
+argparser.add_argument(
+    '--spill_dir',
+    required=False,
+    help='Polling mode: directory records are spilled to while a sink is '
+         'unavailable, and replayed from (default: records dropped)',
+    type=str
+)
+argparser.add_argument(
+    '--historian',
+    required=False,
+    help='Polling mode: directory the readouts are recorded to by the '
+         'historian (optional)',
+    type=str
+)
+argparser.add_argument(
+    '--publish',
+    required=False,
+    help='Polling mode: shared-memory segment the latest snapshots are '
+         'published to, for readers in other processes, e.g. the RestAPI '
+         '(optional)',
+    type=str
+)
+argparser.add_argument(
+    '--record',
+    required=False,
+    help='Trace file the requests and responses are appended to, a '
+         'directory of one trace file per host if several hosts are given',
+    type=str
+)
+argparser.add_argument(
+    '--replay',
+    required=False,
+    help='Trace file (or directory, see --record) the responses are served '
+         'from in place of the device',
+    type=str
+)
+argparser.add_argument(
+    '--replay_speed',
+    required=False,
+    help='Fraction of the original speed of the responses replayed (default: '
+         'maximum speed)',
+    type=float
+)
+argparser.add_argument(
+    '--profile-startup',
+    dest='profile_startup',
+    required=False,
+    help='Report time consumed for start-up (imports & client construction)',
+    action="store_true"
+)
 args = argparser.parse_args()
+read_options = {
+    "deadline": args.deadline,
+    "on_error": "partial" if args.partial else "raise"
+}
+if args.hosts_file:
+    with open(args.hosts_file) as f:
+        args.host += [
+            line.strip() for line in f
+            if line.strip() and not line.strip().startswith("#")
+        ]
+if not args.host:
+    argparser.error("at least one of --host or --hosts_file is required")
+# polling mode: periodic readouts of all hosts over persistent connections
+polling_mode = (args.interval is not None
+                or args.count is not None
+                or len(args.host) > 1)
+if polling_mode and args.payload:
+    argparser.error("--payload is not supported in polling mode")
+startup: Dict[str, float] = {"script imports": timer() - _start_time}
+
+
+def import_client_package(async_mode: bool):
+    """
+    import only the client package selected, either modbusClientAsync or
+    modbusClientSync, since each pulls in the pymodbus client stack
+    :param async_mode: bool
+    :return: module
+    """
+    start_time = timer()
+    package = importlib.import_module(
+        "modbusClientAsync" if async_mode else "modbusClientSync"
+    )
+    startup["client package import"] = timer() - start_time
+    # keep stdout clean for NDJSON records in polling mode
+    print(__doc__.format(package.__version__),
+          file=sys.stderr if polling_mode else sys.stdout)
+
+    return package
+
+
+def trace_options(
+        package,
+        host: str
+) -> Dict:
+    """
+    trace file recorded or replayed of a host
+    :param package: module - client package
+    :param host: str
+    :return: Dict - keyword arguments of the client
+    """
+    options = {"replay_speed": args.replay_speed}
+    for option in ("record", "replay"):
+        path = getattr(args, option)
+        if path and len(set(args.host)) > 1:  # one trace per host
+            path = package.trace_path(directory=path, host=host)
+        options[option] = path
+
+    return options
 
 
-async def async_main():
+async def async_main(package):
+    MyException = package.MyException
     try:
-        mb_client = MODBUSClientAsync(
-            host=args.host,
+        start_time = timer()
+        mb_client = package.MODBUSClientAsync(
+            host=args.host[0],
             port=args.port,
             debug=args.debug,
             timeout_connect=args.timeout_connect,
-            config_filename=args.config_filename
+            timeout_min=args.timeout_min,
+            timeout_max=args.timeout_max,
+            max_rate=args.max_rate,
+            concurrency=args.concurrency,
+            config_filename=args.config_filename,
+            config_cache_dir=args.config_cache_dir,
+            **trace_options(package, args.host[0])
         )
+        startup["client construction"] = timer() - start_time
         if args.payload:
             print(json.dumps(
                 await mb_client.write_register(json.loads(args.payload)),
@@ -142,7 +366,7 @@ async def async_main():
             )
         else:
             print(json.dumps(
-                await mb_client.read_register(),
+                await mb_client.read_register(**read_options),
                 indent=2)
             )
     except MyException as e:
@@ -151,17 +375,24 @@ async def async_main():
         sys.exit(1)
 
 
-def sync_main():
-    if args.timeout_connect:
-        logging.warning("The 'timeout_connect' option has no effect on the "
-                        "syncronous reader")
+def sync_main(package):
+    MyException = package.MyException
     try:
-        mb_client = MODBUSClientSync(
-            host=args.host,
+        start_time = timer()
+        mb_client = package.MODBUSClientSync(
+            host=args.host[0],
             port=args.port,
             debug=args.debug,
-            config_filename=args.config_filename
+            timeout_connect=args.timeout_connect,
+            timeout_min=args.timeout_min,
+            timeout_max=args.timeout_max,
+            concurrency=args.concurrency,
+            max_rate=args.max_rate,
+            config_filename=args.config_filename,
+            config_cache_dir=args.config_cache_dir,
+            **trace_options(package, args.host[0])
         )
+        startup["client construction"] = timer() - start_time
         if args.payload:
             print(json.dumps(
                 mb_client.write_register(json.loads(args.payload)),
@@ -169,7 +400,7 @@ def sync_main():
             )
         else:
             print(json.dumps(
-                mb_client.read_register(),
+                mb_client.read_register(**read_options),
                 indent=2)
             )
     except MyException as e:
@@ -178,14 +409,197 @@ def sync_main():
         sys.exit(1)
 
 
+def percentile(
+        values: List[float],
+        q: float
+) -> float:
+    """
+    nearest-rank percentile
+    :param values: List of float, not empty
+    :param q: float - percentile between 0 and 100
+    :return: float
+    """
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def print_latencies(
+        latencies: Dict[str, List[float]],
+        failures: Dict[str, int],
+        rtts: Dict[str, Dict]
+) -> None:
+    """
+    report latency percentiles of the readouts and round-trip times of the
+    requests per host to stderr
+    """
+    for host, rtt in rtts.items():
+        print(("Host {0}: requests={1}, timeouts={2}, srtt={3} ms, "
+               "rttvar={4} ms, request timeout={5} ms")
+              .format(host,
+                      rtt['samples'],
+                      rtt['timeouts'],
+                      rtt.get('srtt_ms', '-'),
+                      rtt.get('rttvar_ms', '-'),
+                      rtt['timeout_ms']),
+              file=sys.stderr)
+    for host, values in latencies.items():
+        if not values:
+            print("Host {0}: readouts=0, failures={1}"
+                  .format(host, failures[host]), file=sys.stderr)
+            continue
+        print(("Host {0}: readouts={1}, failures={2}, latency p50={3:.1f} ms, "
+               "p90={4:.1f} ms, p99={5:.1f} ms, max={6:.1f} ms")
+              .format(host,
+                      len(values),
+                      failures[host],
+                      *(percentile(values, q) * 1_000
+                        for q in (50, 90, 99, 100))),
+              file=sys.stderr)
+
+
+async def poll_main(package):
+    """
+    polling mode: read all hosts concurrently every interval over persistent
+    connections and write one NDJSON record per readout
+    """
+    MyException = package.MyException
+    from pymodbus.exceptions import ModbusException  # as the client package
+    try:
+        start_time = timer()
+        mb_clients = {
+            host: package.MODBUSClientAsync(
+                host=host,
+                port=args.port,
+                debug=args.debug,
+                timeout_connect=args.timeout_connect,
+                timeout_min=args.timeout_min,
+                timeout_max=args.timeout_max,
+                max_rate=args.max_rate,
+                concurrency=args.concurrency,
+                slow_cycle=args.slow_cycle,
+                config_filename=args.config_filename,
+                config_cache_dir=args.config_cache_dir,
+                persistent=True,
+                **trace_options(package, host)
+            )
+            for host in dict.fromkeys(args.host)
+        }
+        startup["client construction"] = timer() - start_time
+    except MyException as e:
+        print("Code={0}, detail={1}".format(e.status_code,
+                                            e.detail))
+        sys.exit(1)
+    if args.profile_startup:
+        print_startup(file=sys.stderr)
+    latencies: Dict[str, List[float]] = {host: [] for host in mb_clients}
+    failures: Dict[str, int] = {host: 0 for host in mb_clients}
+    # sinks are served by threads of their own, not delaying the readouts
+    exporter = package.Exporter(
+        sinks=(args.sink + ([args.output] if args.output else [])
+               or ["stdout"])
+        + ([package.Historian(directory=args.historian)]
+           if args.historian else []),
+        batch_size=args.batch_size,
+        batch_interval=args.batch_interval,
+        spill_dir=args.spill_dir
+    )
+    publisher = package.SnapshotPublisher(name=args.publish) \
+        if args.publish else None
+    if publisher:
+        for mb_client in mb_clients.values():
+            publisher.attach(mb_client)
+
+    async def poll(
+            host: str,
+            mb_client
+    ) -> None:
+        start = timer()
+        try:
+            record = await mb_client.read_register(**read_options)
+            latencies[host].append(timer() - start)
+            exporter.submit(record)
+            return
+        except MyException as e:
+            error = {
+                "status_code": e.status_code,
+                "detail": e.detail
+            }
+        except (ModbusException, OSError, asyncio.TimeoutError) as e:
+            # not mapped by the client, polling goes on all the same
+            error = {
+                "status_code": 503,
+                "detail": "{0}: {1}".format(type(e).__name__, str(e))
+            }
+        failures[host] += 1
+        exporter.submit({
+            "timestamp": datetime.datetime.now(
+                tz=datetime.timezone.utc
+            ).isoformat(),
+            "host": host,
+            "error": error
+        })
+
+    cycle = 0
+    try:
+        while args.count is None or cycle < args.count:
+            start_cycle = timer()
+            await asyncio.gather(
+                *(poll(host, mb_client)
+                  for host, mb_client in mb_clients.items())
+            )
+            cycle += 1
+            if args.count is None or cycle < args.count:
+                await asyncio.sleep(
+                    max((1. if args.interval is None else args.interval)
+                        - (timer() - start_cycle), 0.)
+                )
+    finally:
+        for mb_client in mb_clients.values():
+            mb_client.close()
+        exporter.close()
+        if publisher:
+            publisher.close()  # segment kept for its readers
+        print_latencies(latencies=latencies,
+                        failures=failures,
+                        rtts={host: mb_client.rtt
+                              for host, mb_client in mb_clients.items()})
+        for name, stats in exporter.stats.items():
+            print("Sink {0}: sent={1}, spilled={2}, dropped={3}, failures={4}"
+                  .format(name, stats['sent'], stats['spilled'],
+                          stats['dropped'], stats['failures']),
+                  file=sys.stderr)
+
+
+def print_startup(file=sys.stdout) -> None:
+    """
+    report start-up time, i.e. until the client is ready for its first request
+    """
+    for item, consumed in startup.items():
+        print("Start-up time consumed for {0}: {1:.1f} ms"
+              .format(item, consumed * 1_000), file=file)
+    print("Start-up time consumed in total: {0:.1f} ms"
+          .format(sum(startup.values()) * 1_000), file=file)
+
+
 if __name__ == '__main__':
-    _start_time = timer()
+    client_package = import_client_package(
+        async_mode=args.async_mode or polling_mode
+    )
+    if polling_mode:
+        try:
+            asyncio.run(poll_main(client_package))
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+    _process_time = timer()
     if args.async_mode:
-        asyncio.run(async_main())
+        asyncio.run(async_main(client_package))
     else:
-        sync_main()
+        sync_main(client_package)
+    if args.profile_startup:
+        print_startup()
     print("Time consumed to process {1}ynchronous MODBUS interface: {0:.1f} ms"
           .format(
-              (timer() - _start_time) * 1_000,
+              (timer() - _process_time) * 1_000,
               "As" if args.async_mode else "S"))
     sys.exit(0)
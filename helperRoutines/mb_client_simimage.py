@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MODBUS Simulator Image Generator
+
+Encodes typed values into the registers of a device class config, honouring
+function, endianness, multiplier/offset, byte positions, and string widths,
+and emits a configuration for the server simulator plus the readout expected
+from the client.
+
+Copyright (C) 2021-23 Dr. Ralf Antonius Timmermann, Argelander Institute for
+Astronomy (AIfA), University Bonn.
+"""
+
+import sys
+import argparse
+import os
+import json
+import logging
+import struct
+from array import array
+from typing import Dict, List, Tuple, Any
+from pymodbus.payload import BinaryPayloadBuilder
+# internal
+if os.environ.get('PYTHONPATH') is None:
+    sys.path.append("{0}{1}".format(
+        os.path.dirname(os.path.realpath(__file__)),
+        "/../"))
+from modbusClientAsync import device_class, MyException
+from modbusClientAsync.src.mb_client_core_async import FEATURE_EXCLUDE_SET
+from modbusClientAsync.src.mb_client_enums_async import MODBUS2AVRO
+
+'''
+generate a simulator config for the test device class, e.g.
+python3 mb_client_simimage.py \
+--config_filename ../DeviceClassConfigs/mb_client_config_test.json \
+--values "{\"decode_16bit_int\": -408.1}" \
+--output /tmp/sim_test
+python3 ../modbusServerSimulator/src/modbus_server.py -f /tmp/sim_test.json
+'''
+
+BLOCKS = {  # entity -> simulator block
+    '0': 'coils',
+    '1': 'discreteInput',
+    '3': 'inputRegister',
+    '4': 'holdingRegister'
+}
+
+argparser = argparse.ArgumentParser(
+    description="Generates server simulator images from device class configs"
+)
+argparser.add_argument(
+    '--config_filename',
+    required=False,
+    help="Path to config file (default: config file in configFiles/)"
+)
+argparser.add_argument(
+    '--values',
+    required=False,
+    help=("Values as JSON {\"parameter\": value, ...} or path to a JSON file "
+          "(default: defaultValue or description of the parameter)")
+)
+argparser.add_argument(
+    '--output',
+    required=True,
+    help=("Path prefix of the files created: <output>.json (simulator "
+          "config), <output>_expected.json (readout expected), and "
+          "<output>_<block>.img with --images")
+)
+argparser.add_argument(
+    '--images',
+    required=False,
+    help='Write register blocks as binary images (default: JSON)',
+    action="store_true"
+)
+argparser.add_argument(
+    '--server_config',
+    required=False,
+    default="{0}/../modbusServerSimulator/src/modbus_server.json".format(
+        os.path.dirname(os.path.realpath(__file__))),
+    help="Simulator config the server section is taken from"
+)
+argparser.add_argument(
+    '--host',
+    required=False,
+    help="Listener address of the simulator (default: from server config)"
+)
+argparser.add_argument(
+    '--port',
+    required=False,
+    type=int,
+    help="Listener port of the simulator (default: from server config)"
+)
+args = argparser.parse_args()
+
+
+def load_values(values: str | None) -> Dict[str, Any]:
+    """
+    explicit values, either inline JSON or path to a JSON file
+    :param values: str
+    :return: Dict {parameter: value}
+    """
+    if not values:
+        return dict()
+    if os.path.isfile(values):
+        with open(values) as f:
+            return json.load(f)
+    return json.loads(values)
+
+
+def raw_value(
+        value: Any,
+        function: str,
+        attributes: Dict[str, Any],
+        no_bytes: int
+) -> Any:
+    """
+    convert a typed value into the raw value of the register(s), the inverse
+    of the decoding applied by the client
+    :param value: Any - typed value, as in the readout
+    :param function: str - decoding function, None for coils and discrete
+        inputs
+    :param attributes: Dict - features of the register in the mapping
+    :param no_bytes: int - no of bytes of the register(s)
+    :return: raw value, None if value is not representable
+    """
+    maps = attributes.get('map')
+    if function is None:  # coil or discrete input
+        if isinstance(value, bool) or value in (0, 1):
+            return bool(value)
+        if isinstance(value, str) and value.upper() in ("TRUE", "FALSE"):
+            return value.upper() == "TRUE"
+        return None
+    if function == "decode_bits":
+        if isinstance(value, int) and 0 <= value <= 0xFF:
+            return [bool(value >> i & 1) for i in range(8)]
+        if isinstance(value, list) and len(value) <= 8:
+            return [bool(v) for v in value] + [False] * (8 - len(value))
+        if isinstance(value, dict) and maps:  # {map value: bool}
+            bits = [False] * 8
+            for k, v in maps.items():
+                bits[k.split("0b")[1][::-1].index('1')] = bool(value.get(v))
+            return bits
+        return None
+    if function == "decode_string":
+        if not isinstance(value, str) or not value.isprintable():
+            return None
+        return value[:no_bytes]
+    if maps and isinstance(value, str) and value in maps.values():
+        value = next(k for k, v in maps.items() if v == value)
+    if isinstance(value, bool):
+        return None
+    if not isinstance(value, int):  # keep integers exact, e.g. 64 bit
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return None
+    if "float" in function:
+        return float(value)
+    if not maps and ('multiplier' in attributes or 'offset' in attributes):
+        # multiplier and offset are applied if no map defined
+        value = ((value - attributes.get('offset', 0))
+                 / attributes.get('multiplier', 1))
+    return int(round(value))
+
+
+def encode(
+        raw: Any,
+        function: str,
+        endianness: Dict[str, str],
+        reg_info: Dict[str, int]
+) -> List[int]:
+    """
+    encode a raw value into registers, bytes of a register not occupied are 0
+    :param raw: Any - see raw_value
+    :param function: str - decoding function
+    :param endianness: Dict - byteorder and wordorder
+    :param reg_info: Dict - see _DeviceClass.register_info
+    :return: List of 16-bit registers
+    """
+    builder = BinaryPayloadBuilder(byteorder=endianness['byteorder'],
+                                   wordorder=endianness['wordorder'])
+    if function == "decode_string":
+        raw = raw + "\x00" * (reg_info['no_bytes'] - len(raw))
+    getattr(builder, function.replace("decode_", "add_"))(raw)
+    registers = builder.to_registers()
+    if reg_info['pos_byte'] == 2:  # minor byte: key="xxxxx/2"
+        registers = [registers[0] >> 8]
+    return registers
+
+
+def generate(
+        device,
+        values: Dict[str, Any]
+) -> Tuple[Dict[str, array], List[Dict[str, Any]]]:
+    """
+    encode the values of all parameters of a device class into register
+    blocks, starting at address 0
+    :param device: _DeviceClass
+    :param values: Dict - explicit values {parameter: value}
+    :return: Tuple - values by simulator block, readout expected
+    """
+    unknown = set(values) - set(device.parameters)
+    if unknown:
+        raise MyException(
+            status_code=422,
+            detail="Parameter {0} not mapped to register".format(
+                ", ".join("'{}'".format(p) for p in sorted(unknown))))
+    blocks = {block: array('B' if entity in '01' else 'H')
+              for entity, block in BLOCKS.items()}
+    expected: Dict[str, List[Dict[str, Any]]] = dict()
+    for register, attributes in device.mapping.items():
+        reg_info = device.register_info(register)
+        function = attributes.get('function')
+        parameter = attributes['parameter']
+        raw = None
+        if parameter in values:
+            raw = raw_value(values[parameter], function, attributes,
+                            reg_info['no_bytes'])
+            if raw is None:
+                raise MyException(
+                    status_code=422,
+                    detail="Value '{0}' not representable for parameter "
+                           "'{1}'".format(values[parameter], parameter))
+        for feature in ('defaultValue', 'description'):
+            if raw is None and feature in attributes:
+                raw = raw_value(attributes[feature], function, attributes,
+                                reg_info['no_bytes'])
+        if raw is None:  # neutral value, first entry of a map if defined
+            neutral = "" if function == "decode_string" else 0
+            if attributes.get('map') and function != "decode_bits":
+                neutral = next(iter(attributes['map'].values()))
+            raw = raw_value(neutral, function, attributes,
+                            reg_info['no_bytes'])
+        logging.debug("{0} ({1}): {2}".format(register, parameter, raw))
+        expected[register] = expected_items(attributes=attributes, raw=raw)
+
+        block = blocks[BLOCKS[register[0]]]
+        if register[0] in '01':
+            registers = [int(raw)]
+        else:
+            try:
+                registers = encode(raw, function, device.endianness, reg_info)
+            except Exception as e:
+                raise MyException(
+                    status_code=422,
+                    detail="Error encoding parameter '{0}': {1}".format(
+                        parameter, str(e)))
+        start = reg_info['start']
+        end = start + len(registers)
+        if end > len(block):
+            block.extend([0] * (end - len(block)))
+        for i, value in enumerate(registers):  # bytes of a register shared
+            block[start + i] |= value
+
+    return blocks, [
+        item for entity in BLOCKS
+        for register in device.register_maps(entity)
+        for item in expected[register]
+    ]
+
+
+def expected_items(
+        attributes: Dict[str, Any],
+        raw: Any
+) -> List[Dict[str, Any]]:
+    """
+    items of a register expected in the readout, derived from the raw value
+    encoded rather than decoded from the registers, such that the readout
+    of the client is checked against an independent reference
+    :param attributes: Dict - features of the register in the mapping
+    :param raw: Any - see raw_value
+    :return: List of Dict - as "data" of read_register
+    """
+    function = attributes.get('function')
+    maps = attributes.get('map')
+    optional = {k: v for k, v in attributes.items()
+                if k not in FEATURE_EXCLUDE_SET}
+    if function is None:  # coil or discrete input
+        return [optional | {"datatype": "boolean", "value": raw}]
+    datatype = MODBUS2AVRO(function).datatype
+    if function == "decode_bits":  # bit n of the map key is set
+        return [
+            {
+                "parameter": attributes['parameter'],
+                "value": raw[k.split("0b")[1][::-1].index('1')],
+                "datatype": datatype
+            } | (optional | {"value_alt": v} if len(maps) == 1 else
+                 {"parameter_alt": v} | {
+                     k: attributes[k] for k in ('description', 'alias')
+                     if k in attributes})
+            for k, v in maps.items()
+        ]
+    value = raw
+    if function == "decode_string":  # padding not printable
+        value = "".join(c for c in raw if c.isprintable())
+    elif "16bit_float" in function:  # precision of the registers
+        value = struct.unpack("<e", struct.pack("<e", raw))[0]
+    elif "32bit_float" in function:
+        value = struct.unpack("<f", struct.pack("<f", raw))[0]
+    elif datatype in ['int', 'long'] and not maps:
+        value = (raw * attributes.get('multiplier', 1)
+                 + attributes.get('offset', 0))
+        if isinstance(value, float):
+            datatype = "float"
+    item = {"value": value, "datatype": datatype}
+    if maps is not None:
+        item["value_alt"] = maps.get(str(round(value)),
+                                     "corresponding value not found in map")
+    item.update({k: attributes[k] for k in ('min', 'max') if k in attributes})
+
+    return [item | optional]
+
+
+def main():
+    try:
+        device = device_class(config_filename=args.config_filename)
+        blocks, expected = generate(device=device,
+                                    values=load_values(args.values))
+    except MyException as e:
+        print("Code={0}, detail={1}".format(e.status_code, e.detail))
+        sys.exit(1)
+
+    registers = {
+        "description": "generated from {0}".format(device.config_filename),
+        "zeroMode": True,
+        "initializeUndefinedRegisters": False
+    }
+    if args.images:
+        registers["images"] = dict()
+        for block, values in blocks.items():
+            registers[block] = dict()
+            if not values:
+                continue
+            filename = "{0}_{1}.img".format(args.output, block)
+            if values.typecode == 'H' and sys.byteorder == 'little':
+                values = array('H', values)
+                values.byteswap()  # 16 bit big-endian words
+            with open(filename, "wb") as f:
+                f.write(values.tobytes())
+            registers["images"][block] = os.path.basename(filename)
+    else:  # only addresses mapped
+        for entity, block in BLOCKS.items():
+            registers[block] = {
+                str(start): "0x{0:X}".format(blocks[block][start])
+                if entity in '01'
+                else "0x{0:04X}".format(blocks[block][start])
+                for start in sorted({
+                    device.register_info(register)['start'] + i
+                    for register in device.register_maps(entity)
+                    for i in range(device.register_info(register)['width'])
+                })
+            }
+
+    with open(args.server_config, encoding='utf-8') as f:
+        server_config = json.load(f)
+    server = server_config['server']
+    if args.host:
+        server['listenerAddress'] = args.host
+    if args.port:
+        server['listenerPort'] = args.port
+    with open("{0}.json".format(args.output), "w") as f:
+        json.dump({"server": server, "registers": registers}, f, indent=2)
+    with open("{0}_expected.json".format(args.output), "w") as f:
+        json.dump(expected, f, indent=2)
+    logging.info("Simulator config '{0}.json', readout expected '{0}"
+                 "_expected.json'".format(args.output))
+
+
+if __name__ == '__main__':
+    main()
+    sys.exit(0)
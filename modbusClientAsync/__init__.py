@@ -1,4 +1,29 @@
 from .src.mb_client_async import MODBUSClientAsync
 from .src.mb_client_async import __version__, __author__, __copyright__, \
     __credits__, __license__, __maintainer__, __email__, __status__
-from .src.mb_client_aux_async import LockGroup, MyException
+from .src.mb_client_aux_async import (LockGroup, MyException, breaker_states,
+                                     CONFIG_DIR)
+from .src.mb_client_config_async import (compile_config, device_class,
+                                        device_profile)
+import importlib
+
+# imported on first access only, a client reading once (e.g. the CLI) needs
+# neither exporter, historian, traces nor shared memory
+_LAZY = {
+    **dict.fromkeys(("Exporter", "Sink", "StdoutSink", "NDJSONSink",
+                     "HTTPSink"), ".src.mb_client_export_async"),
+    "Historian": ".src.mb_client_historian_async",
+    **dict.fromkeys(("ReplayClient", "trace_records", "trace_path"),
+                    ".src.mb_client_trace_async"),
+    **dict.fromkeys(("SnapshotPublisher", "SnapshotReader"),
+                    ".src.mb_client_shm_async"),
+}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY:
+        raise AttributeError("module '{0}' has no attribute '{1}'"
+                             .format(__name__, name))
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
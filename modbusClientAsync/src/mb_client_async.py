@@ -12,15 +12,21 @@ Argelander Institute for Astronomy (AIfA), University Bonn.
 
 from pymodbus.client import AsyncModbusTcpClient
 import asyncio
-import re
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, Callable
 import datetime
+import time
 # internal
-from .mb_client_core_async import _ObjectTypeAsync, FEATURE_ALLOWED_SET
-from .mb_client_aux_async import (_client_config, _throw_error, mytimer,
-                                  MyException, defined_kwargs)
-from .mb_client_enums_async import MODBUS2AVRO
+from .mb_client_core_async import (_ObjectTypeAsync, ON_ERROR_SET,
+                                   QUALITY_GOOD)
+from .mb_client_aux_async import (_throw_error, mytimer, MyException,
+                                  defined_kwargs, _parse_host, _breaker,
+                                  _breakers, _Registry, _running_loop,
+                                  STATUS_CIRCUIT_OPEN, _RoundTripTimer,
+                                  _Scheduler, _caller, _WriteCoalescer,
+                                  _same_value)
+from .mb_client_config_async import device_class, device_profile, _PollCache
+from .mb_client_trace_async import ReplayClient, _RecordingClient
 
 """
 change history
@@ -137,6 +143,146 @@ logging.basicConfig(format=myformat,
                     datefmt="%Y-%m-%d %H:%M:%S")
 
 
+class _GatewayAsync(object):
+    """
+    connection to a MODBUS TCP server or gateway, shared by the clients of
+    all unit ids behind it. The connection is closed when no request is in
+    progress, unless a persistent client holds it open. Request timeouts
+    are derived from the round-trip times of the gateway, and all requests
+    pass its scheduler
+    """
+
+    def __init__(
+            self,
+            host: str,
+            port: int = None,
+            debug: bool = None,
+            timeout_connect: float = None,
+            timeout_min: float = None,
+            timeout_max: float = None,
+            concurrency: int = None,
+            max_rate: float = None,
+            record: str = None,
+            replay: str = None,
+            replay_speed: float = None
+    ):
+        if replay:  # responses served from a trace, without socket
+            self.client = ReplayClient(path=replay, speed=replay_speed)
+        else:
+            # requests are timed out by the clients, one attempt each
+            self.client = AsyncModbusTcpClient(
+                host=host,
+                retries=0,
+                **defined_kwargs(port=port,
+                                 debug=debug),
+            )
+        if record:
+            self.client = _RecordingClient(client=self.client, path=record)
+        if timeout_connect:
+            self.client.comm_params.timeout_connect = timeout_connect
+        self.__timeout_connect = self.client.comm_params.timeout_connect
+        self.rtt = _RoundTripTimer(initial=timeout_connect,
+                                   timeout_min=timeout_min,
+                                   timeout_max=timeout_max)
+        self.scheduler = _Scheduler(concurrency=concurrency,
+                                    max_rate=max_rate)
+        self.__lock: asyncio.Lock | None = None
+        self.__requests = 0  # requests in progress
+        self.__persistent = 0  # persistent clients
+
+    def hold(self) -> None:
+        """a persistent client holds the connection open"""
+        self.__persistent += 1
+
+    def unhold(self) -> None:
+        """a persistent client releases the connection"""
+        self.__persistent -= 1
+        self.__close_idle()
+
+    async def connect(self) -> bool:
+        """
+        open the connection, unless already open
+        :return: bool - connected
+        """
+        self.__requests += 1
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        async with self.__lock:  # only one connection attempt at a time
+            if not self.client.connected:
+                self.client.comm_params.timeout_connect = \
+                    self.__timeout_connect
+                await self.client.connect()
+                # the client waits for a response at most this long, the
+                # timeout of each request is enforced on top of it
+                self.client.comm_params.timeout_connect = \
+                    self.rtt.timeout_max
+        return self.client.connected
+
+    def disconnect(self) -> None:
+        """end of a request"""
+        self.__requests -= 1
+        self.__close_idle()
+
+    def close(self) -> None:
+        """no client left"""
+        self.__requests = self.__persistent = 0
+        self.__close_idle()
+
+    def __close_idle(self) -> None:
+        if (self.__requests <= 0 and self.__persistent <= 0
+                and self.client.connected):
+            self.client.close()
+            logging.debug("Closing {}".format(self.client))
+
+
+# shared connections of the clients not closed, key: (event loop, host,
+# port, trace replayed)
+_gateways = _Registry(kind="Gateway")
+
+
+def _gateway(
+        host: str,
+        port: int = None,
+        debug: bool = None,
+        timeout_connect: float = None,
+        timeout_min: float = None,
+        timeout_max: float = None,
+        concurrency: int = None,
+        max_rate: float = None,
+        record: str = None,
+        replay: str = None,
+        replay_speed: float = None
+) -> _GatewayAsync:
+    """
+    return the connection shared by all unit ids behind host:port within the
+    running event loop, settings must be identical; a client constructed
+    outside of an event loop has a connection of its own
+    """
+    settings = {
+        "timeout_connect": timeout_connect,
+        "timeout_min": timeout_min,
+        "timeout_max": timeout_max,
+        "concurrency": concurrency,
+        "max_rate": max_rate,
+        "record": record,
+        "replay_speed": replay_speed
+    }
+
+    def factory() -> _GatewayAsync:
+        return _GatewayAsync(host=host,
+                             port=port,
+                             debug=debug,
+                             replay=replay,
+                             **settings)
+
+    if _running_loop() is None:
+        return factory()
+
+    return _gateways.acquire(key=(host, port, replay),
+                             settings=settings,
+                             factory=factory)
+
+
 class MODBUSClientAsync(object):
 
     def __init__(
@@ -144,44 +290,126 @@ class MODBUSClientAsync(object):
             host: str,
             *,
             port: int = None,
+            unit: int = None,
             debug: bool = None,
             timeout_connect: float = None,
-            config_filename: str = None
+            timeout_min: float = None,
+            timeout_max: float = None,
+            concurrency: int = None,
+            max_rate: float = None,
+            config_filename: str = None,
+            config_cache_dir: str = None,
+            persistent: bool = None,
+            breaker_threshold: int = None,
+            breaker_probe_interval: float = None,
+            write_window: float = None,
+            skip_unchanged: bool = None,
+            slow_cycle: int = None,
+            record: str = None,
+            replay: str = None,
+            replay_speed: float = None
     ):
         """
         initializing the async modbus client and perform integrity checks on
         mb_client_config_<device>.json:
-        :param host: device ip or name
+        :param host: device ip or name, optionally host[:port][/unit]
         :param port: device port
+        :param unit: unit id behind a gateway (default: 1)
         :param debug: debug mode (True/False)
-        :param timeout_connect: timeout for connecting to server (sec)
+        :param timeout_connect: timeout for connecting to server, and for
+        requests until the first response (sec, default: 3)
+        :param timeout_min: lower bound of the request timeout derived from
+        the round-trip times (sec, default: 0.2)
+        :param timeout_max: upper bound of the request timeout (sec,
+        default: 10)
+        :param concurrency: requests in flight per gateway (default: 4)
+        :param max_rate: requests per second per gateway (default: unlimited)
+        :param config_filename: alternative path to config file
+        :param config_cache_dir: directory of compiled configs and device
+        profiles (optional)
+        :param persistent: keep the connection open between requests, until
+        close is invoked (default: False)
+        :param breaker_threshold: consecutive connection failures, after which
+        calls to the host fail fast (default: None, i.e. never)
+        :param breaker_probe_interval: seconds until a call is let through
+        again to probe the host (default: 30)
+        :param write_window: seconds writes are collected before written at
+        once, the last value of a parameter wins (default: None, i.e. written
+        at once)
+        :param skip_unchanged: skip writes equal to the last-known value of
+        the parameter (default: False)
+        :param slow_cycle: parameters of poll class slow are read every Nth
+        readout (default: 10)
+        :param record: trace file the requests and responses are appended to
+        (optional)
+        :param replay: trace file the responses are served from in place of
+        the device (optional)
+        :param replay_speed: fraction of the original speed of the responses
+        replayed (default: None, i.e. maximum speed)
         """
         logging.getLogger().setLevel(
             getattr(logging,
                     "DEBUG" if debug else "INFO")
         )
         self._ip = host
-        client_config = _client_config(config_filename=config_filename)
-
-        # integrity checks
-        self.__client_mapping_checks(mapping=client_config['mapping'])
+        address, host_port, host_unit = _parse_host(host)
+        self.__persistent = persistent
+        # immutable device class model, shared by all hosts of that class
+        self.__device = device_class(config_filename=config_filename,
+                                     cache_dir=config_cache_dir)
+        # last readout of this host
+        self.__snapshot: Dict[str, Any] | None = None
+        # registers written since the readout started: {register: (items,
+        # since)}, superseding the values read
+        self.__written: Dict[str, Tuple[List, float]] = dict()
+        # callbacks notified of each update of the snapshot
+        self.__subscribers: List[Callable] = list()
+        # values of parameters not read on every readout
+        self.__poll = _PollCache(device=self.__device, slow_cycle=slow_cycle)
+        # last-known value of parameters: {parameter: (value, since)}
+        self.__last_known: Dict[str, Tuple[Any, float]] = dict()
+        self.__skip_unchanged = skip_unchanged
+        self.__coalescer = _WriteCoalescer(window=write_window) \
+            if write_window else None
 
-        self.__client = AsyncModbusTcpClient(
-            host=self._ip,
-            **defined_kwargs(port=port,
-                             debug=debug),
-        )
-        if timeout_connect:
-            self.__client.comm_params.timeout_connect = timeout_connect
+        # one connection per gateway, shared by all of its unit ids
+        self.__gateway = _gateway(host=address,
+                                  port=host_port or port,
+                                  debug=debug,
+                                  timeout_connect=timeout_connect,
+                                  timeout_min=timeout_min,
+                                  timeout_max=timeout_max,
+                                  concurrency=concurrency,
+                                  max_rate=max_rate,
+                                  record=record,
+                                  replay=replay,
+                                  replay_speed=replay_speed)
+        self.__client = self.__gateway.client
+        self.__closed = False
+        if self.__persistent:
+            self.__gateway.hold()
+        # circuit breaker of the host, shared by its clients
+        try:
+            self.__breaker = _breaker(host=self._ip,
+                                      threshold=breaker_threshold,
+                                      probe_interval=breaker_probe_interval)
+        except MyException:
+            if self.__persistent:
+                self.__gateway.unhold()
+            _gateways.release(self.__gateway)
+            raise
 
         self.__init = {
             "client": self.__client,
-            "mapping": client_config['mapping'],
-            # if endianness not found, apply default:
-            # "byteorder": Endian.Little, "wordorder": Endian.Big
-            "endianness": client_config.get("endianness",
-                                            {"byteorder": "<",
-                                             "wordorder": ">"})
+            "device": self.__device,
+            "unit": next(u for u in (host_unit, unit, 0x1) if u is not None),
+            # read limits learned, shared among the hosts of a device class
+            "profile": device_profile(device=self.__device,
+                                      cache_dir=config_cache_dir),
+            # round-trip times, shared among the unit ids of a gateway
+            "rtt": self.__gateway.rtt,
+            # request queue, shared among the unit ids of a gateway
+            "scheduler": self.__gateway.scheduler
         }
         # initialize _ObjectType objects for each entity
         self.__entity_list: List = []
@@ -193,6 +421,45 @@ class MODBUSClientAsync(object):
                 )
             )
 
+    @property
+    def device(self):
+        """shared device class model"""
+        return self.__device
+
+    @property
+    def snapshot(self) -> Dict[str, Any] | None:
+        """last readout of this host, None if not read yet"""
+        return self.__snapshot
+
+    @property
+    def rtt(self) -> Dict[str, Any]:
+        """round-trip times and request timeout of this host"""
+        return self.__gateway.rtt.as_dict()
+
+    @property
+    def scheduler(self) -> Dict[str, Any]:
+        """request queue of this host"""
+        return self.__gateway.scheduler.as_dict()
+
+    @property
+    def breaker(self) -> Dict[str, Any]:
+        """state of the circuit breaker of this host"""
+        return self.__breaker.as_dict()
+
+    def __circuit_open(self, snapshot: bool = False) -> None:
+        """
+        fail fast while the circuit of the host is open
+        :param snapshot: bool - pass on the last-known values, if available
+        """
+        raise MyException(
+            status_code=STATUS_CIRCUIT_OPEN,
+            detail="Circuit open for MODBUS server: IP={0}, {1}".format(
+                self._ip,
+                "last-known values returned" if snapshot and self.__snapshot
+                else "no values available"),
+            content=self.__snapshot if snapshot else None
+        )
+
     def __existance_mapping_checks(
             self,
             wr: Dict
@@ -205,137 +472,272 @@ class MODBUSClientAsync(object):
         parms: List = []
         text = "Parameter {0} not mapped to register"
         for parameter in wr.keys():
-            for attributes in self.__init['mapping'].values():
-                if attributes['parameter'] == parameter:
-                    break
-            else:
+            if parameter not in self.__device.parameters:
                 parms.append("'{}'".format(parameter))
         if parms:
             return text.format(", ".join(parms))
 
         return ""
 
-    @staticmethod
-    def __client_mapping_checks(mapping: Dict) -> None:
-        """
-        perform checks on the client mapping: parameter must not be duplicate,
-        available features must be taken from README.md
-        :param mapping: Dict
-        :return:
-        """
-
-        # start nested functions
-        def check_register_integrity() -> None:
-            """
-            check registry integrity of dictionary keys in mapping file
-            key formate, e.g. '0xxxx', '3xxxx/3xxxx', or '4xxxx/y,
-            where x=0000-9999 and y=1|2
-            """
-            msg = "Wrong register in mapping: {0}".format(register)
-            if not re.match(r"^[0134][0-9]{4}(/([12]|[0134][0-9]{4}))?$",
-                            register):
-                _throw_error(msg, 422)
-            comp = register.split("/")
-            if len(comp) == 2:
-                if (comp[1] not in ["1", "2"]
-                    and (comp[0][0] != comp[1][0]  # same register class
-                         or int(comp[1]) - int(comp[0]) < 1)):  # ascending
-                    _throw_error(msg, 422)
-
-        def check_feature_integrity() -> None:
-            if feature not in FEATURE_ALLOWED_SET:
-                _throw_error(("Feature '{1}' in register '{0}' is not supported"
-                              .format(register, feature)), 422)
-            if re.match("(min|max)", feature):  # check features min or max
-                if not re.match("(int|long|float|double)", datatype):
-                    _throw_error(("Feature min or max not permitted for "
-                                  "register '{0}'".format(register)), 422)
-                if type(v) not in (int, float):
-                    _throw_error(("Feature '{1}' in register '{0}' is not "
-                                  "numerical".format(register, feature)), 422)
-            if re.match("map", feature):  # check feature map
-                if re.match("boolean", datatype):
-                    for binarystring in v.keys():
-                        if not re.match(r"^0b(?=[01]{8}$)(?=[^1]*1[^1]*$)",
-                                        binarystring):
-                            _throw_error("Binary string error in map for "
-                                         "register '{0}'".format(register),
-                                         422)
-
-        def function_available() -> str:
-            function = "decode_bits"
-            if register[0] in ['3', '4']:  # discrete input or holding
-                try:
-                    function = value['function']
-                    return MODBUS2AVRO(function).datatype
-                except ValueError:
-                    _throw_error(("Decoding function '{0}' not defined for "
-                                  "register '{1}'").format(function,
-                                                           register), 422)
-                except KeyError:
-                    _throw_error(("Decoding function not provided for "
-                                  "register '{0}'").format(register), 422)
-            return MODBUS2AVRO(function).datatype  # coil & input register
-
-        def parameter_available() -> str:
-            try:
-                return value["parameter"]
-            except KeyError:
-                _throw_error(("Feature parameter missing for register '{0}'"
-                              .format(register)), 422)
-
-        def seek_parameter_duplicate() -> None:
-            parameter_duplicate = [
-                reg for reg, parm in rev_dict.items() if len(parm) > 1
-            ]
-            if parameter_duplicate:
-                _throw_error(("Duplicate parameter '{0}'"
-                              .format(", ".join(parameter_duplicate))), 422)
-        # end nested functions
-
-        rev_dict: Dict = {}
-        for register, value in mapping.items():
-            check_register_integrity()
-            parameter = parameter_available()
-            rev_dict.setdefault(parameter, set()).add(register)
-            datatype = function_available()
-            for feature, v in value.items():  # investigate features
-                check_feature_integrity()
-        seek_parameter_duplicate()
-
-    @mytimer
-    async def read_register(self) -> Dict[str, Any]:
+    async def __connect(self) -> None:
         """
-        invoke the read all mapped registers for monitoring
-        :return: List of Dict for housekeeping
+        connect to the MODBUS server, unless the shared connection is open
         """
-        await self.__client.connect()
-        if not self.__client.connected:
+        if not await self.__gateway.connect():
+            self.__gateway.disconnect()
             _throw_error(("Could not connect to MODBUS server: IP={}"
                          .format(self._ip)), 503)
         logging.debug("MODBUS Communication Parameters: {}"
                       .format(self.__client.comm_params))
-        decoded: List = []
-        coros = [entity.register_readout() for entity in self.__entity_list]
-        try:
-            for item in await asyncio.gather(*coros):
-                decoded += item
-        except asyncio.CancelledError:
-            _throw_error(("Async tasks could not be processed within {} sec. "
-                          "Consider to increase value for 'timeout_connect'"
-                          .format(self.__client.comm_params.timeout_connect)),
-                         504)
-        if self.__client.connected:
-            self.__client.close()
-            logging.debug("Closing {}".format(self.__client))
 
+    def __disconnect(self) -> None:
+        """
+        close the connection after a request, unless held open by a
+        persistent client or in use by another unit id
+        """
+        self.__gateway.disconnect()
+
+    def close(self) -> None:
+        """
+        release the connection and the circuit breaker, the connection is
+        closed once no other client of the gateway is left
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.__persistent:
+            self.__persistent = False
+            self.__gateway.unhold()
+        if _gateways.release(self.__gateway):
+            self.__gateway.close()
+        _breakers.release(self.__breaker)
+
+    def __remember(
+            self,
+            values: Dict[str, Any],
+            since: float
+    ) -> None:
+        """
+        update the last-known values of parameters, unless more recent ones
+        are known, e.g. written while a readout was in progress
+        :param values: Dict - {parameter: value}
+        :param since: float - monotonic time the values are valid from
+        """
+        for parameter, value in values.items():
+            if self.__last_known.get(parameter, (None, since))[1] <= since:
+                self.__last_known[parameter] = (value, since)
+
+    def __unchanged(
+            self,
+            wr: Dict
+    ) -> Dict[str, Any]:
+        """
+        writes equal to the last-known value of the parameter, compared by
+        the value the register holds once written, e.g. truncated
+        :param wr: dict {parameter: value}
+        :return: Dict {parameter: value}
+        """
+        written: Dict[str, Any] = dict()
+        for entity in self.__entity_list:
+            if entity.entity in ['0', '4']:
+                written.update(entity.written_values(wr))
         return {
+            parameter: value for parameter, value in wr.items()
+            if parameter in written and parameter in self.__last_known
+            and _same_value(written[parameter],
+                            self.__last_known[parameter][0])
+        }
+
+    def subscribe(
+            self,
+            callback: Callable[[Dict[str, Any] | None, List[Dict]], Any]
+    ) -> None:
+        """
+        notify a callback of each update of the snapshot, by a readout or a
+        write, invoked as callback(snapshot, changed) in the task of the
+        readout or write, hence expected to return quickly
+        :param callback: function - snapshot (None if not read yet) and the
+        items changed
+        """
+        if callback not in self.__subscribers:
+            self.__subscribers.append(callback)
+
+    def unsubscribe(
+            self,
+            callback: Callable
+    ) -> None:
+        """
+        :param callback: function - as subscribed
+        """
+        if callback in self.__subscribers:
+            self.__subscribers.remove(callback)
+
+    def __notify(
+            self,
+            snapshot: Dict[str, Any] | None,
+            changed: List[Dict]
+    ) -> None:
+        """
+        :param snapshot: Dict - as of read_register
+        :param changed: List of Dict - items changed
+        """
+        for callback in list(self.__subscribers):
+            try:
+                callback(snapshot, changed)
+            except Exception as e:
+                logging.error("Subscriber {0} failed: {1}"
+                              .format(callback, str(e)))
+
+    def __overlay(
+            self,
+            data: List[Dict],
+            written: Dict[str, List[Dict]]
+    ) -> List[Dict]:
+        """
+        replace the items of the registers written in the data of a readout
+        :param data: List of Dict - as of read_register
+        :param written: Dict {register: items decoded}
+        :return: List of Dict
+        """
+        if not written:
+            return data
+        timestamp = datetime.datetime.now(
+            tz=datetime.timezone.utc
+        ).isoformat()
+        overlaid: List = []
+        replaced = set()
+        for item in data:
+            register = self.__device.parameters.get(item["parameter"])
+            if register not in written:
+                overlaid.append(item)
+            elif register not in replaced:  # bit maps: items per bit
+                replaced.add(register)
+                overlaid += [
+                    {k: v for k, v in sorted((
+                        entry | {"quality": QUALITY_GOOD,
+                                 "timestamp": timestamp}
+                        if "quality" in item else entry).items())}
+                    for entry in written[register]
+                ]
+
+        return overlaid
+
+    def __write_through(self, since: float) -> None:
+        """
+        update the snapshot by the registers written, decoded as if read,
+        and notify the subscribers
+        :param since: float - monotonic time of the write
+        """
+        written: Dict = dict()
+        for entity in self.__entity_list:
+            if entity.entity in ['0', '4']:
+                written.update(entity.updated_registers)
+        if not written:
+            return
+        self.__written.update({
+            register: (items, since) for register, items in written.items()
+        })
+        # values as written, decoded as if read
+        self.__remember(
+            values={item["parameter"]: item["value"]
+                    for items in written.values() for item in items
+                    if "value" in item and "parameter_alt" not in item},
+            since=since
+        )
+        self.__poll.update(written=written, since=since)
+        if self.__snapshot is not None:
+            self.__snapshot = self.__snapshot | {
+                "updated": datetime.datetime.now(
+                    tz=datetime.timezone.utc
+                ).isoformat(),
+                "data": self.__overlay(data=self.__snapshot["data"],
+                                       written=written)
+            }
+        snapshot = self.__snapshot
+        self.__notify(
+            snapshot=snapshot,
+            changed=[item for items in written.values() for item in items]
+        )
+
+    @mytimer
+    async def read_register(
+            self,
+            deadline: float = None,
+            on_error: str = "raise"
+    ) -> Dict[str, Any]:
+        """
+        invoke the read all mapped registers for monitoring
+        :param deadline: float - seconds the readout may take at most,
+        requests outstanding are cancelled then (optional)
+        :param on_error: str - raise: abort the readout at the first register
+        failing (default), partial: return all values acquired, each with
+        quality (good, bad, timeout), status if failed, and timestamp
+        :return: List of Dict for housekeeping
+        """
+        if on_error not in ON_ERROR_SET:
+            _throw_error("on_error '{0}' not in {1}"
+                         .format(on_error, sorted(ON_ERROR_SET)), 422)
+        if not self.__breaker.allow():
+            self.__circuit_open(snapshot=True)
+        start = time.monotonic()
+        expiry = asyncio.get_running_loop().time() + deadline \
+            if deadline is not None else None
+        due = self.__poll.due()  # registers to be read, None if all
+        with self.__breaker.guard(), self.__poll.guard():
+            await self.__connect()
+            decoded: List = []
+            caller = _caller.set(object())  # requests of this call take turns
+            tasks = [
+                asyncio.create_task(
+                    entity.register_readout(on_error=on_error, expiry=expiry,
+                                            registers=due))
+                for entity in self.__entity_list
+            ]
+            try:
+                for item in await asyncio.gather(*tasks):
+                    decoded += item
+            except asyncio.CancelledError:
+                _throw_error(("Async tasks could not be processed within {} "
+                              "sec. Consider to increase value for "
+                              "'timeout_connect'"
+                              .format(self.__client.comm_params
+                                      .timeout_connect)),
+                             504)
+            finally:
+                # readouts of the other entities are cancelled and awaited
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                _caller.reset(caller)
+                self.__disconnect()
+                self.__init["profile"].save()  # read limits learned, if any
+
+        # registers written meanwhile supersede the values read
+        self.__written = {
+            register: (items, since)
+            for register, (items, since) in self.__written.items()
+            if since > start
+        }
+        self.__snapshot = {
             "timestamp": datetime.datetime.now(
                 tz=datetime.timezone.utc
             ).isoformat(),
             "host": self._ip,
-            "data": decoded
+            "data": self.__overlay(
+                data=self.__poll.merge(data=decoded, since=start),
+                written={register: written[0] for register, written
+                         in self.__written.items()}
+            )
         }
+        snapshot = self.__snapshot
+        self.__remember(
+            values={item["parameter"]: item["value"] for item in decoded
+                    if "value" in item and "parameter_alt" not in item},
+            since=start
+        )
+        self.__notify(snapshot=snapshot, changed=snapshot["data"])
+
+        return snapshot
 
     def __updated_registers(self) -> Dict[str, Any]:
         """
@@ -358,13 +760,6 @@ class MODBUSClientAsync(object):
         :param wr: list of dicts {parameter: value}
         :return: status
         """
-        await self.__client.connect()
-        if not self.__client.connected:
-            _throw_error(("Could not connect to MODBUS server: IP={}"
-                         .format(self._ip)),
-                         503)
-        logging.debug("MODBUS Communication Parameters: {}"
-                      .format(self.__client.comm_params))
         detail = self.__existance_mapping_checks(wr=wr)
         if detail:
             raise MyException(
@@ -374,22 +769,55 @@ class MODBUSClientAsync(object):
                     {}
                 )
             )
-        try:
-            for entity in self.__entity_list:
-                await entity.register_write(wr)
-        except MyException as e:
-            raise MyException(
-                status_code=e.status_code,
-                detail="{0}. Updated register content: {1}".format(
-                    e.detail,
-                    self.__updated_registers()
+
+        if self.__coalescer is not None:  # last value of a parameter wins
+            return await self.__coalescer.submit(wr=wr, write=self.__write)
+
+        return await self.__write(wr=wr)
+
+    async def __write(
+            self,
+            wr: Dict
+    ) -> Dict[str, str | Dict]:
+        """
+        write to registers, where values equal to the last-known ones are
+        skipped if requested
+        :param wr: list of dicts {parameter: value}
+        :return: status
+        """
+        skipped = self.__unchanged(wr=wr) if self.__skip_unchanged else None
+        if skipped:
+            wr = {p: v for p, v in wr.items() if p not in skipped}
+        if not wr:  # nothing changed
+            return {
+                "status": "write success",
+                "updated register content": {},
+                "skipped register content": skipped
+            }
+
+        if not self.__breaker.allow():
+            self.__circuit_open()
+        with self.__breaker.guard():
+            await self.__connect()
+            caller = _caller.set(object())  # requests of this call take turns
+            try:
+                for entity in self.__entity_list:
+                    await entity.register_write(wr)
+            except MyException as e:
+                raise MyException(
+                    status_code=e.status_code,
+                    detail="{0}. Updated register content: {1}".format(
+                        e.detail,
+                        self.__updated_registers()
+                    )
                 )
-            )
-        if self.__client.connected:
-            self.__client.close()
-            logging.debug("Closing {}".format(self.__client))
+            finally:
+                since = time.monotonic()
+                self.__write_through(since=since)
+                _caller.reset(caller)
+                self.__disconnect()
 
         return {
             "status": "write success",
             "updated register content": self.__updated_registers()
-        }
+        } | defined_kwargs(**{"skipped register content": skipped})
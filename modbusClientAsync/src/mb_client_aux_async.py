@@ -7,22 +7,32 @@ auxiliary functions
 
 from timeit import default_timer
 from functools import wraps
+from contextlib import contextmanager, asynccontextmanager
+from collections import OrderedDict, deque
+from contextvars import ContextVar
 from threading import Lock
+import asyncio
+import math
 import os
+import time
+import datetime
+import re
 import glob
-import json
 import logging
-from typing import Callable, Any, Dict
+from typing import Callable, Awaitable, Any, Dict, Tuple, List
 
 
 class MyException(Exception):
     def __init__(self,
                  status_code,
-                 detail):
+                 detail,
+                 content=None):
         super().__init__(status_code,
                          detail)
         self.status_code: int = status_code
         self.detail: str = detail
+        # optional payload, e.g. last-known values if the circuit is open
+        self.content = content
 
 
 # deprecated as of 2023-08-12
@@ -48,6 +58,513 @@ class LockGroup(object):
             return self.__lock_dict[param]
 
 
+STATUS_CIRCUIT_OPEN = 424  # calls fail fast while the circuit is open
+
+
+class _CircuitBreaker(object):
+    """
+    per-host circuit breaker: the circuit opens after a number of consecutive
+    connection failures, such that calls fail fast. After the probe interval
+    one call is let through (half-open), its success closes the circuit, its
+    failure opens it again
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+            self,
+            threshold: int = None,
+            probe_interval: float = None
+    ):
+        """
+        :param threshold: int - consecutive failures to open the circuit
+        (default: None, i.e. never open)
+        :param probe_interval: float - seconds until a probe is let through
+        (default: 30)
+        """
+        self.__threshold = threshold
+        self.__probe_interval = probe_interval or 30.
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened = 0.  # monotonic time the circuit opened
+        self.__opened_at: str | None = None
+
+    @property
+    def state(self) -> str: return self.__state
+
+    def allow(self) -> bool:
+        """
+        :return: bool - call may proceed, False if it shall fail fast
+        """
+        if self.__state == self.CLOSED:
+            return True
+        if (self.__state == self.OPEN
+                and time.monotonic() - self.__opened >= self.__probe_interval):
+            self.__state = self.HALF_OPEN  # let one probe through
+            return True
+        return False
+
+    def success(self) -> None:
+        self.__failures = 0
+        self.__state = self.CLOSED
+        self.__opened_at = None
+
+    def failure(self) -> None:
+        self.__failures += 1
+        if not self.__threshold:
+            return
+        if (self.__state == self.HALF_OPEN
+                or self.__failures >= self.__threshold):
+            if self.__state != self.OPEN:
+                logging.warning("Circuit opened after {0} failure(s)"
+                                .format(self.__failures))
+            self.__state = self.OPEN
+            self.__opened = time.monotonic()
+            self.__opened_at = datetime.datetime.now(
+                tz=datetime.timezone.utc
+            ).isoformat()
+
+    @contextmanager
+    def guard(self):
+        """
+        record the outcome of a call: connection failures (status 503 or 504,
+        exceptions of the MODBUS client) count, any other outcome proves the
+        host reachable; a cancelled call, e.g. at its deadline, is not
+        recorded
+        """
+        try:
+            yield
+        except asyncio.CancelledError:
+            if self.__state == self.HALF_OPEN:  # next call probes again
+                self.__state = self.OPEN
+            raise
+        except MyException as e:
+            if e.status_code in (503, 504):
+                self.failure()
+            else:
+                self.success()
+            raise
+        except BaseException:
+            self.failure()
+            raise
+        else:
+            self.success()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: Dict - state, consecutive failures, time opened, and seconds
+        until the next probe
+        """
+        return {
+            "state": self.__state,
+            "failures": self.__failures
+        } | defined_kwargs(
+            opened_at=self.__opened_at,
+            probe_in=max(self.__probe_interval
+                         - (time.monotonic() - self.__opened), 0.)
+            if self.__state == self.OPEN else None
+        )
+
+
+def _running_loop() -> asyncio.AbstractEventLoop | None:
+    """
+    :return: event loop running in this thread, None outside of a loop
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class _Registry(object):
+    """
+    objects shared by the clients of one event loop, e.g. the connection of
+    a gateway: an object is created by the first client, shared by the
+    clients of identical settings, and removed once the last client released
+    it. Objects of event loops closed meanwhile are dropped
+    """
+
+    def __init__(self, kind: str):
+        """
+        :param kind: str - of the objects, for error messages
+        """
+        self.__kind = kind
+        # key: (event loop, ...), value: [object, settings, clients]
+        self.__entries: Dict[Tuple, list] = dict()
+        self.__lock = Lock()
+
+    def acquire(
+            self,
+            key: Tuple,
+            settings: Dict[str, Any],
+            factory: Callable[[], Any]
+    ) -> Any:
+        """
+        :param key: Tuple - identifying the object within an event loop
+        :param settings: Dict - the object is created with, to be identical
+        for all clients sharing it
+        :param factory: function - creating the object
+        :return: object shared
+        """
+        with self.__lock:
+            for k in [k for k in self.__entries
+                      if k[0] is not None and k[0].is_closed()]:
+                del self.__entries[k]
+            key = (_running_loop(),) + key
+            if key not in self.__entries:
+                self.__entries[key] = [factory(), settings, 0]
+            entry = self.__entries[key]
+            if entry[1] != settings:
+                _throw_error(
+                    "{0} {1} shared with other settings: {2}".format(
+                        self.__kind,
+                        ":".join(str(k) for k in key[1:] if k is not None),
+                        ", ".join("{0}={1} (not {2})".format(
+                            name, entry[1].get(name), value)
+                            for name, value in settings.items()
+                            if entry[1].get(name) != value)),
+                    409)
+            entry[2] += 1
+            return entry[0]
+
+    def release(self, item: Any) -> bool:
+        """
+        :param item: object as acquired
+        :return: bool - no client left, the object was removed
+        """
+        with self.__lock:
+            for key, entry in self.__entries.items():
+                if entry[0] is item:
+                    entry[2] -= 1
+                    if entry[2] <= 0:
+                        del self.__entries[key]
+                        return True
+                    return False
+        return True  # not shared
+
+    def items(self) -> List[Tuple[Tuple, Any]]:
+        """
+        :return: List of (key without event loop, object)
+        """
+        with self.__lock:
+            return [(key[1:], entry[0])
+                    for key, entry in self.__entries.items()
+                    if key[0] is None or not key[0].is_closed()]
+
+
+# circuit breakers of the clients not closed, key: (event loop, host)
+_breakers = _Registry(kind="Circuit breaker")
+
+
+def _breaker(
+        host: str,
+        threshold: int = None,
+        probe_interval: float = None
+) -> _CircuitBreaker:
+    """
+    return the circuit breaker of a host, shared by its clients of the same
+    event loop, which release it on close
+    """
+    return _breakers.acquire(
+        key=(host,),
+        settings={"breaker_threshold": threshold,
+                  "breaker_probe_interval": probe_interval},
+        factory=lambda: _CircuitBreaker(threshold=threshold,
+                                        probe_interval=probe_interval))
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """
+    state of the circuit breakers of all hosts of the clients not closed
+    :return: Dict {host: state}
+    """
+    return {key[0]: breaker.as_dict() for key, breaker in _breakers.items()}
+
+
+TIMEOUT_DEFAULT = 3.  # sec, as of pymodbus
+TIMEOUT_MIN = 0.2  # sec, lower bound of the request timeout
+TIMEOUT_MAX = 10.  # sec, upper bound of the request timeout
+
+
+class _RoundTripTimer(object):
+    """
+    round-trip times of a host smoothed as of TCP (RFC 6298): the request
+    timeout is derived from the smoothed round-trip time (EWMA) plus four
+    times its mean deviation, bounded by timeout_min and timeout_max. On a
+    timeout it is doubled until the next response (Karn's algorithm)
+    """
+    ALPHA = 1 / 8  # gain of the smoothed round-trip time
+    BETA = 1 / 4  # gain of the mean deviation
+    K = 4
+    GRANULARITY = 0.001  # sec
+
+    def __init__(
+            self,
+            initial: float = None,
+            timeout_min: float = None,
+            timeout_max: float = None
+    ):
+        """
+        :param initial: float - timeout until the first response
+        (default: 3 sec)
+        :param timeout_min: float - lower bound of the timeout (default: 0.2)
+        :param timeout_max: float - upper bound of the timeout (default: 10)
+        """
+        self.__min = timeout_min or TIMEOUT_MIN
+        self.__max = max(timeout_max or TIMEOUT_MAX, self.__min)
+        self.__srtt: float | None = None
+        self.__rttvar: float | None = None
+        self.__timeout = self.__bound(initial or TIMEOUT_DEFAULT)
+        self.__samples = 0
+        self.__timeouts = 0
+
+    def __bound(self, timeout: float) -> float:
+        return min(max(timeout, self.__min), self.__max)
+
+    @property
+    def timeout(self) -> float:
+        """timeout of the next request (sec)"""
+        return self.__timeout
+
+    @property
+    def timeout_max(self) -> float:
+        """upper bound of the request timeout (sec)"""
+        return self.__max
+
+    def sample(self, rtt: float) -> None:
+        """
+        :param rtt: float - round-trip time of a request answered (sec),
+        a single attempt
+        """
+        if self.__srtt is None:
+            self.__srtt = rtt
+            self.__rttvar = rtt / 2
+        else:
+            self.__rttvar = ((1 - self.BETA) * self.__rttvar
+                             + self.BETA * abs(self.__srtt - rtt))
+            self.__srtt = (1 - self.ALPHA) * self.__srtt + self.ALPHA * rtt
+        self.__samples += 1
+        self.__timeout = self.__bound(
+            self.__srtt + max(self.GRANULARITY, self.K * self.__rttvar))
+
+    def timed_out(self) -> None:
+        """a request was not answered within the timeout"""
+        self.__timeouts += 1
+        self.__timeout = self.__bound(2 * self.__timeout)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: Dict - smoothed round-trip time, mean deviation, and
+        timeout in ms, no of responses and timeouts
+        """
+        return {
+            "timeout_ms": round(self.__timeout * 1_000, 3),
+            "samples": self.__samples,
+            "timeouts": self.__timeouts
+        } | defined_kwargs(
+            srtt_ms=round(self.__srtt * 1_000, 3)
+            if self.__srtt is not None else None,
+            rttvar_ms=round(self.__rttvar * 1_000, 3)
+            if self.__rttvar is not None else None
+        )
+
+
+CONCURRENCY = 4  # requests in flight per device
+# identifies the API call a request belongs to, for fairness among callers
+_caller: ContextVar[Any] = ContextVar("caller", default=None)
+
+
+class _Scheduler(object):
+    """
+    per-device queue all MODBUS requests pass: writes are dispatched ahead
+    of reads, callers of the same priority in turn (round robin), with at
+    most concurrency requests in flight and max_rate requests per second
+    """
+    WRITE = 0
+    READ = 1
+
+    def __init__(
+            self,
+            concurrency: int = None,
+            max_rate: float = None
+    ):
+        """
+        :param concurrency: int - requests in flight (default: 4)
+        :param max_rate: float - requests per second (default: unlimited)
+        """
+        self.__concurrency = concurrency or CONCURRENCY
+        self.__max_rate = max_rate
+        self.__interval = 1 / max_rate if max_rate else 0.
+        # priority -> {caller: deque of (future, time queued)}
+        self.__queues: Dict[int, OrderedDict] = {
+            self.WRITE: OrderedDict(),
+            self.READ: OrderedDict()
+        }
+        self.__in_flight = 0
+        self.__next_start = 0.  # monotonic time of the next dispatch
+        self.__timer: asyncio.TimerHandle | None = None
+        self.__dispatched = {self.WRITE: 0, self.READ: 0}
+        self.__max_wait = {self.WRITE: 0., self.READ: 0.}
+
+    def __pop(self) -> Tuple[int, asyncio.Future, float] | None:
+        """
+        :return: Tuple - priority, future and time queued of the request
+        next in turn, None if none is waiting
+        """
+        for priority, queue in self.__queues.items():
+            while queue:
+                caller, waiting = next(iter(queue.items()))
+                future, queued = waiting.popleft()
+                if waiting:
+                    queue.move_to_end(caller)  # next caller's turn
+                else:
+                    del queue[caller]
+                if not future.done():  # skip requests cancelled
+                    return priority, future, queued
+        return None
+
+    def __dispatch(self) -> None:
+        while self.__in_flight < self.__concurrency:
+            now = time.monotonic()
+            if now < self.__next_start:  # max. request rate
+                if self.__timer is None and any(self.__queues.values()):
+                    self.__timer = asyncio.get_running_loop().call_later(
+                        self.__next_start - now, self.__wake)
+                return
+            entry = self.__pop()
+            if entry is None:
+                return
+            priority, future, queued = entry
+            self.__in_flight += 1
+            self.__next_start = now + self.__interval
+            self.__dispatched[priority] += 1
+            self.__max_wait[priority] = max(self.__max_wait[priority],
+                                            now - queued)
+            future.set_result(None)
+
+    def __wake(self) -> None:
+        self.__timer = None
+        self.__dispatch()
+
+    def __release(self) -> None:
+        self.__in_flight -= 1
+        self.__dispatch()
+
+    @asynccontextmanager
+    async def slot(
+            self,
+            priority: int,
+            caller: Any = None
+    ):
+        """
+        wait for the turn of a request
+        :param priority: int - WRITE or READ
+        :param caller: Any - API call the request belongs to
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.__queues[priority].setdefault(caller, deque()).append(
+            (future, time.monotonic()))
+        self.__dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():  # turn given
+                self.__release()
+            raise
+        try:
+            yield
+        finally:
+            self.__release()
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: Dict - requests in flight, waiting, dispatched, and the
+        maximum time waited per priority
+        """
+        return {
+            "concurrency": self.__concurrency,
+            "in_flight": self.__in_flight
+        } | defined_kwargs(max_rate=self.__max_rate) | {
+            name: {
+                "waiting": sum(len(waiting) for waiting
+                               in self.__queues[priority].values()),
+                "dispatched": self.__dispatched[priority],
+                "max_wait_ms": round(self.__max_wait[priority] * 1_000, 3)
+            }
+            for name, priority in (("write", self.WRITE),
+                                   ("read", self.READ))
+        }
+
+
+class _WriteCoalescer(object):
+    """
+    collects the writes to a device within a window and writes them at once,
+    the last value of a parameter wins
+    """
+
+    def __init__(self, window: float):
+        """
+        :param window: float - seconds writes are collected
+        """
+        self.__window = window
+        self.__pending: Dict[str, Any] | None = None
+        self.__future: asyncio.Future | None = None
+
+    async def submit(
+            self,
+            wr: Dict[str, Any],
+            write: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        join the writes pending, or open a window if none
+        :param wr: Dict - {parameter: value}
+        :param write: coroutine function writing the collected values
+        :return: Dict - outcome of the collected write
+        """
+        if self.__pending is not None:
+            self.__pending.update(wr)
+            return await asyncio.shield(self.__future)
+        self.__pending = pending = dict(wr)
+        self.__future = future = asyncio.get_running_loop().create_future()
+        # outcome retrieved, even if no write joined
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            await asyncio.sleep(self.__window)
+            self.__pending = None  # window closed
+            future.set_result(await write(pending))
+        except BaseException as e:
+            if self.__pending is pending:
+                self.__pending = None
+            if not future.done():
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+            raise
+
+        return future.result()
+
+
+def _same_value(
+        value: Any,
+        known: Any
+) -> bool:
+    """
+    compare a value to be written with the last-known value of a parameter,
+    floats within the precision of 32 bit registers
+    :param value: Any
+    :param known: Any
+    :return: bool
+    """
+    if isinstance(value, bool) or isinstance(known, bool):
+        return value is known
+    if (isinstance(value, (int, float)) and isinstance(known, (int, float))
+            and (isinstance(value, float) or isinstance(known, float))):
+        return math.isclose(value, known, rel_tol=1e-6)
+    return value == known
+
+
 def _throw_error(detail: str,
                  status_code: int = 400) -> None:
     """
@@ -61,7 +578,46 @@ def _throw_error(detail: str,
                       detail=detail)
 
 
-def _client_config(config_filename: str) -> Dict:
+def _parse_host(host: str) -> Tuple[str, int | None, int | None]:
+    """
+    split a host address of the form host[:port][/unit], e.g.
+    "10.0.0.5:502/3" for unit id 3 behind the gateway at 10.0.0.5:502
+    :param host: str - host address
+    :return: Tuple - host, port (None if not provided), and unit id (None if
+    not provided)
+    """
+    match = re.match(r"^(\[[^]]+]|[^:/\[\]]+)(?::(\d+))?(?:/(\d+))?$",
+                     host.strip())
+    if not match:
+        _throw_error("Host address '{0}' is not of the form "
+                     "host[:port][/unit]".format(host), 422)
+    name, port, unit = match.groups()
+    if unit is not None and not 0 <= int(unit) <= 247:
+        _throw_error("Unit id of host address '{0}' not in range 0-247"
+                     .format(host), 422)
+
+    return (name.strip("[]"),
+            int(port) if port else None,
+            int(unit) if unit else None)
+
+
+# directory of the config files of this package
+CONFIG_DIR = "{0}{1}".format(os.path.dirname(os.path.realpath(__file__)),
+                             "/../configFiles/")
+
+
+def _client_config_path(
+        config_filename: str,
+        config_dir: str = None
+) -> str:
+    """
+    resolve the device class config file, either the optional file provided
+    or the only mb_client_config_<device>.json found in configFiles/
+    :param config_filename: str - optional path to config file
+    :param config_dir: str - directory searched instead of configFiles/ of
+    this package (optional)
+    :return: str - path to config file
+    """
     config_device_class = None
 
     if config_filename:
@@ -72,10 +628,7 @@ def _client_config(config_filename: str) -> Dict:
                       .format(config_filename))
             _throw_error(detail, 404)
     else:
-        path_config = "{0}{1}".format(
-            os.path.dirname(os.path.realpath(__file__)),
-            "/../configFiles/"
-        )
+        path_config = os.path.join(config_dir or CONFIG_DIR, "")
         dir_content = glob.glob1(path_config,
                                  "mb_client_config_*.json")
         if len(dir_content) != 1:
@@ -88,8 +641,8 @@ def _client_config(config_filename: str) -> Dict:
                 dir_content[0]
             )
     logging.info("Config File: {0}".format(config_device_class))
-    with open(config_device_class) as config_file:
-        return json.load(config_file)
+
+    return config_device_class
 
 
 def mytimer(supersede: Callable | str = None) -> Callable:
@@ -0,0 +1,742 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+compiled device class configs
+
+A config file is parsed and validated once. The result is cached by the
+sha256 of the file content, along with the versions of its layout and of
+the validation, in memory and - if a cache directory is provided - on
+disk, such that later client constructions skip parsing and validation
+entirely. All clients of the same device class share one
+immutable _DeviceClass model and one _DeviceProfile of the read limits
+learned at runtime, whereas each host caches the values of the parameters
+not read on every readout in its _PollCache.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+import json
+import logging
+from threading import Lock
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Dict, Any, Tuple, Mapping, List, Set
+# internal
+from .mb_client_aux_async import (_throw_error, _client_config_path,
+                                  MyException)
+from .mb_client_core_async import (FEATURE_ALLOWED_SET, POLL_SET,
+                                   QUALITY_GOOD)
+from .mb_client_enums_async import MODBUS2AVRO
+
+CACHE_FORMAT = 2  # increment if layout of compiled config changes
+# increment if the validation of config files changes, e.g. features or
+# poll classes allowed, such that artifacts validated before are disregarded
+SCHEMA_VERSION = 2
+_compiled: Dict[str, Dict] = dict()  # in-memory cache, key: _cache_key
+_device_classes: Dict[str, "_DeviceClass"] = dict()  # key: sha256
+
+
+def _client_mapping_checks(mapping: Dict) -> None:
+    """
+    perform checks on the client mapping: parameter must not be duplicate,
+    available features must be taken from README.md
+    :param mapping: Dict
+    :return:
+    """
+
+    # start nested functions
+    def check_register_integrity() -> None:
+        """
+        check registry integrity of dictionary keys in mapping file
+        key formate, e.g. '0xxxx', '3xxxx/3xxxx', or '4xxxx/y,
+        where x=0000-9999 and y=1|2
+        """
+        msg = "Wrong register in mapping: {0}".format(register)
+        if not re.match(r"^[0134][0-9]{4}(/([12]|[0134][0-9]{4}))?$",
+                        register):
+            _throw_error(msg, 422)
+        comp = register.split("/")
+        if len(comp) == 2:
+            if (comp[1] not in ["1", "2"]
+                and (comp[0][0] != comp[1][0]  # same register class
+                     or int(comp[1]) - int(comp[0]) < 1)):  # ascending
+                _throw_error(msg, 422)
+
+    def check_feature_integrity() -> None:
+        if feature not in FEATURE_ALLOWED_SET:
+            _throw_error(("Feature '{1}' in register '{0}' is not supported"
+                          .format(register, feature)), 422)
+        if re.match("(min|max)", feature):  # check features min or max
+            if not re.match("(int|long|float|double)", datatype):
+                _throw_error(("Feature min or max not permitted for "
+                              "register '{0}'".format(register)), 422)
+            if type(v) not in (int, float):
+                _throw_error(("Feature '{1}' in register '{0}' is not "
+                              "numerical".format(register, feature)), 422)
+        if feature == "poll":  # check feature poll
+            if not (v in POLL_SET
+                    or (type(v) in (int, float) and v > 0)):
+                _throw_error(("Feature poll in register '{0}' neither in {1} "
+                              "nor an interval > 0 sec"
+                              .format(register, sorted(POLL_SET))), 422)
+        if re.match("map", feature):  # check feature map
+            if re.match("boolean", datatype):
+                for binarystring in v.keys():
+                    if not re.match(r"^0b(?=[01]{8}$)(?=[^1]*1[^1]*$)",
+                                    binarystring):
+                        _throw_error("Binary string error in map for "
+                                     "register '{0}'".format(register),
+                                     422)
+
+    def function_available() -> str:
+        function = "decode_bits"
+        if register[0] in ['3', '4']:  # discrete input or holding
+            try:
+                function = value['function']
+                return MODBUS2AVRO(function).datatype
+            except ValueError:
+                _throw_error(("Decoding function '{0}' not defined for "
+                              "register '{1}'").format(function,
+                                                       register), 422)
+            except KeyError:
+                _throw_error(("Decoding function not provided for "
+                              "register '{0}'").format(register), 422)
+        return MODBUS2AVRO(function).datatype  # coil & input register
+
+    def parameter_available() -> str:
+        try:
+            return value["parameter"]
+        except KeyError:
+            _throw_error(("Feature parameter missing for register '{0}'"
+                          .format(register)), 422)
+
+    def seek_parameter_duplicate() -> None:
+        parameter_duplicate = [
+            reg for reg, parm in rev_dict.items() if len(parm) > 1
+        ]
+        if parameter_duplicate:
+            _throw_error(("Duplicate parameter '{0}'"
+                          .format(", ".join(parameter_duplicate))), 422)
+    # end nested functions
+
+    rev_dict: Dict = {}
+    for register, value in mapping.items():
+        check_register_integrity()
+        parameter = parameter_available()
+        rev_dict.setdefault(parameter, set()).add(register)
+        datatype = function_available()
+        for feature, v in value.items():  # investigate features
+            check_feature_integrity()
+    seek_parameter_duplicate()
+
+
+def _cache_key(digest: str) -> str:
+    """
+    :param digest: str - sha256 of the config file content
+    :return: str - key of a compiled config: content, layout, and validation
+    """
+    return "{0}-{1}.{2}".format(digest, CACHE_FORMAT, SCHEMA_VERSION)
+
+
+def _cache_filename(
+        cache_dir: str,
+        digest: str
+) -> str:
+    return os.path.join(cache_dir,
+                        "mb_client_config_{0}.json".format(
+                            _cache_key(digest)))
+
+
+def _write_atomic(
+        filename: str,
+        data: Any
+) -> None:
+    """
+    write data as JSON to a temporary file of its own, renamed once
+    completely written, such that neither a reader nor a concurrent writer
+    sees a partial file
+    :param filename: str - target file
+    :param data: Any - JSON serializable
+    """
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    f = tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp",
+                                    delete=False)
+    try:
+        with f:
+            json.dump(data, f, indent=2)
+        # readable by the other users of a shared cache directory, as if
+        # created by open() (a temporary file is private to its owner)
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, filename)
+    except BaseException:
+        os.remove(f.name)
+        raise
+
+
+def _load_cached(
+        cache_dir: str,
+        digest: str
+) -> Dict | None:
+    """
+    load a compiled config from the disk cache, a corrupt or outdated
+    artifact is disregarded and compiled anew
+    :param cache_dir: str - cache directory
+    :param digest: str - sha256 of the config file content
+    :return: compiled config or None
+    """
+    try:
+        with open(_cache_filename(cache_dir, digest), "r") as f:
+            compiled = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning("Disregarding compiled config for {0}: {1}"
+                        .format(digest, str(e)))
+        return None
+    if (not isinstance(compiled, dict)
+            or compiled.get("format") != CACHE_FORMAT
+            or compiled.get("schema") != SCHEMA_VERSION
+            or compiled.get("sha256") != digest):
+        return None
+
+    return compiled
+
+
+def _store_cached(
+        cache_dir: str,
+        compiled: Dict
+) -> None:
+    """
+    write the compiled config atomically to the disk cache, failures are
+    not fatal, since the config is compiled anew next time
+    :param cache_dir: str - cache directory
+    :param compiled: compiled config
+    :return:
+    """
+    filename = _cache_filename(cache_dir, compiled["sha256"])
+    try:
+        _write_atomic(filename=filename, data=compiled)
+    except OSError as e:
+        logging.warning("Could not write compiled config to '{0}': {1}"
+                        .format(filename, str(e)))
+
+
+def compile_config(
+        config_filename: str = None,
+        cache_dir: str = None
+) -> Dict:
+    """
+    return the validated client config, parsed and checked only if no
+    compiled artifact with identical content hash is found in the
+    in-memory or disk cache
+    :param config_filename: str - optional path to config file
+    :param cache_dir: str - optional directory of the disk cache
+    :return: Dict - compiled config with keys
+        "format", "schema", "sha256", "config_filename", "mapping",
+        "endianness"
+    """
+    config_filename = _client_config_path(config_filename=config_filename)
+    with open(config_filename, "rb") as config_file:
+        content = config_file.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    compiled = _compiled.get(_cache_key(digest))
+    if compiled:
+        return compiled
+    if cache_dir:
+        compiled = _load_cached(cache_dir=cache_dir, digest=digest)
+    if not compiled:
+        logging.debug("Compiling config file: {0}".format(config_filename))
+        try:
+            client_config = json.loads(content)
+        except ValueError as e:
+            _throw_error("Config file '{0}' is not a valid JSON: {1}"
+                         .format(config_filename, str(e)), 422)
+        # integrity checks
+        _client_mapping_checks(mapping=client_config['mapping'])
+        compiled = {
+            "format": CACHE_FORMAT,
+            "schema": SCHEMA_VERSION,
+            "sha256": digest,
+            "config_filename": config_filename,
+            "mapping": client_config['mapping'],
+            # if endianness not found, apply default:
+            # "byteorder": Endian.Little, "wordorder": Endian.Big
+            "endianness": client_config.get("endianness",
+                                            {"byteorder": "<",
+                                             "wordorder": ">"})
+        }
+        if cache_dir:
+            _store_cached(cache_dir=cache_dir, compiled=compiled)
+    _compiled[_cache_key(digest)] = compiled
+
+    return compiled
+
+
+def _freeze(item: Any) -> Any:
+    """
+    read-only view of nested dicts and lists as from JSON
+    :param item: Any
+    :return: MappingProxyType, tuple, or item itself
+    """
+    if isinstance(item, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in item.items()})
+    if isinstance(item, list):
+        return tuple(_freeze(v) for v in item)
+    return item
+
+
+def _thaw(item: Any) -> Any:
+    """
+    plain dicts and lists of a frozen item, e.g. for JSON output
+    :param item: Any
+    :return: dict, list, or item itself
+    """
+    if isinstance(item, MappingProxyType):
+        return {k: _thaw(v) for k, v in item.items()}
+    if isinstance(item, tuple):
+        return [_thaw(v) for v in item]
+    return item
+
+
+class _DeviceClass(object):
+    """
+    immutable model of a device class: mapping, indexes and read/write plans
+    are derived once from the compiled config and shared by all host clients
+    """
+
+    def __init__(self, compiled: Dict):
+        """
+        :param compiled: Dict - compiled config, see compile_config
+        """
+        self._sha256: str = compiled['sha256']
+        self._config_filename: str = compiled['config_filename']
+        self._endianness: Mapping = _freeze(compiled['endianness'])
+        self._mapping: Mapping = _freeze(compiled['mapping'])
+        # select mapping for each entity and sort by register number
+        self._register_maps: Mapping[str, Mapping] = MappingProxyType({
+            entity: MappingProxyType({
+                k: v for k, v in sorted(self._mapping.items())
+                if k[0] == entity
+            })
+            for entity in ['0', '1', '3', '4']
+        })
+        self._register_info: Mapping[str, Mapping] = MappingProxyType({
+            register: self.__register_width(register)
+            for register in self._mapping
+        })
+        # read plan: registers in ascending order per entity
+        self._read_plan: Mapping[str, Tuple] = MappingProxyType({
+            entity: tuple(
+                (register, self._register_info[register])
+                for register in register_maps
+            )
+            for entity, register_maps in self._register_maps.items()
+        })
+        # write plan: parameter -> register
+        self._parameters: Mapping[str, str] = MappingProxyType({
+            v['parameter']: k for k, v in self._mapping.items()
+        })
+
+    def __register_width(
+            self,
+            address: str
+    ) -> Mapping[str, int]:
+        """
+        determine the specs for an address
+        :param address: string
+        :return: Mapping
+            start - address to start from,
+            width - no of 16-bit register
+            no_bytes - no of total bytes contained
+            pos_byte - position of byte in register (1: major, 2: minor)
+        """
+        width, no_bytes, pos_byte = 1, 2, 1  # default
+        comp = address.split("/")
+        start = int(comp[0][1:])
+        if len(comp) == 2:
+            if comp[1] in ["1", "2"]:
+                no_bytes = 1
+                pos_byte = int(comp[1])
+            else:
+                width = int(comp[1]) - int(comp[0]) + 1
+                no_bytes = width * 2
+
+        function = self._mapping[address].get('function')
+        if function:
+            if MODBUS2AVRO(function).supersede:
+                width = MODBUS2AVRO.width(function)
+                no_bytes = MODBUS2AVRO.no_bytes(function)
+        result = {
+            "start": start,
+            "width": width,
+            "no_bytes": no_bytes,
+            "pos_byte": pos_byte
+        }
+        logging.debug("register:{0} -> {1}".format(address,
+                                                   json.dumps(result)))
+
+        return MappingProxyType(result)
+
+    @property
+    def sha256(self) -> str: return self._sha256
+    @property
+    def config_filename(self) -> str: return self._config_filename
+    @property
+    def endianness(self) -> Mapping: return self._endianness
+    @property
+    def mapping(self) -> Mapping: return self._mapping
+    @property
+    def parameters(self) -> Mapping[str, str]: return self._parameters
+    def register_maps(self, entity: str) -> Mapping:
+        return self._register_maps[entity]
+    def register_info(self, address: str) -> Mapping[str, int]:
+        return self._register_info[address]
+    def read_plan(self, entity: str) -> Tuple: return self._read_plan[entity]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        schema of the device class
+        :return: Dict - config file, content hash, endianness, and mapping
+        """
+        return {
+            "config_filename": self._config_filename,
+            "sha256": self._sha256,
+            "endianness": _thaw(self._endianness),
+            "mapping": _thaw(self._mapping)
+        }
+
+
+def device_class(
+        config_filename: str = None,
+        cache_dir: str = None
+) -> _DeviceClass:
+    """
+    return the device class model shared by all clients with identical
+    config content
+    :param config_filename: str - optional path to config file
+    :param cache_dir: str - optional directory of the disk cache
+    :return: _DeviceClass
+    """
+    compiled = compile_config(config_filename=config_filename,
+                              cache_dir=cache_dir)
+    if compiled['sha256'] not in _device_classes:
+        _device_classes[compiled['sha256']] = _DeviceClass(compiled=compiled)
+
+    return _device_classes[compiled['sha256']]
+
+
+PROFILE_FORMAT = 1  # increment if layout of the device profile changes
+# maximum no of bits or registers per read request (MODBUS specification)
+MAX_COUNT = {'0': 2000, '1': 2000, '3': 125, '4': 125}
+# maximum no of unmapped bits or registers a read block may span
+MAX_GAP = {'0': 64, '1': 64, '3': 8, '4': 8}
+_profiles: Dict[str, "_DeviceProfile"] = dict()  # key: sha256
+
+
+class _DeviceProfile(object):
+    """
+    limits of a device class learned at runtime: the maximum no of bits or
+    registers per read request and the addresses a read block must not span
+    (unreadable holes, isolated unreadable registers). Registers are read in
+    the largest blocks deemed safe, failing blocks are bisected, and the
+    profile is persisted in the cache directory, if provided
+    """
+
+    def __init__(
+            self,
+            device: _DeviceClass,
+            cache_dir: str = None
+    ):
+        """
+        :param device: _DeviceClass
+        :param cache_dir: str - directory of the profile (optional)
+        """
+        self.__sha256 = device.sha256
+        self.__config_filename = device.config_filename
+        self.__cache_dir = cache_dir
+        self.__lock = Lock()
+        self.__dirty = False
+        self.__max_count: Dict[str, int] = dict(MAX_COUNT)
+        self.__splits: Dict[str, set] = {entity: set() for entity in MAX_COUNT}
+        if cache_dir:
+            self.__load()
+
+    def __filename(self) -> str:
+        return os.path.join(self.__cache_dir,
+                            "mb_client_profile_{0}.json".format(self.__sha256))
+
+    def __load(self) -> None:
+        """
+        load the profile learned so far, a corrupt or outdated profile is
+        disregarded and learned anew
+        """
+        try:
+            with open(self.__filename()) as f:
+                profile = json.load(f)
+            if (profile.get("format") != PROFILE_FORMAT
+                    or profile.get("sha256") != self.__sha256):
+                return
+            for entity, limits in profile["entities"].items():
+                self.__max_count[entity] = int(limits["max_count"])
+                self.__splits[entity] = set(limits["splits"])
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.warning("Disregarding device profile for {0}: {1}"
+                            .format(self.__sha256, str(e)))
+
+    def save(self) -> None:
+        """
+        write the profile atomically to the cache directory, if anything was
+        learned since, failures are not fatal
+        """
+        if not self.__cache_dir or not self.__dirty:
+            return
+        with self.__lock:
+            self.__dirty = False
+            profile = self.as_dict()
+        filename = self.__filename()
+        try:
+            _write_atomic(filename=filename, data=profile)
+        except OSError as e:
+            logging.warning("Could not write device profile to '{0}': {1}"
+                            .format(filename, str(e)))
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: Dict - profile learned, as persisted
+        """
+        return {
+            "format": PROFILE_FORMAT,
+            "sha256": self.__sha256,
+            "config_filename": self.__config_filename,
+            "entities": {
+                entity: {
+                    "max_count": self.__max_count[entity],
+                    "splits": sorted(self.__splits[entity])
+                }
+                for entity in MAX_COUNT
+            }
+        }
+
+    def blocks(
+            self,
+            entity: str,
+            read_plan: Tuple
+    ) -> List[Tuple]:
+        """
+        coalesce the read plan of an entity into read blocks
+        :param entity: str - register prefix
+        :param read_plan: Tuple - (register, reg_info) in ascending order
+        :return: List of Tuple ((register, reg_info), ...) per block
+        """
+        max_count = self.__max_count[entity]
+        splits = self.__splits[entity]
+        blocks: List[List] = list()
+        start = end = 0
+        for register, reg_info in read_plan:
+            first = reg_info['start']
+            last = first + reg_info['width']
+            if (blocks
+                    and first - end <= MAX_GAP[entity]
+                    and max(last, end) - start <= max_count
+                    and not any(start < s <= first for s in splits)):
+                blocks[-1].append((register, reg_info))
+                end = max(last, end)
+                continue
+            blocks.append([(register, reg_info)])
+            start, end = first, last
+
+        return [tuple(block) for block in blocks]
+
+    def learn_max_count(
+            self,
+            entity: str,
+            count: int
+    ) -> None:
+        """
+        a block of count failed without spanning unmapped addresses
+        :param entity: str
+        :param count: int - no of bits or registers proven readable
+        """
+        with self.__lock:
+            if count < self.__max_count[entity]:
+                logging.info("Device class {0}: max. {1} per read for MODBUS "
+                             "class '{2}'".format(self.__config_filename,
+                                                  count, entity))
+                self.__max_count[entity] = count
+                self.__dirty = True
+
+    def learn_split(
+            self,
+            entity: str,
+            *addresses: int
+    ) -> None:
+        """
+        read blocks must not span the addresses given
+        :param entity: str
+        :param addresses: int - first address of the part beyond
+        """
+        with self.__lock:
+            for address in addresses:
+                if address not in self.__splits[entity]:
+                    logging.info("Device class {0}: reads split at address "
+                                 "{1} for MODBUS class '{2}'"
+                                 .format(self.__config_filename,
+                                         address, entity))
+                    self.__splits[entity].add(address)
+                    self.__dirty = True
+
+
+def device_profile(
+        device: _DeviceClass,
+        cache_dir: str = None
+) -> _DeviceProfile:
+    """
+    return the profile shared by all clients of a device class
+    :param device: _DeviceClass
+    :param cache_dir: str - optional directory of the disk cache
+    :return: _DeviceProfile
+    """
+    if device.sha256 not in _profiles:
+        _profiles[device.sha256] = _DeviceProfile(device=device,
+                                                  cache_dir=cache_dir)
+
+    return _profiles[device.sha256]
+
+
+SLOW_CYCLE = 10  # parameters of poll class slow are read every Nth readout
+
+
+class _PollCache(object):
+    """
+    values of a host's parameters not read on every readout, by the feature
+    poll: static - read once and cached until the connection to the host
+    fails, slow - read every Nth readout, interval - read when older than
+    the interval (sec), fast - read on every readout (default). Readouts
+    merge in the values cached along with their age (sec)
+    """
+
+    def __init__(
+            self,
+            device: _DeviceClass,
+            slow_cycle: int = None
+    ):
+        """
+        :param device: _DeviceClass
+        :param slow_cycle: int - slow parameters are read every Nth readout
+        (default: 10)
+        """
+        self.__device = device
+        self.__slow_cycle = slow_cycle or SLOW_CYCLE
+        self.__poll: Dict[str, str | float] = {
+            register: attributes['poll']
+            for register, attributes in device.mapping.items()
+            if attributes.get('poll', 'fast') != 'fast'
+        }
+        # register -> (items, monotonic time read)
+        self.__cache: Dict[str, Tuple[List, float]] = dict()
+        self.__cycle = 0
+        self.__lock = Lock()
+
+    def due(self) -> Set[str] | None:
+        """
+        registers to be read by the next readout
+        :return: Set, None if all
+        """
+        if not self.__poll:
+            return None
+        now = time.monotonic()
+        with self.__lock:
+            cycle = self.__cycle
+            self.__cycle += 1
+            return {
+                register for register in self.__device.mapping
+                if register not in self.__poll
+                or register not in self.__cache
+                or (self.__poll[register] == 'slow'
+                    and cycle % self.__slow_cycle == 0)
+                or (self.__poll[register] not in POLL_SET
+                    and now - self.__cache[register][1]
+                    >= self.__poll[register])
+            }
+
+    def merge(
+            self,
+            data: List[Dict],
+            since: float
+    ) -> List[Dict]:
+        """
+        cache the items read of parameters not fast, and merge in the items
+        cached of those not read, with their age
+        :param data: List of Dict - items read, as of read_register
+        :param since: float - monotonic time the readout started
+        :return: List of Dict
+        """
+        if not self.__poll:
+            return data
+        read: Dict[str, List] = dict()
+        for item in data:
+            read.setdefault(self.__device.parameters[item["parameter"]],
+                            list()).append(item)
+        now = time.monotonic()
+        merged: List = list()
+        with self.__lock:
+            for entity in ['0', '1', '3', '4']:
+                for register, _ in self.__device.read_plan(entity):
+                    if register in read:
+                        items = read[register]
+                        if register in self.__poll and all(
+                                item.get('quality', QUALITY_GOOD)
+                                == QUALITY_GOOD for item in items):
+                            self.__cache[register] = (items, since)
+                        merged += items
+                    elif register in self.__cache:
+                        items, cached = self.__cache[register]
+                        merged += [
+                            {k: v for k, v in sorted((
+                                item | {"age": round(now - cached, 3)}
+                            ).items())}
+                            for item in items
+                        ]
+
+        return merged
+
+    def update(
+            self,
+            written: Dict[str, List[Dict]],
+            since: float
+    ) -> None:
+        """
+        replace the items cached of registers written
+        :param written: Dict {register: items decoded}
+        :param since: float - monotonic time of the write
+        """
+        with self.__lock:
+            for register, items in written.items():
+                if register in self.__cache:
+                    self.__cache[register] = (items, since)
+
+    def invalidate(self) -> None:
+        """drop the values cached, e.g. if the connection failed"""
+        with self.__lock:
+            self.__cache.clear()
+
+    @contextmanager
+    def guard(self):
+        """
+        drop the values cached if the connection to the host fails (status
+        503 or 504)
+        """
+        try:
+            yield
+        except MyException as e:
+            if e.status_code in (503, 504):
+                self.invalidate()
+            raise
@@ -6,16 +6,19 @@ MODBUS core class
 """
 
 from pymodbus.payload import BinaryPayloadDecoder, BinaryPayloadBuilder
-import json
+from pymodbus.pdu import ExceptionResponse, ModbusExceptions
+from pymodbus.exceptions import ModbusIOException
 import re
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple, Set
 import asyncio
+import datetime
+import time
 # internal
-from .mb_client_aux_async import _throw_error, defined_kwargs
+from .mb_client_aux_async import (_throw_error, defined_kwargs, MyException,
+                                  _Scheduler, _caller)
 from .mb_client_enums_async import MODBUS2AVRO, MODBUS2FUNCTION
 
-UNIT = 0x1
 FEATURE_EXCLUDE_SET = {
     'map',
     'function',
@@ -23,7 +26,8 @@ FEATURE_EXCLUDE_SET = {
     'offset',
     'min',
     'max',
-    'unit'
+    'unit',
+    'poll'
 }
 FEATURE_ALLOWED_SET = {
     'parameter',
@@ -37,8 +41,22 @@ FEATURE_ALLOWED_SET = {
     'min',
     'max',
     'multiplier',
-    'offset'
+    'offset',
+    'poll'
 }
+# poll classes of parameters, alternatively an interval in sec: static - read
+# once, slow - every Nth readout, fast - every readout (default)
+POLL_SET = {'static', 'slow', 'fast'}
+# handling of registers failing in a readout: raise - abort the readout,
+# partial - return all values acquired along with their quality
+ON_ERROR_SET = {'raise', 'partial'}
+QUALITY_GOOD = "good"
+QUALITY_BAD = "bad"  # error response or not decodable
+QUALITY_TIMEOUT = "timeout"  # cancelled at the deadline
+# exception codes of a request beyond the registers a device serves at once,
+# the device profile learns from
+REJECTED_CODES = {ModbusExceptions.IllegalAddress,
+                  ModbusExceptions.IllegalValue}
 
 
 class _ObjectTypeAsync(object):
@@ -51,64 +69,106 @@ class _ObjectTypeAsync(object):
         """
         :param init: Dict - client parameter
             init["client"] instance - MODBUS client
-            init["mapping"] mapping of all registers as from JSON
-            init["endianness"] endianness's of byte and word
+            init["device"] _DeviceClass - shared model of the device class
+            init["unit"] int - unit id of the device
+            init["profile"] _DeviceProfile - read limits of the device class
+            init["rtt"] _RoundTripTimer - request timeouts of the host
+            (optional)
+            init["scheduler"] _Scheduler - request queue of the device
+            (optional)
         :param entity: str - register prefix
         """
         self._entity = entity
         self.__client = init["client"]
-        self.__endianness = init["endianness"]
-        # select mapping for each entity and sort by register number
-        self.__register_maps = {
-            k: v for k, v in
-            sorted(init["mapping"].items()) if k[0] == self._entity
-        }
+        self.__device = init["device"]
+        self.__unit = init["unit"]
+        self.__profile = init["profile"]
+        self.__rtt = init.get("rtt")
+        self.__scheduler = init.get("scheduler")
+        self.__endianness = self.__device.endianness
+        # mapping of entity sorted by register number, shared among hosts
+        self.__register_maps = self.__device.register_maps(entity)
         # parameter updated in registers after write to date, needs reset
         self.updated_items = dict()
+        # items of the registers updated, decoded as if read, needs reset
+        self.updated_registers = dict()
 
     @property
     def entity(self) -> str: return self._entity
 
-    def __register_width(
+    async def __request(
             self,
-            address: str
-    ) -> Dict[str, int]:
-        """
-        determine the specs for an address
-        :param address: string
-        :return: Dict
-            start - address to start from,
-            width - no of 16-bit register
-            no_bytes - no of total bytes contained
-            pos_byte - position of byte in register (1: major, 2: minor)
-        """
-        width, no_bytes, pos_byte = 1, 2, 1  # default
-        comp = address.split("/")
-        start = int(comp[0][1:])
-        if len(comp) == 2:
-            if comp[1] in ["1", "2"]:
-                no_bytes = 1
-                pos_byte = int(comp[1])
-            else:
-                width = int(comp[1]) - int(comp[0]) + 1
-                no_bytes = width * 2
-
-        function = self.__register_maps[address].get('function')
-        if function:
-            if MODBUS2AVRO(function).supersede:
-                width = MODBUS2AVRO.width(function)
-                no_bytes = MODBUS2AVRO.no_bytes(function)
-        result = {
-            "start": start,
-            "width": width,
-            "no_bytes": no_bytes,
-            "pos_byte": pos_byte
-        }
-        logging.debug("register:{0} -> {1}".format(address,
-                                                   json.dumps(result)))
+            function: str,
+            **kwargs
+    ) -> Any:
+        """
+        MODBUS request in turn of the device's scheduler: writes ahead of
+        reads
+        :param function: str - method of the MODBUS client
+        :param kwargs: arguments of the method, except the unit id
+        :return: response
+        """
+        if self.__scheduler is None:
+            return await self.__transact(function, **kwargs)
+        async with self.__scheduler.slot(
+                priority=_Scheduler.WRITE if function.startswith("write")
+                else _Scheduler.READ,
+                caller=_caller.get()):
+            return await self.__transact(function, **kwargs)
+
+    async def __transact(
+            self,
+            function: str,
+            **kwargs
+    ) -> Any:
+        """
+        MODBUS request with the timeout derived from the round-trip times
+        of the host
+        :param function: str - method of the MODBUS client
+        :param kwargs: arguments of the method, except the unit id
+        :return: response
+        """
+        if self.__rtt is None:
+            return await getattr(self.__client, function)(
+                slave=self.__unit,
+                **kwargs
+            )
+        # one attempt, the client does not retry, timed out on its own
+        timeout = self.__rtt.timeout
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                getattr(self.__client, function)(
+                    slave=self.__unit,
+                    **kwargs
+                ),
+                timeout=timeout
+            )
+        except ModbusIOException:  # no response
+            self.__rtt.timed_out()
+            raise
+        except asyncio.TimeoutError:
+            self.__rtt.timed_out()
+            raise ModbusIOException(
+                "No response within {0:.3f} sec".format(timeout))
+        self.__rtt.sample(time.monotonic() - start)
 
         return result
 
+    def __parameter_register(
+            self,
+            parameter: str
+    ) -> str | None:
+        """
+        look up the register of a parameter in the shared index
+        :param parameter: str
+        :return: register, if the parameter is mapped to this entity
+        """
+        register = self.__device.parameters.get(parameter)
+        if register is not None and register[0] == self._entity:
+            return register
+        return None
+
     def __decode_byte(
             self,
             register: str,
@@ -284,10 +344,10 @@ class _ObjectTypeAsync(object):
                 add: str,
                 val: Any
         ) -> None:
-            rr = await self.__client.write_coil(
+            rr = await self.__request(
+                "write_coil",
                 address=int(add),
-                value=val,
-                slave=UNIT
+                value=val
             )
             if rr.isError():
                 detail = (("Error writing coil register at address "
@@ -295,32 +355,36 @@ class _ObjectTypeAsync(object):
                           .format(int(add), val))
                 _throw_error(detail, 422)
             self.updated_items[parm] = val
+            self.__written(register=add, values=[val])
         # end nested function
 
         coros = list()
         for parameter, value in wr.items():
-            for address, attributes in self.__register_maps.items():
-                # coil register updates one-by-one in async mode
-                if attributes['parameter'] == parameter:
-                    coros.append(
-                        write_coil(
-                            parm=parameter,
-                            add=address,
-                            val=value)
-                    )
-                    break
+            address = self.__parameter_register(parameter)
+            if address is None:
+                continue
+            # coil register updates one-by-one in async mode
+            coros.append(
+                write_coil(
+                    parm=parameter,
+                    add=address,
+                    val=value)
+            )
         for _ in await asyncio.gather(*coros):
             continue
 
-    async def __holding(
+    def __encode(
             self,
-            wr: Dict
-    ) -> None:
+            parameter: str,
+            value: Any
+    ) -> Tuple[str, Dict[str, int], List[int], Any]:
         """
-        dictionary with "parameter: value" pairs to be changed in coil and
-        holding registers
-        :param wr: dictionary with {parameter: value, ...} pair(s) to be updated
-        :return:
+        registers of a value to be written to a holding register, after
+        validation, multiplier and offset applied; an invalid value raises
+        MyException (422) without logging, left to the caller
+        :param parameter: str - mapped to a holding register
+        :param value: value to be written
+        :return: Tuple - register, reg_info, registers encoded, value encoded
         """
 
         def test_min_max() -> None:
@@ -328,29 +392,142 @@ class _ObjectTypeAsync(object):
             maximum = attributes.get('max')
             if minimum:
                 if value < minimum:
-                    _throw_error(
-                        ("Error encountered for '{2}' when writing value: "
-                         "{0} < {1} (min)".format(value, minimum, parameter)),
-                        422
+                    raise MyException(
+                        status_code=422,
+                        detail=("Error encountered for '{2}' when writing "
+                                "value: {0} < {1} (min)"
+                                .format(value, minimum, parameter))
                     )
             if maximum:
                 if value > maximum:
-                    _throw_error(
-                        ("Error encountered for '{2}' when writing value: "
-                         "{0} > {1} (max)".format(value, maximum, parameter)),
-                        422
+                    raise MyException(
+                        status_code=422,
+                        detail=("Error encountered for '{2}' when writing "
+                                "value: {0} > {1} (max)"
+                                .format(value, maximum, parameter))
                     )
+        # end nested function
+
+        address = self.__parameter_register(parameter)
+        attributes = self.__register_maps[address]
+        function = attributes['function'].replace("decode_", "add_")
+        reg_info = self.__device.register_info(address)
+
+        # disable update of solely a register's minor byte
+        if reg_info['pos_byte'] == 2:
+            detail = (("Parameter '{0}': updates disabled for "
+                       "the minor byte of a register")
+                      .format(parameter))
+            raise MyException(status_code=422, detail=detail)
+
+        # test min or max exceeded
+        if re.match(".+_(int|uint|float)$", function):
+            test_min_max()
+
+        # apply multiplier and/or offset
+        if re.match(".+_(int|uint)$", function):
+            value = int(
+                (value - attributes.get('offset', 0))
+                / attributes.get('multiplier', 1)
+            )
+
+        elif "_string" in function:
+            # printability
+            try:
+                if not value.isprintable():
+                    raise ValueError
+            except (AttributeError, ValueError) as e:
+                detail = ("'{0}' seems not printable for "
+                          "parameter '{1}' with error: {2}"
+                          .format(value,
+                                  parameter,
+                                  str(e)))
+                raise MyException(status_code=422, detail=detail)
+            # test max length of string
+            if len(value) > (2 * reg_info['width']):
+                detail = ("'{0}' too long for parameter '{1}'"
+                          .format(value,
+                                  parameter))
+                raise MyException(status_code=422, detail=detail)
+
+        # test max length of bit list
+        elif ("_bits" in function
+              and (len(value) / 16) > reg_info['width']):
+            detail = ("'{0}' too long for parameter '{1}'"
+                      .format(value,
+                              parameter))
+            raise MyException(status_code=422, detail=detail)
+
+        builder = BinaryPayloadBuilder(
+            byteorder=self.__endianness['byteorder'],
+            wordorder=self.__endianness['wordorder']
+        )
+        try:
+            getattr(builder, function)(value)
+        except Exception as e:
+            detail = ("Error in BinaryPayloadBuilder: {}"
+                      .format(str(e)))
+            raise MyException(status_code=422, detail=detail)
+
+        return address, reg_info, builder.to_registers(), value
+
+    def written_values(
+            self,
+            wr: Dict
+    ) -> Dict[str, Any]:
+        """
+        values the coil or holding registers hold once written, i.e. after
+        truncation to the integer registers and decoded as if read
+        :param wr: dictionary with {parameter: value} pairs
+        :return: Dict {parameter: value}, parameters not mapped to this
+        entity or failing validation omitted
+        """
+        values: Dict[str, Any] = dict()
+        for parameter, value in wr.items():
+            if self.__parameter_register(parameter) is None:
+                continue
+            if self._entity == '0':
+                values[parameter] = value
+                continue
+            try:
+                address, reg_info, payload, _ = self.__encode(
+                    parameter=parameter, value=value)
+            except MyException:  # invalid, reported by the write
+                continue
+            items = self.__decode(register=address,
+                                  reg_info=reg_info,
+                                  values=payload,
+                                  offset=0)
+            values.update({
+                item['parameter']: item['value'] for item in items
+                if item.get('parameter') == parameter and 'value' in item
+                and 'parameter_alt' not in item
+            })
+
+        return values
+
+    async def __holding(
+            self,
+            wr: Dict
+    ) -> None:
+        """
+        dictionary with "parameter: value" pairs to be changed in coil and
+        holding registers
+        :param wr: dictionary with {parameter: value, ...} pair(s) to be updated
+        :return:
+        """
 
         async def write_holding(
                 add: int,
                 values: Any,
                 val: Any,
-                parm: str
+                parm: str,
+                register: str
         ) -> None:
-            rr = await self.__client.write_registers(
+            rr = await self.__request(
+                    "write_registers",
                     address=add,
-                    values=values,
-                    slave=UNIT
+                    values=values
             )
             if rr.isError():
                 detail = (("Error writing to holding "
@@ -358,138 +535,301 @@ class _ObjectTypeAsync(object):
                           .format(add, values))
                 _throw_error(detail, 422)
             self.updated_items[parm] = val
-        # end nested functions
-
-        builder = BinaryPayloadBuilder(
-            byteorder=self.__endianness['byteorder'],
-            wordorder=self.__endianness['wordorder']
-        )
+            self.__written(register=register, values=values)
+        # end nested function
 
         coros = list()
         for parameter, value in wr.items():
-            for address, attributes in self.__register_maps.items():
-                if attributes['parameter'] == parameter:
-                    # if match parameter - start
-                    function = attributes['function'].replace("decode_", "add_")
-                    reg_info = self.__register_width(address=address)
-
-                    # disable update of solely a register's minor byte
-                    if reg_info['pos_byte'] == 2:
-                        detail = (("Parameter '{0}': updates disabled for "
-                                   "the minor byte of a register")
-                                  .format(parameter))
-                        _throw_error(detail, 422)
-
-                    # test min or max exceeded
-                    if re.match(".+_(int|uint|float)$", function):
-                        test_min_max()
-
-                    # apply multiplier and/or offset
-                    if re.match(".+_(int|uint)$", function):
-                        value = int(
-                            (value - attributes.get('offset', 0))
-                            / attributes.get('multiplier', 1)
-                        )
-
-                    elif "_string" in function:
-                        # printability
-                        try:
-                            if not value.isprintable():
-                                raise ValueError
-                        except (AttributeError, ValueError) as e:
-                            detail = ("'{0}' seems not printable for "
-                                      "parameter '{1}' with error: {2}"
-                                      .format(value,
-                                              parameter,
-                                              str(e)))
-                            _throw_error(detail, 422)
-                        # test max length of string
-                        if len(value) > (2 * reg_info['width']):
-                            detail = ("'{0}' too long for parameter '{1}'"
-                                      .format(value,
-                                              parameter))
-                            _throw_error(detail, 422)
-
-                    # test max length of bit list
-                    elif ("_bits" in function
-                          and (len(value) / 16) > reg_info['width']):
-                        detail = ("'{0}' too long for parameter '{1}'"
-                                  .format(value,
-                                          parameter))
-                        _throw_error(detail, 422)
-
-                    try:
-                        getattr(builder, function)(value)
-                    except Exception as e:
-                        detail = ("Error in BinaryPayloadBuilder: {}"
-                                  .format(str(e)))
-                        _throw_error(detail, 422)
-                    payload = builder.to_registers()
-                    coros.append(
-                        write_holding(
-                            add=reg_info['start'],
-                            values=payload,
-                            val=value,
-                            parm=parameter
-                        )
-                    )
-                    builder.reset()  # reset builder
-                    break
-                # if match parameter - end
+            if self.__parameter_register(parameter) is None:
+                continue
+            try:
+                address, reg_info, payload, value = self.__encode(
+                    parameter=parameter, value=value)
+            except MyException as e:
+                _throw_error(e.detail, e.status_code)
+            coros.append(
+                write_holding(
+                    add=reg_info['start'],
+                    values=payload,
+                    val=value,
+                    parm=parameter,
+                    register=address
+                )
+            )
 
         for _ in await asyncio.gather(*coros):
             continue
 
-    async def register_readout(self) -> List[Dict[str, Any]]:
+    def __written(
+            self,
+            register: str,
+            values: List
+    ) -> None:
         """
-        reads the coil discrete input, input, or holding registers according
-        to their length defined in key and decodes them accordingly. The
-        list of dictionary/ies is appended to the result
-        :return: List
+        decode the bits or registers written as if read, multiplier and
+        offset applied back
+        :param register: str
+        :param values: List - bits or registers written
         """
+        try:
+            self.updated_registers[register] = self.__decode(
+                register=register,
+                reg_info=self.__device.register_info(register),
+                values=values,
+                offset=0
+            )
+        except Exception as e:  # left to the next readout
+            logging.debug("Register {0} written not decoded: {1}"
+                          .format(register, str(e)))
 
-        async def acquire(register: str) -> List[Dict[str, Any]]:
-            reg_info = self.__register_width(address=register)
-            result = await getattr(self.__client,
-                                   MODBUS2FUNCTION(self._entity).name)(
-                address=reg_info['start'],
-                count=reg_info['width'],
-                slave=UNIT
+    def __failed(
+            self,
+            register: str,
+            quality: str,
+            status: str
+    ) -> List[Dict[str, Any]]:
+        """
+        entry of a register not acquired in a partial readout
+        :param register: str
+        :param quality: str - QUALITY_BAD or QUALITY_TIMEOUT
+        :param status: str - reason
+        :return: List of Dict
+        """
+        return [
+            {
+                k: v for k, v in self.__register_maps[register].items()
+                if k not in FEATURE_EXCLUDE_SET
+            } |
+            {
+                "quality": quality,
+                "status": status,
+                "timestamp": datetime.datetime.now(
+                    tz=datetime.timezone.utc
+                ).isoformat()
+            }
+        ]
+
+    def __span(
+            self,
+            block: Tuple
+    ) -> Tuple[int, int, bool]:
+        """
+        addresses of a read block
+        :param block: Tuple - (register, reg_info), ...
+        :return: Tuple - start, count, and whether all addresses are mapped
+        """
+        start = block[0][1]['start']
+        addresses = {
+            address for _, reg_info in block
+            for address in range(reg_info['start'],
+                                 reg_info['start'] + reg_info['width'])
+        }
+        count = max(addresses) - start + 1
+        return start, count, len(addresses) == count
+
+    def __decode(
+            self,
+            register: str,
+            reg_info: Dict[str, int],
+            values: List,
+            offset: int
+    ) -> List[Dict[str, Any]]:
+        """
+        decode the register(s) of a single key in the mapping from the bits
+        or registers of a read block
+        :param register: str
+        :param reg_info: Dict - see _DeviceClass.register_info
+        :param values: List - bits or registers read
+        :param offset: int - position of the register(s) in values
+        :return: List of Dict
+        """
+        values = values[offset:offset + reg_info['width']]
+        if self._entity in ['0', '1']:
+            return self.__formatter_bit(
+                decoder=values,
+                register=register
             )
-            if result.isError():
-                detail = (
-                    ("Error reading register at address '{0}' and width "
-                     "'{1}' for MODBUS class '{2}'")
-                    .format(reg_info['start'],
-                            reg_info['width'],
-                            self._entity))
-                _throw_error(detail)
-
-            # decode and append to list
-            if self._entity in ['0', '1']:
-                return self.__formatter_bit(
-                    decoder=result.bits,
-                    register=register
-                )
-            else:  # self._entity in ['3', '4']
-                decoder = BinaryPayloadDecoder.fromRegisters(
-                    registers=result.registers,
-                    byteorder=self.__endianness["byteorder"],
-                    wordorder=self.__endianness["wordorder"]
+        # self._entity in ['3', '4']
+        decoder = BinaryPayloadDecoder.fromRegisters(
+            registers=values,
+            byteorder=self.__endianness["byteorder"],
+            wordorder=self.__endianness["wordorder"]
+        )
+        if reg_info['pos_byte'] == 2:  # skip major byte: key="xxxxx/2"
+            decoder.skip_bytes(nbytes=1)
+        return self.__formatter(
+            decoder=decoder,
+            register=register,
+            no_bytes=reg_info['no_bytes']
+        )
+
+    async def __read_block(
+            self,
+            block: Tuple,
+            partial: bool
+    ) -> Dict[str, List | Exception]:
+        """
+        read a block of registers with one request. If the device rejects
+        the request (IllegalAddress or IllegalValue), the block is bisected,
+        and the device profile learns from the outcome of both halves
+        :param block: Tuple - (register, reg_info), ...
+        :param partial: bool - add quality and timestamp to each parameter
+        :return: Dict {register: decoded items or exception}
+        """
+        start, count, contiguous = self.__span(block)
+        result = await self.__request(
+            MODBUS2FUNCTION(self._entity).name,
+            address=start,
+            count=count
+        )
+        timestamp = datetime.datetime.now(
+            tz=datetime.timezone.utc
+        ).isoformat()
+        if result.isError():
+            # the request exceeds what the device serves, as opposed to
+            # transient failures, e.g. SlaveBusy, not learned from
+            rejected = isinstance(result, ExceptionResponse) \
+                and result.exception_code in REJECTED_CODES
+            if rejected and len(block) > 1:
+                half = len(block) // 2
+                left, right = await asyncio.gather(
+                    self.__read_block(block=block[:half], partial=partial),
+                    self.__read_block(block=block[half:], partial=partial)
                 )
-                if reg_info['pos_byte'] == 2:  # skip major byte: key="xxxxx/2"
-                    decoder.skip_bytes(nbytes=1)
-                return self.__formatter(
-                    decoder=decoder,
+                if not any(isinstance(v, Exception)
+                           for v in (left | right).values()):
+                    if contiguous:  # count exceeds the device's limit
+                        self.__profile.learn_max_count(
+                            self._entity,
+                            max(self.__span(block[:half])[1],
+                                self.__span(block[half:])[1]))
+                    else:  # spans an unreadable hole
+                        self.__profile.learn_split(
+                            self._entity,
+                            self.__span(block[half:])[0])
+                return left | right
+            if rejected:  # unreadable register, to be read on its own
+                self.__profile.learn_split(self._entity, start, start + count)
+            detail = (
+                ("Error reading register at address '{0}' and width "
+                 "'{1}' for MODBUS class '{2}'")
+                .format(start,
+                        count,
+                        self._entity))
+            logging.error(detail)
+            return {
+                register: MyException(status_code=400, detail=detail)
+                for register, _ in block
+            }
+
+        values = result.bits if self._entity in ['0', '1'] \
+            else result.registers
+        decoded: Dict[str, List | Exception] = dict()
+        for register, reg_info in block:
+            try:
+                decoded[register] = self.__decode(
                     register=register,
-                    no_bytes=reg_info['no_bytes']
+                    reg_info=reg_info,
+                    values=values,
+                    offset=reg_info['start'] - start
                 )
+            except Exception as e:
+                decoded[register] = e
+                continue
+            if partial:
+                for item in decoded[register]:
+                    item.update(quality=QUALITY_GOOD, timestamp=timestamp)
+
+        return decoded
+
+    async def register_readout(
+            self,
+            on_error: str = "raise",
+            expiry: float = None,
+            registers: Set[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        reads the coil discrete input, input, or holding registers according
+        to their length defined in key and decodes them accordingly. The
+        list of dictionary/ies is appended to the result. Adjacent registers
+        are read in blocks as large as the device profile deems safe.
+        Requests outstanding at the expiry or, if on_error="raise", at the
+        first error are cancelled and awaited
+        :param on_error: str - raise: abort the readout at the first error,
+            partial: add quality, status and timestamp to each parameter
+        :param expiry: float - event loop time the readout is due (optional)
+        :param registers: Set - registers to be read (default: all)
+        :return: List
+        """
+
+        async def acquire(block: Tuple) -> Dict[str, List | Exception]:
+            decoded = await self.__read_block(block=block, partial=partial)
+            if not partial:
+                for item in decoded.values():
+                    if isinstance(item, Exception):
+                        raise item
+            return decoded
         # end nested function
 
+        partial = on_error == "partial"
+        read_plan = self.__device.read_plan(self._entity)
+        if registers is not None:
+            read_plan = tuple(entry for entry in read_plan
+                              if entry[0] in registers)
+        tasks = {
+            asyncio.create_task(acquire(block)): block
+            for block in self.__profile.blocks(self._entity, read_plan)
+        }
+        if not tasks:
+            return list()
+        timeout = None
+        if expiry is not None:
+            timeout = max(expiry - asyncio.get_running_loop().time(), 0.)
+        try:
+            await asyncio.wait(
+                tasks,
+                timeout=timeout,
+                return_when=asyncio.ALL_COMPLETED if partial
+                else asyncio.FIRST_EXCEPTION
+            )
+        finally:  # no request is left dangling, also if cancelled
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if not partial:  # first error, else deadline, else cancelled
+            errors = [task.exception() for task in tasks
+                      if not task.cancelled() and task.exception()]
+            if errors:
+                raise errors[0]
+            if pending:
+                _throw_error("Readout of MODBUS class '{0}' not completed "
+                             "by the deadline".format(self._entity), 504)
+            if any(task.cancelled() for task in tasks):
+                raise asyncio.CancelledError
+
         decoded: List = list()
-        coros = [acquire(register) for register in self.__register_maps.keys()]
-        for item in await asyncio.gather(*coros):
-            decoded += item  # item comprises multiple elements if map
+        for task, block in tasks.items():  # in order of the read plan
+            for register, _ in block:
+                if task.cancelled():
+                    decoded += self.__failed(
+                        register=register,
+                        quality=QUALITY_TIMEOUT,
+                        status="not completed by the deadline"
+                        if task in pending else "request cancelled"
+                    )
+                    continue
+                item = task.exception() or task.result()[register]
+                if isinstance(item, Exception):
+                    decoded += self.__failed(
+                        register=register,
+                        quality=QUALITY_BAD,
+                        status=item.detail if isinstance(item, MyException)
+                        else str(item)
+                    )
+                    continue
+                decoded += item  # multiple elements if map
 
         return [  # sort by feature
             {k: v for k, v in sorted(item.items())} for item in decoded
@@ -505,6 +845,7 @@ class _ObjectTypeAsync(object):
         :return:
         """
         self.updated_items.clear()  # reset
+        self.updated_registers.clear()
 
         match self._entity:
             case '4':
@@ -514,10 +855,9 @@ class _ObjectTypeAsync(object):
             # when attempting to writing to a read-only register, issue error
             case _:
                 for parameter, value in wr.items():
-                    for address, attributes in self.__register_maps.items():
-                        if attributes['parameter'] == parameter:
-                            detail = (("Parameter '{0}' of MODBUS register "
-                                       "class '{1}' is not appropriate!")
-                                      .format(parameter,
-                                              self._entity))
-                            _throw_error(detail, 202)
+                    if self.__parameter_register(parameter) is not None:
+                        detail = (("Parameter '{0}' of MODBUS register "
+                                   "class '{1}' is not appropriate!")
+                                  .format(parameter,
+                                          self._entity))
+                        _throw_error(detail, 202)
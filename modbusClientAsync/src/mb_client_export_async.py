@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+exporter pipeline: ships readouts to pluggable sinks, batched by size and
+time, each sink served by its own thread from a bounded queue, such that
+neither a slow nor an unavailable sink delays the readouts. Batches a sink
+fails to take are spilled to a disk-backed queue and replayed in order once
+it is available again.
+"""
+
+from threading import Thread, Lock, Event
+from queue import Queue, Empty, Full
+from typing import Dict, List, Any, TextIO
+import urllib.request
+import abc
+import json
+import os
+import re
+import sys
+import time
+import logging
+# internal
+from .mb_client_aux_async import _throw_error
+
+BATCH_SIZE = 100  # records per batch at most
+BATCH_INTERVAL = 1.  # seconds a record waits for its batch at most
+QUEUE_SIZE = 10_000  # records queued in memory per sink
+RETRY_INTERVAL = 5.  # seconds until an unavailable sink is retried
+SPILL_MAX_BYTES = 64 * 1024 ** 2  # disk consumed by the spill of a sink
+
+
+class Sink(abc.ABC):
+    """
+    base class of the sinks, a sink writes a batch of NDJSON lines or raises
+    an exception if unavailable. Sinks are invoked from the thread of their
+    exporter only.
+    """
+    name = "sink"
+
+    @abc.abstractmethod
+    def write(self, lines: List[str]) -> None:
+        """
+        :param lines: List of str - one JSON record each, without newline
+        """
+
+    def close(self) -> None:
+        pass
+
+
+class StdoutSink(Sink):
+    """records to stdout (or any text stream)"""
+
+    def __init__(self, file: TextIO = None):
+        self.name = "stdout"
+        self.__file = file
+
+    def write(self, lines: List[str]) -> None:
+        file = self.__file or sys.stdout
+        file.write("".join(line + "\n" for line in lines))
+        file.flush()
+
+
+class NDJSONSink(Sink):
+    """records appended to a NDJSON file"""
+
+    def __init__(self, filename: str):
+        self.name = "file_{0}".format(os.path.basename(filename))
+        self.__filename = filename
+        self.__file: TextIO | None = None
+
+    def write(self, lines: List[str]) -> None:
+        if self.__file is None:
+            self.__file = open(self.__filename, "a", encoding="utf-8")
+        self.__file.write("".join(line + "\n" for line in lines))
+        self.__file.flush()
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class HTTPSink(Sink):
+    """batches posted to a URL as NDJSON body"""
+
+    def __init__(
+            self,
+            url: str,
+            timeout: float = 5.,
+            headers: Dict[str, str] = None
+    ):
+        self.name = "http_{0}".format(url.split("://", 1)[-1])
+        self.__url = url
+        self.__timeout = timeout
+        self.__headers = {"Content-Type": "application/x-ndjson",
+                          **(headers or dict())}
+
+    def write(self, lines: List[str]) -> None:
+        request = urllib.request.Request(
+            url=self.__url,
+            data="".join(line + "\n" for line in lines).encode("utf-8"),
+            headers=self.__headers,
+            method="POST"
+        )
+        # raises HTTPError for status codes other than 2xx
+        with urllib.request.urlopen(request, timeout=self.__timeout):
+            pass
+
+
+def sink(target: str) -> Sink:
+    """
+    sink for a target given as string
+    :param target: str - "stdout", http(s) URL, or path of a NDJSON file
+    :return: Sink
+    """
+    if target == "stdout":
+        return StdoutSink()
+    if re.match(r'^https?://', target):
+        return HTTPSink(url=target)
+    return NDJSONSink(filename=target)
+
+
+class _SpillQueue(object):
+    """
+    disk-backed queue of batches, one NDJSON file each, named in order such
+    that batches left by a previous run are replayed first. If more than
+    max_bytes are occupied the oldest batches are discarded.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            max_bytes: int = None
+    ):
+        self.__directory = directory
+        self.__max_bytes = max_bytes or SPILL_MAX_BYTES
+        os.makedirs(directory, exist_ok=True)
+        self.__files = sorted(
+            f for f in os.listdir(directory) if f.endswith(".ndjson")
+        )
+        self.__sizes: Dict[str, int] = dict()
+        self.__records: Dict[str, int] = dict()
+        for name in self.__files:  # left by a previous run
+            with open(self.__path(name), encoding="utf-8") as f:
+                content = f.read()
+            self.__sizes[name] = len(content)
+            self.__records[name] = content.count("\n")
+        self.__seq = int(self.__files[-1].split(".")[0]) + 1 \
+            if self.__files else 0
+        self.discarded = 0  # records
+
+    def __len__(self) -> int:
+        return len(self.__files)
+
+    @property
+    def records(self) -> int:
+        """records spilled"""
+        return sum(self.__records.values())
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.__directory, name)
+
+    def push(self, lines: List[str]) -> None:
+        """
+        store a batch, the file is renamed once completely written
+        :param lines: List of str
+        """
+        name = "{0:012d}.ndjson".format(self.__seq)
+        self.__seq += 1
+        content = "".join(line + "\n" for line in lines)
+        with open(self.__path(name + ".tmp"), "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(self.__path(name + ".tmp"), self.__path(name))
+        self.__files.append(name)
+        self.__sizes[name] = len(content)
+        self.__records[name] = len(lines)
+        while (sum(self.__sizes.values()) > self.__max_bytes
+               and len(self.__files) > 1):
+            self.discarded += self.__records[self.__files[0]]
+            logging.warning("Spill of {0} exceeds {1} bytes, oldest batch "
+                            "discarded".format(self.__directory,
+                                               self.__max_bytes))
+            self.pop()
+
+    def peek(self) -> List[str]:
+        """
+        :return: List of str - the oldest batch
+        """
+        with open(self.__path(self.__files[0]), encoding="utf-8") as f:
+            return f.read().splitlines()
+
+    def pop(self) -> None:
+        """remove the oldest batch"""
+        name = self.__files.pop(0)
+        del self.__sizes[name]
+        del self.__records[name]
+        os.remove(self.__path(name))
+
+
+class _SinkWorker(object):
+    """bounded queue and thread serving one sink"""
+
+    def __init__(
+            self,
+            sink: Sink,
+            batch_size: int,
+            batch_interval: float,
+            queue_size: int,
+            retry_interval: float,
+            spill_dir: str | None,
+            spill_max_bytes: int | None
+    ):
+        self.sink = sink
+        self.__batch_size = batch_size
+        self.__batch_interval = batch_interval
+        self.__retry_interval = retry_interval
+        self.__queue: Queue = Queue(maxsize=queue_size)
+        self.__spill = _SpillQueue(
+            directory=os.path.join(spill_dir,
+                                   re.sub(r'[^\w.-]', '_', sink.name)),
+            max_bytes=spill_max_bytes
+        ) if spill_dir else None
+        # the spill is written by the thread of the worker only, the lock
+        # guards the stats read from other threads
+        self.__spill_lock = Lock()
+        self.__retry_at = 0.  # monotonic time the sink is retried
+        self.__stop = Event()
+        self.__counts = {"sent": 0, "dropped": 0, "failures": 0}
+        self.__thread = Thread(target=self.__run,
+                               name="Exporter {0}".format(sink.name),
+                               daemon=True)
+        self.__thread.start()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self.__spill_lock:
+            stats = {
+                "queued": self.__queue.qsize(),
+                "spilled": self.__spill.records if self.__spill else 0,
+                "available": self.__retry_at <= time.monotonic(),
+                **self.__counts
+            }
+            if self.__spill:  # discarded for exceeding the spill size
+                stats["dropped"] += self.__spill.discarded
+        return stats
+
+    def offer(self, line: str) -> None:
+        """
+        enqueue a record without blocking, if the queue is full it is
+        dropped: spilling it here would overtake the records queued
+        :param line: str - JSON record
+        """
+        try:
+            self.__queue.put_nowait(line)
+        except Full:
+            with self.__spill_lock:
+                self.__counts["dropped"] += 1
+
+    def __store(self, lines: List[str]) -> None:
+        """spill a batch not taken by the sink"""
+        with self.__spill_lock:
+            if self.__spill is None:
+                self.__counts["dropped"] += len(lines)
+                return
+            self.__spill.push(lines)
+
+    def __collect(self) -> List[str]:
+        """
+        :return: List of str - batch, complete by size or time
+        """
+        batch = list()
+        try:
+            batch.append(self.__queue.get(timeout=self.__batch_interval)
+                         if not self.__stop.is_set()
+                         else self.__queue.get_nowait())
+        except Empty:
+            return batch
+        due = time.monotonic() + self.__batch_interval
+        while len(batch) < self.__batch_size:
+            remaining = due - time.monotonic()
+            try:
+                batch.append(self.__queue.get(timeout=max(remaining, 0.))
+                             if remaining > 0 and not self.__stop.is_set()
+                             else self.__queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def __send(self, lines: List[str]) -> bool:
+        """
+        :param lines: List of str
+        :return: bool - taken by the sink
+        """
+        try:
+            self.sink.write(lines)
+        except Exception as e:
+            self.__counts["failures"] += 1
+            self.__retry_at = time.monotonic() + self.__retry_interval
+            logging.warning("Sink {0} unavailable, retry in {1} sec: {2}"
+                            .format(self.sink.name, self.__retry_interval,
+                                    str(e)))
+            return False
+        self.__counts["sent"] += len(lines)
+        return True
+
+    def __replay(self) -> bool:
+        """
+        replay the spill in order
+        :return: bool - spill empty
+        """
+        while True:
+            with self.__spill_lock:
+                if not self.__spill:
+                    return True
+                lines = self.__spill.peek()
+            if not self.__send(lines):
+                return False
+            with self.__spill_lock:
+                self.__spill.pop()
+
+    def __run(self) -> None:
+        while True:
+            stopping = self.__stop.is_set()
+            batch = self.__collect()
+            available = self.__retry_at <= time.monotonic()
+            if self.__spill is not None and available:
+                # batches spilled go first, to keep the order
+                available = self.__replay()
+            if batch:
+                if not (available and self.__send(batch)):
+                    self.__store(batch)
+            if stopping and self.__queue.empty():
+                return
+
+    def close(self, timeout: float = None) -> None:
+        """
+        flush the queue, records the sink does not take are spilled
+        :param timeout: float - seconds to wait for the thread
+        """
+        self.__stop.set()
+        self.__thread.join(timeout)
+        self.sink.close()
+
+
+class Exporter(object):
+
+    def __init__(
+            self,
+            sinks: List[Sink | str],
+            *,
+            batch_size: int = None,
+            batch_interval: float = None,
+            queue_size: int = None,
+            retry_interval: float = None,
+            spill_dir: str = None,
+            spill_max_bytes: int = None
+    ):
+        """
+        ship records to sinks, each served by its own thread
+        :param sinks: List of Sink or str - see sink()
+        :param batch_size: int - records per batch at most (default: 100)
+        :param batch_interval: float - seconds a record waits for its batch
+        at most (default: 1)
+        :param queue_size: int - records queued in memory per sink (default:
+        10000), further records are dropped, e.g. while a sink is slower
+        than the readouts
+        :param retry_interval: float - seconds until an unavailable sink is
+        retried (default: 5)
+        :param spill_dir: str - directory of the disk-backed queues, one
+        subdirectory per sink (default: None, i.e. records not taken by a
+        sink are dropped)
+        :param spill_max_bytes: int - disk consumed by the spill of a sink at
+        most, the oldest batches are discarded beyond (default: 64 MiB)
+        """
+        if not sinks:
+            _throw_error("Exporter requires at least one sink", 422)
+        if batch_size is not None and batch_size < 1:
+            _throw_error("Batch size must be positive", 422)
+        self.__workers = [
+            _SinkWorker(
+                sink=s if isinstance(s, Sink) else sink(s),
+                batch_size=batch_size or BATCH_SIZE,
+                batch_interval=batch_interval or BATCH_INTERVAL,
+                queue_size=queue_size or QUEUE_SIZE,
+                retry_interval=retry_interval or RETRY_INTERVAL,
+                spill_dir=spill_dir,
+                spill_max_bytes=spill_max_bytes
+            )
+            for s in sinks
+        ]
+        self.__clients: List[Any] = list()
+        self.__closed = False
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """records queued, spilled, sent and dropped by sink"""
+        return {worker.sink.name: worker.stats for worker in self.__workers}
+
+    def submit(self, record: Dict[str, Any]) -> None:
+        """
+        export a record, never blocks on the sinks
+        :param record: Dict - e.g. as of read_register
+        """
+        if self.__closed:
+            _throw_error("Exporter closed", 500)
+        line = json.dumps(record)  # snapshot of the record as of now
+        for worker in self.__workers:
+            worker.offer(line)
+
+    def __on_snapshot(
+            self,
+            snapshot: Dict[str, Any] | None,
+            changed: List[Dict]
+    ) -> None:
+        if snapshot is not None:
+            self.submit(snapshot)
+
+    def attach(self, client) -> None:
+        """
+        export each update of the snapshot of a client
+        :param client: MODBUSClientAsync or MODBUSClientSync
+        """
+        client.subscribe(self.__on_snapshot)
+        self.__clients.append(client)
+
+    def detach(self, client) -> None:
+        """
+        :param client: as attached
+        """
+        client.unsubscribe(self.__on_snapshot)
+        self.__clients.remove(client)
+
+    def close(self, timeout: float = None) -> None:
+        """
+        detach from all clients and flush the queues
+        :param timeout: float - seconds to wait for each sink
+        """
+        if self.__closed:
+            return
+        for client in list(self.__clients):
+            self.detach(client)
+        self.__closed = True
+        for worker in self.__workers:
+            worker.close(timeout)
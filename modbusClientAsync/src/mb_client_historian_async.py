@@ -0,0 +1,841 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+historian: local history of readouts in compressed, time-partitioned segment
+files, one directory per host. Rows of a readout share one timestamp column,
+encoded as delta of deltas, floats are XOR compressed per parameter (Gorilla,
+Pelkonen et al., VLDB 2015), whereas bools, ints and decimals (e.g. registers
+scaled by a multiplier) are delta coded as integers; runs of values unchanged
+are coded by their length. Segments are read via mmap, chunks outside the
+range queried are skipped by their headers.
+
+segment file <host>/<start epoch sec>.hseg:
+    magic, then records of type (1 byte), length (uint32), payload
+    'S' schema: varint no of parameters, varint length + utf-8 name each
+    'C' chunk:  schema id (uint16), rows (uint32), first, min, max timestamp
+                (int64 ms), uint32 length + timestamps, then each parameter:
+                kind (b: bool, i: int, d + decimal places, f: float),
+                varint no of rows missing, varint deltas of rows missing,
+                uint32 length + values
+"""
+
+from threading import Thread, Lock, Event
+from typing import Dict, List, Any, Tuple, Iterator
+import datetime
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import time
+import logging
+# internal
+from .mb_client_aux_async import _throw_error
+from .mb_client_core_async import QUALITY_GOOD
+from .mb_client_export_async import Sink
+
+MAGIC = b"MBH1"
+SEGMENT_DURATION = 86_400  # seconds per segment file
+CHUNK_ROWS = 3_600  # rows per chunk at most
+FLUSH_INTERVAL = 300  # seconds a row is held in memory at most
+AGGREGATES = ("mean", "min", "max", "first", "last", "count")
+_RECORD = struct.Struct("<cI")
+_CHUNK = struct.Struct("<HIqqq")
+_LENGTH = struct.Struct("<I")
+_FLOAT = struct.Struct(">d")
+_UINT = struct.Struct(">Q")
+
+
+class _BitWriter(object):
+
+    def __init__(self):
+        self.__out = bytearray()
+        self.__acc = 0
+        self.__bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        self.__acc = (self.__acc << bits) | (value & ((1 << bits) - 1))
+        self.__bits += bits
+        while self.__bits >= 8:
+            self.__bits -= 8
+            self.__out.append((self.__acc >> self.__bits) & 0xFF)
+        self.__acc &= (1 << self.__bits) - 1
+
+    def bytes(self) -> bytes:
+        if self.__bits:
+            return bytes(self.__out) + bytes(
+                [(self.__acc << (8 - self.__bits)) & 0xFF])
+        return bytes(self.__out)
+
+
+class _BitReader(object):
+
+    def __init__(self, buffer: bytes):
+        self.__value = int.from_bytes(buffer, "big")
+        self.__remaining = len(buffer) * 8
+
+    def read(self, bits: int) -> int:
+        self.__remaining -= bits
+        return (self.__value >> self.__remaining) & ((1 << bits) - 1)
+
+
+def _signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+
+# delta of delta ranges: control bits, no of control bits, no of value bits
+_DOD_RANGES = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+
+def _encode_timestamps(timestamps: List[int]) -> bytes:
+    """
+    :param timestamps: List of int - ms, first one kept in chunk header
+    :return: bytes - delta of deltas of the following ones
+    """
+    writer = _BitWriter()
+    delta = 0
+    for previous, current in zip(timestamps, timestamps[1:]):
+        dod = (current - previous) - delta
+        delta = current - previous
+        if dod == 0:
+            writer.write(0, 1)
+            continue
+        for control, control_bits, bits in _DOD_RANGES:
+            if -(1 << (bits - 1)) < dod <= 1 << (bits - 1):
+                writer.write(control, control_bits)
+                writer.write(dod - 1 if dod > 0 else dod, bits)
+                break
+        else:
+            writer.write(0b1111, 4)
+            writer.write(dod, 64)
+    return writer.bytes()
+
+
+def _decode_timestamps(
+        buffer: bytes,
+        first: int,
+        rows: int
+) -> List[int]:
+    reader = _BitReader(buffer)
+    timestamps = [first]
+    delta = 0
+    for _ in range(rows - 1):
+        if not reader.read(1):
+            dod = 0
+        else:
+            for _, _, bits in _DOD_RANGES:
+                if not reader.read(1):
+                    dod = _signed(reader.read(bits), bits)
+                    dod = dod + 1 if dod >= 0 else dod
+                    break
+            else:
+                dod = _signed(reader.read(64), 64)
+        delta += dod
+        timestamps.append(timestamps[-1] + delta)
+    return timestamps
+
+
+def _write_run(writer: _BitWriter, run: int) -> None:
+    """run of values unchanged, Elias gamma coded"""
+    writer.write(0, 1)
+    writer.write(0, run.bit_length() - 1)
+    writer.write(run, run.bit_length())
+
+
+def _read_run(reader: _BitReader) -> int:
+    zeros = 0
+    while not reader.read(1):
+        zeros += 1
+    return (1 << zeros) | reader.read(zeros)
+
+
+# delta ranges: control bits, no of control bits, no of value bits
+_DELTA_RANGES = ((0b10, 2, 4), (0b110, 3, 12), (0b1110, 4, 24))
+
+
+def _encode_integers(values: List[int]) -> bytes:
+    """
+    :param values: List of int
+    :return: bytes - deltas to the previous value (the first one to 0), runs
+    of values unchanged coded as their length
+    """
+    writer = _BitWriter()
+    previous = run = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+        if delta == 0:
+            run += 1
+            continue
+        if run:
+            _write_run(writer, run)
+            run = 0
+        for control, control_bits, bits in _DELTA_RANGES:
+            if -(1 << (bits - 1)) <= delta < 1 << (bits - 1):
+                writer.write(control, control_bits)
+                writer.write(delta, bits)
+                break
+        else:  # length (7 bits), then zigzag coded delta
+            zigzag = delta * 2 if delta > 0 else -delta * 2 - 1
+            writer.write(0b1111, 4)
+            writer.write(zigzag.bit_length(), 7)
+            writer.write(zigzag, zigzag.bit_length())
+    if run:
+        _write_run(writer, run)
+    return writer.bytes()
+
+
+def _decode_integers(
+        buffer: bytes,
+        count: int
+) -> List[int]:
+    reader = _BitReader(buffer)
+    values = list()
+    value = 0
+    while len(values) < count:
+        if not reader.read(1):
+            values.extend([value] * _read_run(reader))
+            continue
+        for _, _, bits in _DELTA_RANGES:
+            if not reader.read(1):
+                value += _signed(reader.read(bits), bits)
+                break
+        else:
+            zigzag = reader.read(reader.read(7))
+            value += zigzag // 2 if not zigzag & 1 else -(zigzag + 1) // 2
+        values.append(value)
+    return values
+
+
+def _encode_floats(values: List[float]) -> bytes:
+    """
+    :param values: List of float
+    :return: bytes - first value, then XOR with the previous one, runs of
+    values unchanged coded as their length
+    """
+    writer = _BitWriter()
+    previous = run = 0
+    leading, trailing = 65, 0  # no window yet
+    for i, value in enumerate(values):
+        bits = _UINT.unpack(_FLOAT.pack(value))[0]
+        if i == 0:
+            writer.write(bits, 64)
+            previous = bits
+            continue
+        xor = bits ^ previous
+        previous = bits
+        if xor == 0:
+            run += 1
+            continue
+        if run:
+            _write_run(writer, run)
+            run = 0
+        lead = min(64 - xor.bit_length(), 31)
+        trail = (xor & -xor).bit_length() - 1
+        if lead >= leading and trail >= trailing:  # within previous window
+            writer.write(0b10, 2)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            leading, trailing = lead, trail
+            meaningful = 64 - lead - trail
+            writer.write(0b11, 2)
+            writer.write(lead, 5)
+            writer.write(meaningful & 63, 6)  # 64 stored as 0
+            writer.write(xor >> trail, meaningful)
+    if run:
+        _write_run(writer, run)
+    return writer.bytes()
+
+
+def _decode_floats(
+        buffer: bytes,
+        count: int
+) -> List[float]:
+    reader = _BitReader(buffer)
+    bits = reader.read(64)
+    values = [bits]
+    leading = trailing = 0
+    while len(values) < count:
+        if not reader.read(1):
+            values.extend([bits] * _read_run(reader))
+            continue
+        if reader.read(1):
+            leading = reader.read(5)
+            meaningful = reader.read(6) or 64
+            trailing = 64 - leading - meaningful
+        bits ^= reader.read(64 - leading - trailing) << trailing
+        values.append(bits)
+    return [_FLOAT.unpack(_UINT.pack(v))[0] for v in values]
+
+
+def _decimals(values: List[float]) -> int | None:
+    """
+    decimal places of values, e.g. registers scaled by a multiplier, such that
+    they are kept exactly as integers
+    :param values: List of float
+    :return: int - 0..6, None if not decimal
+    """
+    for scale in range(7):
+        factor = 10 ** scale
+        if all(abs(v) < 2 ** 53 / factor
+               and _FLOAT.pack(round(v * factor) / factor) == _FLOAT.pack(v)
+               for v in values):
+            return scale
+    return None
+
+
+def _encode_column(
+        values: List[Any],
+        kinds: set
+) -> Tuple[bytes, bytes]:
+    """
+    :param values: List - of a parameter
+    :param kinds: set - b (bool), i (int), f (float) of the values
+    :return: bytes - kind (b, i, d + decimal places, f), values encoded
+    """
+    if kinds <= {"b", "i"}:
+        kind = b"b" if kinds == {"b"} else b"i"
+        encoded = _encode_integers([int(v) for v in values])
+    else:
+        scale = _decimals(values)
+        if scale is not None:
+            kind = b"d" + bytes([scale])
+            encoded = _encode_integers(
+                [round(v * 10 ** scale) for v in values])
+        else:
+            kind = b"f"
+            encoded = _encode_floats([float(v) for v in values])
+    return kind, encoded
+
+
+def _decode_column(
+        kind: bytes,
+        buffer: bytes,
+        count: int
+) -> List[Any]:
+    """
+    :param kind: bytes - see _encode_column
+    :param buffer: bytes - values encoded
+    :param count: int - no of values
+    :return: List - values typed
+    """
+    if kind == b"f":
+        return _decode_floats(buffer, count)
+    values = _decode_integers(buffer, count)
+    if kind == b"b":
+        return [bool(v) for v in values]
+    if kind == b"i":
+        return values
+    factor = 10 ** kind[1]
+    return [v / factor for v in values]
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte, value = value & 0x7F, value >> 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+
+def _read_varint(
+        buffer: memoryview,
+        offset: int
+) -> Tuple[int, int]:
+    """
+    :return: value, offset after
+    """
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+
+def _timestamp_ms(timestamp: Any) -> int:
+    """
+    :param timestamp: datetime, ISO string, or epoch seconds (also as
+    string)
+    :return: int - epoch ms
+    """
+    if isinstance(timestamp, str) and re.match(r'^\d+(\.\d*)?$', timestamp):
+        timestamp = float(timestamp)
+    if isinstance(timestamp, (int, float)):
+        return int(round(timestamp * 1_000))
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+        except ValueError:
+            _throw_error("Invalid timestamp '{0}'".format(timestamp), 422)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return int(round(timestamp.timestamp() * 1_000))
+
+
+def _isoformat(ms: int) -> str:
+    return datetime.datetime.fromtimestamp(
+        ms / 1_000, tz=datetime.timezone.utc).isoformat()
+
+
+class _Segment(object):
+    """segment file currently appended to"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.schemas: Dict[Tuple[str, ...], int] = dict()
+        if os.path.exists(path):  # appended to after a restart
+            schemas, end = _scan(path)
+            self.schemas = {schema: i for i, schema in enumerate(schemas)}
+            self.__file = open(path, "ab")
+            self.__file.truncate(end)  # record not completely written
+        else:
+            self.__file = open(path, "ab")
+            self.__file.write(MAGIC)
+
+    def append(
+            self,
+            timestamps: List[int],
+            rows: List[Dict[str, Tuple[Any, str]]]
+    ) -> None:
+        """
+        :param timestamps: List of int - ms
+        :param rows: List of Dict {parameter: (value, kind)}
+        """
+        schema = tuple(sorted({p for row in rows for p in row}))
+        if not schema:
+            return
+        out = bytearray()
+        if schema not in self.schemas:
+            payload = _varint(len(schema)) + b"".join(
+                _varint(len(p.encode())) + p.encode() for p in schema)
+            out += _RECORD.pack(b"S", len(payload)) + payload
+            self.schemas[schema] = len(self.schemas)
+        payload = bytearray(_CHUNK.pack(self.schemas[schema], len(rows),
+                                        timestamps[0], min(timestamps),
+                                        max(timestamps)))
+        encoded = _encode_timestamps(timestamps)
+        payload += _LENGTH.pack(len(encoded)) + encoded
+        for parameter in schema:
+            missing = [i for i, row in enumerate(rows) if parameter not in row]
+            kind, encoded = _encode_column(
+                values=[row[parameter][0] for row in rows if parameter in row],
+                kinds={row[parameter][1] for row in rows if parameter in row}
+            )
+            payload += kind
+            payload += _varint(len(missing)) + b"".join(
+                _varint(i - previous)
+                for previous, i in zip([0] + missing, missing))
+            payload += _LENGTH.pack(len(encoded)) + encoded
+        out += _RECORD.pack(b"C", len(payload)) + payload
+        self.__file.write(out)  # one write, a reader sees whole records
+        self.__file.flush()
+
+    def close(self) -> None:
+        self.__file.close()
+
+
+def _records(buffer: memoryview) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    records of a segment, a record not completely written is ignored
+    :param buffer: memoryview - segment file
+    :return: type, offset and length of the payload
+    """
+    offset = len(MAGIC)
+    while offset + _RECORD.size <= len(buffer):
+        kind, length = _RECORD.unpack_from(buffer, offset)
+        offset += _RECORD.size
+        if offset + length > len(buffer):
+            return
+        yield kind, offset, length
+        offset += length
+
+
+def _parse_schema(
+        buffer: memoryview,
+        offset: int
+) -> Tuple[str, ...]:
+    count, offset = _read_varint(buffer, offset)
+    schema = list()
+    for _ in range(count):
+        length, offset = _read_varint(buffer, offset)
+        schema.append(bytes(buffer[offset:offset + length]).decode())
+        offset += length
+    return tuple(schema)
+
+
+class _Mapped(object):
+    """segment file mapped read-only"""
+
+    def __init__(self, path: str):
+        self.__file = open(path, "rb")
+        size = os.fstat(self.__file.fileno()).st_size
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0,
+                                access=mmap.ACCESS_READ) if size else None
+        self.buffer = memoryview(self.__mmap if self.__mmap else b"")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.buffer.release()
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__file.close()
+
+
+def _scan(path: str) -> Tuple[List[Tuple[str, ...]], int]:
+    """
+    :return: schemas of a segment and the end of its last complete record
+    """
+    schemas = list()
+    end = len(MAGIC)
+    with _Mapped(path) as mapped:
+        for kind, offset, length in _records(mapped.buffer):
+            if kind == b"S":
+                schemas.append(_parse_schema(mapped.buffer, offset))
+            end = offset + length
+    return schemas, end
+
+
+def _read_segment(
+        path: str,
+        parameters: List[str] | None,
+        start: int,
+        end: int
+) -> Iterator[Tuple[str, List[Tuple[int, Any]]]]:
+    """
+    points of a segment within [start, end), only the chunks overlapping and
+    the parameters requested are decoded
+    :return: parameter, points (ms, value) of a chunk
+    """
+    with _Mapped(path) as mapped:
+        buffer = mapped.buffer
+        schemas: List[Tuple[str, ...]] = list()
+        for kind, offset, _ in _records(buffer):
+            if kind == b"S":
+                schemas.append(_parse_schema(buffer, offset))
+                continue
+            schema_id, rows, first, t_min, t_max = _CHUNK.unpack_from(
+                buffer, offset)
+            if t_max < start or t_min >= end:
+                continue
+            offset += _CHUNK.size
+            length, = _LENGTH.unpack_from(buffer, offset)
+            offset += _LENGTH.size
+            timestamps = _decode_timestamps(
+                buffer[offset:offset + length], first, rows)
+            offset += length
+            for parameter in schemas[schema_id]:
+                kind = bytes(buffer[offset:offset + 1])
+                if kind == b"d":  # decimal places
+                    kind = bytes(buffer[offset:offset + 2])
+                count, offset = _read_varint(buffer, offset + len(kind))
+                missing = set()
+                row = 0
+                for _ in range(count):
+                    delta, offset = _read_varint(buffer, offset)
+                    row += delta
+                    missing.add(row)
+                length, = _LENGTH.unpack_from(buffer, offset)
+                offset += _LENGTH.size
+                if parameters is None or parameter in parameters:
+                    values = _decode_column(kind,
+                                            buffer[offset:offset + length],
+                                            rows - count)
+                    present = [t for i, t in enumerate(timestamps)
+                               if i not in missing]
+                    points = [(t, v) for t, v in zip(present, values)
+                              if start <= t < end]
+                    yield parameter, points
+                offset += length
+
+
+class Historian(Sink):
+
+    def __init__(
+            self,
+            directory: str,
+            *,
+            segment_duration: int = None,
+            chunk_rows: int = None,
+            flush_interval: float = None,
+            retention: float = None
+    ):
+        """
+        local history of readouts, numeric values only (bools and ints
+        included), items of bad quality are omitted. Fed by append, attached
+        to an Exporter (as sink), or by attach to a client
+        :param directory: str - directory of the segment files
+        :param segment_duration: int - seconds per segment file (default:
+        86400)
+        :param chunk_rows: int - rows per chunk at most (default: 3600)
+        :param flush_interval: float - seconds rows are held in memory at most
+        before written, by a thread of its own if no readout follows
+        (default: 300)
+        :param retention: float - days segments are kept (default: None,
+        i.e. forever)
+        """
+        self.name = "historian"
+        self.__directory = directory
+        self.__segment_duration = segment_duration or SEGMENT_DURATION
+        self.__chunk_rows = chunk_rows or CHUNK_ROWS
+        self.__flush_interval = flush_interval or FLUSH_INTERVAL
+        self.__retention = retention
+        os.makedirs(directory, exist_ok=True)
+        self.__lock = Lock()
+        # per host: rows held in memory, time of first row held, segment
+        self.__timestamps: Dict[str, List[int]] = dict()
+        self.__rows: Dict[str, List[Dict[str, Tuple[Any, str]]]] = dict()
+        self.__held_since: Dict[str, float] = dict()
+        self.__segments: Dict[str, _Segment] = dict()
+        # rows of a host no longer reporting are written when due as well
+        self.__stop = Event()
+        self.__thread = Thread(target=self.__run, name="Historian flush",
+                               daemon=True)
+        self.__thread.start()
+
+    def __host_dir(self, host: str) -> str:
+        return os.path.join(self.__directory, re.sub(r'[^\w.-]', '_', host))
+
+    @property
+    def hosts(self) -> List[str]:
+        """directories of the hosts recorded"""
+        return sorted(
+            d for d in os.listdir(self.__directory)
+            if os.path.isdir(os.path.join(self.__directory, d))
+        )
+
+    def append(self, readout: Dict[str, Any]) -> None:
+        """
+        record a readout
+        :param readout: Dict - as of read_register, records without data
+        (e.g. errors) are ignored
+        """
+        if not readout.get('data') or not readout.get('host'):
+            return
+        timestamp = _timestamp_ms(readout.get('updated')
+                                  or readout['timestamp'])
+        row = dict()
+        for item in readout['data']:
+            value = item.get('value')
+            if item.get('quality', QUALITY_GOOD) != QUALITY_GOOD:
+                continue
+            if isinstance(value, bool):
+                row[item['parameter']] = (value, "b")
+            elif isinstance(value, int):
+                row[item['parameter']] = (value, "i")
+            elif isinstance(value, float) and math.isfinite(value):
+                row[item['parameter']] = (value, "f")
+        host = readout['host']
+        with self.__lock:
+            timestamps = self.__timestamps.setdefault(host, list())
+            if timestamps and (
+                    timestamp // (self.__segment_duration * 1_000)
+                    != timestamps[0] // (self.__segment_duration * 1_000)):
+                self.__flush(host)  # rows of a chunk share their segment
+            if not self.__timestamps[host]:
+                self.__held_since[host] = time.monotonic()
+            self.__timestamps[host].append(timestamp)
+            self.__rows.setdefault(host, list()).append(row)
+            if (len(self.__timestamps[host]) >= self.__chunk_rows
+                    or time.monotonic() - self.__held_since[host]
+                    >= self.__flush_interval):
+                self.__flush(host)
+
+    def write(self, lines: List[str]) -> None:
+        """Sink interface of the Exporter"""
+        for line in lines:
+            self.append(json.loads(line))
+
+    def __flush(self, host: str) -> None:
+        """write the rows held of a host as chunk"""
+        timestamps = self.__timestamps.get(host)
+        if not timestamps:
+            return
+        start = (timestamps[0] // (self.__segment_duration * 1_000)
+                 * self.__segment_duration)
+        path = os.path.join(self.__host_dir(host),
+                            "{0:010d}.hseg".format(start))
+        segment = self.__segments.get(host)
+        if segment is None or segment.path != path:
+            if segment is not None:
+                segment.close()
+            os.makedirs(self.__host_dir(host), exist_ok=True)
+            segment = self.__segments[host] = _Segment(path)
+            self.__expire(host)
+        segment.append(timestamps, self.__rows[host])
+        self.__timestamps[host] = list()
+        self.__rows[host] = list()
+
+    def __expire(self, host: str) -> None:
+        """remove the segments beyond retention"""
+        if self.__retention is None:
+            return
+        oldest = (time.time() - self.__retention * 86_400
+                  - self.__segment_duration)
+        for path in self.__paths(host):
+            if int(os.path.basename(path).split(".")[0]) < oldest:
+                os.remove(path)
+
+    def __paths(self, host: str) -> List[str]:
+        directory = self.__host_dir(host)
+        if not os.path.isdir(directory):
+            return list()
+        return [os.path.join(directory, f)
+                for f in sorted(os.listdir(directory)) if f.endswith(".hseg")]
+
+    def __run(self) -> None:
+        """write the rows held for flush_interval, until closed"""
+        timeout = self.__flush_interval
+        while not self.__stop.wait(timeout):
+            with self.__lock:
+                now = time.monotonic()
+                due = now + self.__flush_interval
+                for host, since in self.__held_since.items():
+                    if not self.__timestamps.get(host):
+                        continue
+                    if now - since < self.__flush_interval:
+                        due = min(due, since + self.__flush_interval)
+                        continue
+                    try:
+                        self.__flush(host)
+                    except Exception as e:  # held, retried when due again
+                        self.__held_since[host] = now
+                        logging.warning("Could not write history of {0}: {1}"
+                                        .format(host, str(e)))
+            timeout = max(due - time.monotonic(), 0.)
+
+    def flush(self) -> None:
+        """write all rows held in memory"""
+        with self.__lock:
+            for host in list(self.__timestamps):
+                self.__flush(host)
+
+    def close(self) -> None:
+        self.__stop.set()
+        self.__thread.join()
+        with self.__lock:
+            for host in list(self.__timestamps):
+                self.__flush(host)
+            for segment in self.__segments.values():
+                segment.close()
+            self.__segments.clear()
+
+    def __on_snapshot(
+            self,
+            snapshot: Dict[str, Any] | None,
+            changed: List[Dict]
+    ) -> None:
+        if snapshot is not None:
+            self.append(snapshot)
+
+    def attach(self, client) -> None:
+        """
+        record each update of the snapshot of a client, in the task of its
+        readout; an Exporter decouples the readouts from the disk instead
+        :param client: MODBUSClientAsync or MODBUSClientSync
+        """
+        client.subscribe(self.__on_snapshot)
+
+    def detach(self, client) -> None:
+        client.unsubscribe(self.__on_snapshot)
+
+    def query(
+            self,
+            host: str,
+            parameters: List[str] = None,
+            start: Any = None,
+            end: Any = None,
+            step: float = None,
+            aggregate: str = "mean"
+    ) -> Dict[str, Any]:
+        """
+        points of a host within [start, end), optionally downsampled
+        :param host: str - as in the readouts
+        :param parameters: List of str - default: all
+        :param start: datetime, ISO string or epoch sec - default: first one
+        :param end: datetime, ISO string or epoch sec - default: now
+        :param step: float - seconds per bucket, default: no downsampling
+        :param aggregate: str - of the points of a bucket: mean, min, max,
+        first, last, count
+        :return: Dict {"host", "start", "end", "step", "aggregate", "series":
+        {parameter: [[timestamp, value], ...]}}
+        """
+        if aggregate not in AGGREGATES:
+            _throw_error("Aggregate '{0}' not in {1}".format(
+                aggregate, ", ".join(AGGREGATES)), 422)
+        if step is not None and step <= 0:
+            _throw_error("Step must be positive", 422)
+        start_ms = _timestamp_ms(start) if start is not None else 0
+        end_ms = _timestamp_ms(end if end is not None else time.time())
+        paths = [
+            p for p in self.__paths(host)
+            if int(os.path.basename(p).split(".")[0]) * 1_000
+            + self.__segment_duration * 1_000 > start_ms
+            and int(os.path.basename(p).split(".")[0]) * 1_000 < end_ms
+        ]
+        with self.__lock:  # rows not written yet
+            held = list(zip(self.__timestamps.get(host, list()),
+                            self.__rows.get(host, list())))
+        if not paths and not held:
+            _throw_error("No history of host '{0}'".format(host), 404)
+
+        points: Dict[str, List[Tuple[int, Any]]] = dict()
+        for path in paths:
+            for parameter, segment_points in _read_segment(
+                    path, parameters, start_ms, end_ms):
+                points.setdefault(parameter, list()).extend(segment_points)
+        for timestamp, row in held:
+            if not start_ms <= timestamp < end_ms:
+                continue
+            for parameter, (value, _) in row.items():
+                if parameters is None or parameter in parameters:
+                    points.setdefault(parameter, list()).append(
+                        (timestamp, value))
+
+        series = dict()
+        for parameter in sorted(points):
+            values = sorted(points[parameter], key=lambda p: p[0])
+            if step is not None:
+                values = _downsample(values, int(step * 1_000), aggregate)
+            series[parameter] = [[_isoformat(t), v] for t, v in values]
+
+        return {
+            "host": host,
+            "start": _isoformat(start_ms) if start is not None else None,
+            "end": _isoformat(end_ms),
+            "step": step,
+            "aggregate": aggregate if step is not None else None,
+            "series": series
+        }
+
+
+def _downsample(
+        points: List[Tuple[int, Any]],
+        step: int,
+        aggregate: str
+) -> List[Tuple[int, Any]]:
+    """
+    :param points: List of (ms, value), in order
+    :param step: int - ms per bucket, aligned to the epoch
+    :param aggregate: str
+    :return: List of (bucket start ms, aggregate)
+    """
+    buckets: Dict[int, List[Any]] = dict()
+    for t, v in points:
+        buckets.setdefault(t // step * step, list()).append(v)
+    functions = {
+        "mean": lambda v: sum(v) / len(v),
+        "min": min,
+        "max": max,
+        "first": lambda v: v[0],
+        "last": lambda v: v[-1],
+        "count": len
+    }
+    return [(t, functions[aggregate](v)) for t, v in buckets.items()]
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+shared-memory segment of the latest snapshots: one poller process publishes
+the snapshot of each host, any local process, e.g. the workers of the
+RestAPI, reads them without a client of its own, i.e. without touching the
+device or the network.
+
+segment:
+    header: magic, no of slots (uint32), slot size (uint32)
+    slots of slot size each, one per host, assigned on its first snapshot
+    slot header: sequence (uint64), length of host (uint16), host (64 bytes),
+                 length of the payload (uint32)
+    payload: snapshot as JSON
+
+each slot is a seqlock: the publisher increments the sequence before and
+after a write, it is odd while the slot is written. A reader copies the slot
+and retries unless the sequence was even and unchanged meanwhile, hence it
+neither blocks the publisher nor sees a snapshot partly written.
+"""
+
+from multiprocessing import shared_memory, resource_tracker
+from threading import Lock
+from typing import Dict, List, Tuple, Any
+import json
+import struct
+import time
+import logging
+# internal
+from .mb_client_aux_async import _throw_error
+
+MAGIC = b"MBS1"
+SLOTS = 64
+SLOT_SIZE = 256 * 1024  # bytes per host, incl. the slot header
+READ_TIMEOUT = 1.  # sec a reader retries while a slot is written
+_HEADER = struct.Struct("<4sII4x")
+_SLOT = struct.Struct("<QH64sI2x")
+_SEQUENCE = struct.Struct("<Q")
+_HOST_SIZE = 64
+
+
+def _attach(name: str) -> shared_memory.SharedMemory | None:
+    """
+    :param name: str - of the segment
+    :return: SharedMemory - None if the segment does not exist
+    """
+    try:
+        segment = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return None
+    # the segment outlives the processes attached, the resource tracker
+    # would otherwise unlink it as soon as this process exits
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class SnapshotPublisher(object):
+    """
+    publishes the snapshots of the clients attached into a shared-memory
+    segment; there is a single publisher per segment
+    """
+
+    def __init__(
+            self,
+            name: str,
+            *,
+            slots: int = None,
+            slot_size: int = None
+    ):
+        """
+        :param name: str - of the segment, e.g. "modbus"
+        :param slots: int - hosts published at most (default: 64)
+        :param slot_size: int - bytes per host, incl. a header of 80 bytes
+        (default: 256 KiB)
+        """
+        self.__slots = slots or SLOTS
+        self.__slot_size = slot_size or SLOT_SIZE
+        if self.__slot_size <= _SLOT.size:
+            _throw_error("Slot size must exceed {0} bytes"
+                         .format(_SLOT.size), 422)
+        self.__segment = _attach(name)
+        if self.__segment is None:
+            self.__segment = shared_memory.SharedMemory(
+                name=name,
+                create=True,
+                size=_HEADER.size + self.__slots * self.__slot_size)
+            resource_tracker.unregister(self.__segment._name,
+                                        "shared_memory")
+            _HEADER.pack_into(self.__segment.buf, 0, MAGIC, self.__slots,
+                              self.__slot_size)
+        elif _HEADER.unpack_from(self.__segment.buf, 0) != (
+                MAGIC, self.__slots, self.__slot_size):
+            self.__segment.close()
+            _throw_error("Segment '{0}' exists with another layout"
+                         .format(name), 409)
+        self.__name = name
+        self.__lock = Lock()
+        # slots of a previous publisher are taken over, as are their hosts
+        self.__index: Dict[str, int] = dict()
+        for index in range(self.__slots):
+            _, length, host, _ = _SLOT.unpack_from(self.__segment.buf,
+                                                   self.__offset(index))
+            if length:
+                self.__index[host[:length].decode()] = index
+        logging.info("Publishing snapshots to segment '{0}'".format(name))
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    def __offset(self, index: int) -> int:
+        return _HEADER.size + index * self.__slot_size
+
+    def publish(self, snapshot: Dict[str, Any]) -> None:
+        """
+        :param snapshot: Dict - as of read_register
+        """
+        host = snapshot['host']
+        payload = json.dumps(snapshot).encode()
+        if _SLOT.size + len(payload) > self.__slot_size:
+            _throw_error("Snapshot of {0} exceeds the slot size: {1} bytes"
+                         .format(host, len(payload)), 413)
+        encoded = host.encode()
+        if len(encoded) > _HOST_SIZE:
+            _throw_error("Host name exceeds {0} bytes: {1}"
+                         .format(_HOST_SIZE, host), 422)
+        buf = self.__segment.buf
+        with self.__lock:
+            index = self.__index.get(host)
+            if index is None:
+                if len(self.__index) >= self.__slots:
+                    _throw_error("No slot left in segment '{0}' for {1}"
+                                 .format(self.__name, host), 507)
+                index = self.__index[host] = len(self.__index)
+            offset = self.__offset(index)
+            sequence = _SEQUENCE.unpack_from(buf, offset)[0]
+            sequence += sequence & 1  # publisher died within a write
+            _SEQUENCE.pack_into(buf, offset, sequence + 1)  # odd: writing
+            _SLOT.pack_into(buf, offset, sequence + 1, len(encoded), encoded,
+                            len(payload))
+            buf[offset + _SLOT.size:
+                offset + _SLOT.size + len(payload)] = payload
+            _SEQUENCE.pack_into(buf, offset, sequence + 2)
+
+    def __on_snapshot(
+            self,
+            snapshot: Dict[str, Any] | None,
+            changed: List[Dict]
+    ) -> None:
+        if snapshot is not None:
+            self.publish(snapshot)
+
+    def attach(self, client) -> None:
+        """
+        publish each update of the snapshot of a client, by a readout or a
+        write
+        :param client: MODBUSClientAsync or MODBUSClientSync
+        """
+        client.subscribe(self.__on_snapshot)
+
+    def detach(self, client) -> None:
+        client.unsubscribe(self.__on_snapshot)
+
+    def close(self) -> None:
+        """
+        the segment is kept, along with the last snapshots, for its readers
+        and the next publisher, see unlink
+        """
+        self.__segment.close()
+
+    def unlink(self) -> None:
+        """remove the segment, readers attached keep their mapping"""
+        # registered again, as unlink unregisters it
+        resource_tracker.register(self.__segment._name, "shared_memory")
+        self.__segment.unlink()
+
+
+class SnapshotReader(object):
+    """
+    reads consistent snapshots from the segment of a SnapshotPublisher, it
+    is attached to on the first read once published
+    """
+
+    def __init__(
+            self,
+            name: str,
+            timeout: float = None
+    ):
+        """
+        :param name: str - of the segment
+        :param timeout: float - sec a read retries while the slot is written
+        (default: 1)
+        """
+        self.__name = name
+        self.__timeout = timeout or READ_TIMEOUT
+        self.__segment: shared_memory.SharedMemory | None = None
+        self.__slots = self.__slot_size = 0
+        self.__index: Dict[str, int] = dict()
+        self.__lock = Lock()
+
+    def __buffer(self) -> memoryview | None:
+        """
+        :return: memoryview - of the segment, None if not published yet
+        """
+        with self.__lock:
+            if self.__segment is None:
+                segment = _attach(self.__name)
+                if segment is None:
+                    return None
+                magic, slots, slot_size = _HEADER.unpack_from(segment.buf, 0)
+                if magic != MAGIC:
+                    segment.close()
+                    _throw_error("No snapshot segment: '{0}'"
+                                 .format(self.__name), 422)
+                self.__segment = segment
+                self.__slots, self.__slot_size = slots, slot_size
+            return self.__segment.buf
+
+    def __read_slot(
+            self,
+            buf: memoryview,
+            index: int,
+            payload: bool = True
+    ) -> Tuple[int, str, bytes]:
+        """
+        :param payload: bool - copied, otherwise the slot header only
+        :return: sequence, host and payload of a slot, copied consistently
+        """
+        offset = _HEADER.size + index * self.__slot_size
+        deadline = time.monotonic() + self.__timeout
+        while True:
+            sequence = _SEQUENCE.unpack_from(buf, offset)[0]
+            if not sequence & 1:
+                _, length, host, size = _SLOT.unpack_from(buf, offset)
+                size = min(size, self.__slot_size - _SLOT.size) \
+                    if payload else 0
+                data = bytes(buf[offset + _SLOT.size:
+                                 offset + _SLOT.size + size])
+                if _SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                    return sequence, host[:length].decode(), data
+            if time.monotonic() > deadline:
+                _throw_error("Slot {0} of segment '{1}' not released"
+                             .format(index, self.__name), 503)
+            time.sleep(0)  # publisher writing, yield
+
+    def __lookup(
+            self,
+            buf: memoryview,
+            host: str
+    ) -> int | None:
+        """
+        :return: int - slot of a host, None if not published; a slot, once
+        assigned, keeps its host
+        """
+        if host not in self.__index:
+            for index in range(self.__slots):
+                sequence, name, _ = self.__read_slot(buf, index,
+                                                     payload=False)
+                if not sequence:
+                    break  # slots are assigned in order
+                self.__index.setdefault(name, index)
+        return self.__index.get(host)
+
+    @property
+    def hosts(self) -> List[str]:
+        """hosts published"""
+        buf = self.__buffer()
+        if buf is None:
+            return list()
+        self.__lookup(buf, "")
+        return list(self.__index)
+
+    def version(self, host: str) -> int:
+        """
+        :param host: str - as in the snapshots
+        :return: int - no of snapshots published for a host, 0 if none, a
+        cheap check for an update
+        """
+        buf = self.__buffer()
+        index = self.__lookup(buf, host) if buf is not None else None
+        if index is None:
+            return 0
+        return self.__read_slot(buf, index, payload=False)[0] // 2
+
+    def read(self, host: str) -> Dict[str, Any] | None:
+        """
+        :param host: str - as in the snapshots
+        :return: Dict - latest snapshot of a host, None if not published
+        """
+        buf = self.__buffer()
+        index = self.__lookup(buf, host) if buf is not None else None
+        if index is None:
+            return None
+        return json.loads(self.__read_slot(buf, index)[2])
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__segment is not None:
+                self.__segment.close()
+                self.__segment = None
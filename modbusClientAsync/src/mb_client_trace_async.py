@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+record and replay of the MODBUS traffic of a gateway: the recording client
+wraps the TCP client and appends each request and its response PDU to a
+trace file, the replay client serves the responses recorded in place of the
+TCP client, i.e. without sockets or devices.
+
+trace file:
+    magic, then records of
+    header: start (float64, epoch sec), round-trip time (float32 sec),
+            unit id (uint8), function code (uint8), address (uint16),
+            count (uint16), no of values written (uint16), status (uint8),
+            length of the response PDU (uint16)
+    values written (uint16 each), response PDU (function code and data)
+"""
+
+from threading import Lock
+from types import SimpleNamespace
+from typing import Dict, List, Tuple, Iterator, Any
+from pymodbus.factory import ClientDecoder
+from pymodbus.exceptions import ModbusIOException, ConnectionException
+import asyncio
+import mmap
+import os
+import re
+import struct
+import time
+import logging
+# internal
+from .mb_client_aux_async import _throw_error
+
+MAGIC = b"MBT1"
+FUNCTION_CODES = {
+    "read_coils": 1,
+    "read_discrete_inputs": 2,
+    "read_holding_registers": 3,
+    "read_input_registers": 4,
+    "write_coil": 5,
+    "write_register": 6,
+    "write_coils": 15,
+    "write_registers": 16
+}
+STATUS_RESPONSE = 0  # response, incl. MODBUS exception responses
+STATUS_NO_RESPONSE = 1  # ModbusIOException
+STATUS_CONNECTION = 2  # ConnectionException, e.g. connection reset
+_HEADER = struct.Struct("<dfBBHHHBH")
+
+
+def trace_path(
+        directory: str,
+        host: str
+) -> str:
+    """
+    :param directory: str - directory of the trace files
+    :param host: str - as of the client
+    :return: str - trace file of a host
+    """
+    return os.path.join(directory,
+                        "{0}.mbtrace".format(re.sub(r'[^\w.-]', '_', host)))
+
+
+def _request_values(kwargs: Dict[str, Any]) -> List[int]:
+    """
+    :param kwargs: arguments of the request
+    :return: List of int - values written, bools as 0/1
+    """
+    if "value" in kwargs:
+        return [int(kwargs["value"])]
+    return [int(v) for v in kwargs.get("values") or list()]
+
+
+class _TraceWriter(object):
+    """trace file appended to, shared by all recording clients"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.__file = open(path, "ab")
+        if new:
+            self.__file.write(MAGIC)
+        self.__lock = Lock()
+
+    def write(
+            self,
+            start: float,
+            rtt: float,
+            unit: int,
+            function: str,
+            kwargs: Dict[str, Any],
+            status: int,
+            pdu: bytes
+    ) -> None:
+        values = _request_values(kwargs)
+        record = _HEADER.pack(start, rtt, unit, FUNCTION_CODES[function],
+                              kwargs.get("address", 0),
+                              kwargs.get("count", 0), len(values), status,
+                              len(pdu))
+        record += struct.pack("<{0}H".format(len(values)), *values) + pdu
+        with self.__lock:  # one write, a reader sees whole records
+            self.__file.write(record)
+            self.__file.flush()
+
+
+_trace_writers: Dict[str, _TraceWriter] = dict()
+_trace_writers_lock = Lock()
+
+
+def _trace_writer(path: str) -> _TraceWriter:
+    with _trace_writers_lock:
+        path = os.path.realpath(path)
+        if path not in _trace_writers:
+            _trace_writers[path] = _TraceWriter(path)
+        return _trace_writers[path]
+
+
+class _RecordingClient(object):
+    """
+    wraps the TCP client of a gateway, each request is recorded along with
+    its response, attributes are passed through
+    """
+
+    def __init__(
+            self,
+            client,
+            path: str
+    ):
+        self.__client = client
+        self.__trace = _trace_writer(path)
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.__client, name)
+        if name not in FUNCTION_CODES:
+            return attribute
+
+        async def request(slave: int = 0, **kwargs) -> Any:
+            start, counter = time.time(), time.monotonic()
+            status, pdu = None, b""  # not recorded if cancelled
+            try:
+                response = await attribute(slave=slave, **kwargs)
+            except ModbusIOException:
+                status = STATUS_NO_RESPONSE
+                raise
+            except ConnectionException:
+                status = STATUS_CONNECTION
+                raise
+            else:
+                status = STATUS_RESPONSE
+                pdu = bytes([response.function_code]) + response.encode()
+                return response
+            finally:
+                if status is not None:
+                    self.__trace.write(start=start,
+                                       rtt=time.monotonic() - counter,
+                                       unit=slave,
+                                       function=name,
+                                       kwargs=kwargs,
+                                       status=status,
+                                       pdu=pdu)
+
+        return request
+
+
+def trace_records(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    records of a trace file, read via mmap; a record not completely written
+    is ignored
+    :param path: str - trace file
+    :return: Dict - start, rtt, unit, function, address, count, values,
+    status, pdu
+    """
+    functions = {code: name for name, code in FUNCTION_CODES.items()}
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size <= len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if buffer[:len(MAGIC)] != MAGIC:
+                _throw_error("No trace file: '{0}'".format(path), 422)
+            offset = len(MAGIC)
+            while offset + _HEADER.size <= len(buffer):
+                (start, rtt, unit, code, address, count, no_values, status,
+                 length) = _HEADER.unpack_from(buffer, offset)
+                offset += _HEADER.size
+                if offset + 2 * no_values + length > len(buffer):
+                    return
+                values = list(struct.unpack_from(
+                    "<{0}H".format(no_values), buffer, offset))
+                offset += 2 * no_values
+                yield {
+                    "start": start,
+                    "rtt": rtt,
+                    "unit": unit,
+                    "function": functions[code],
+                    "address": address,
+                    "count": count,
+                    "values": values,
+                    "status": status,
+                    "pdu": bytes(buffer[offset:offset + length])
+                }
+                offset += length
+
+
+class ReplayClient(object):
+    """
+    serves the responses of a trace file in place of the TCP client: a
+    request is answered by the next response recorded for the same unit id,
+    function, address, count and values written, at maximum speed or after
+    the round-trip time recorded (divided by speed)
+    """
+
+    def __init__(
+            self,
+            path: str,
+            speed: float = None,
+            loop: bool = True
+    ):
+        """
+        :param path: str - trace file
+        :param speed: float - fraction of the original speed, e.g. 1 for the
+        round-trip times recorded (default: None, i.e. maximum speed)
+        :param loop: bool - start over if the responses of a request are
+        exhausted (default: True), otherwise it is not answered
+        """
+        if not os.path.isfile(path):
+            _throw_error("Trace file '{0}' not found".format(path), 404)
+        self.comm_params = SimpleNamespace(timeout_connect=None)
+        self.connected = False
+        self.__speed = speed
+        self.__loop = loop
+        self.__decoder = ClientDecoder()
+        # responses by request, served in order
+        self.__responses: Dict[Tuple, List[Tuple[float, int, bytes]]] = dict()
+        for record in trace_records(path):
+            key = (record['unit'], record['function'], record['address'],
+                   record['count'], tuple(record['values']))
+            self.__responses.setdefault(key, list()).append(
+                (record['rtt'], record['status'], record['pdu']))
+        self.__next: Dict[Tuple, int] = dict()
+        logging.info("Replaying {0} requests from '{1}'".format(
+            sum(len(r) for r in self.__responses.values()), path))
+
+    async def connect(self) -> bool:
+        self.connected = True
+        return True
+
+    def close(self) -> None:
+        self.connected = False
+
+    async def __respond(
+            self,
+            function: str,
+            slave: int,
+            kwargs: Dict[str, Any]
+    ) -> Any:
+        key = (slave, function, kwargs.get("address", 0),
+               kwargs.get("count", 0), tuple(_request_values(kwargs)))
+        responses = self.__responses.get(key, list())
+        index = self.__next.get(key, 0)
+        if index >= len(responses) and self.__loop and responses:
+            index = 0
+        if index >= len(responses):
+            raise ModbusIOException(
+                "No response recorded for {0}".format(key))
+        self.__next[key] = index + 1
+        rtt, status, pdu = responses[index]
+        if self.__speed:
+            await asyncio.sleep(rtt / self.__speed)
+        if status == STATUS_NO_RESPONSE:
+            raise ModbusIOException("No response (recorded)")
+        if status == STATUS_CONNECTION:
+            raise ConnectionException("Connection failed (recorded)")
+        return self.__decoder.decode(pdu)
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in FUNCTION_CODES:
+            raise AttributeError(name)
+
+        async def request(slave: int = 0, **kwargs) -> Any:
+            return await self.__respond(name, slave, kwargs)
+
+        return request
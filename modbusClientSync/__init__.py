@@ -1,4 +1,17 @@
 from .src.mb_client_sync import MODBUSClientSync
 from .src.mb_client_sync import __version__, __author__, __copyright__, \
     __credits__, __license__, __maintainer__, __email__, __status__
-from .src.mb_client_aux_sync import LockGroup, MyException
+from .src.mb_client_sync import compile_config, device_class, CONFIG_DIR
+from modbusClientAsync import (LockGroup, MyException, breaker_states,
+                               device_profile)
+import modbusClientAsync
+
+
+def __getattr__(name: str):
+    # imported on first access only, see modbusClientAsync
+    if name not in modbusClientAsync._LAZY:
+        raise AttributeError("module '{0}' has no attribute '{1}'"
+                             .format(__name__, name))
+    value = getattr(modbusClientAsync, name)
+    globals()[name] = value
+    return value
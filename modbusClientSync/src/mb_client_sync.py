@@ -4,22 +4,29 @@
 """
 Synchronous MODBUS Client
 
+Facade of the asynchronous MODBUS client: all synchronous clients of a
+process submit their calls to one event loop in a background thread, where
+the asynchronous engine serves them, such that the registers of a readout
+are read concurrently and both clients share one code path.
+
 For a detailed description, see https://github.com/ccatp/MODBUS
 
 Copyright (C) 2021-23 Dr. Ralf Antonius Timmermann,
 Argelander Institute for Astronomy (AIfA), University Bonn.
 """
 
-from pymodbus.client import ModbusTcpClient
-import re
+import asyncio
 import logging
-from typing import Dict, Any, List
-import datetime
+import os
+from threading import Thread, Lock, current_thread
+from typing import Dict, Any, List, Callable, Coroutine
 # internal
-from .mb_client_core_sync import _ObjectTypeSync, FEATURE_ALLOWED_SET
-from .mb_client_aux_sync import (mytimer, _client_config, _throw_error,
-                                 MyException, defined_kwargs)
-from .mb_client_enums_sync import MODBUS2AVRO
+from modbusClientAsync import MODBUSClientAsync
+from modbusClientAsync.src.mb_client_aux_async import (_throw_error,
+                                                       _client_config_path)
+from modbusClientAsync.src.mb_client_config_async import (
+    compile_config as _compile_config,
+    device_class as _device_class)
 
 """
 change history
@@ -135,6 +142,97 @@ logging.basicConfig(format=myformat,
                     level=logging.INFO,
                     datefmt="%Y-%m-%d %H:%M:%S")
 
+# directory searched for the config file, if none is provided
+CONFIG_DIR = "{0}{1}".format(os.path.dirname(os.path.realpath(__file__)),
+                             "/../configFiles/")
+
+
+class _EventLoopThread(object):
+    """
+    event loop in a background thread, serving the asynchronous clients on
+    behalf of the synchronous ones
+    """
+
+    def __init__(self):
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = Thread(target=self.__loop.run_forever,
+                               name="MODBUSClientSync",
+                               daemon=True)
+        self.__thread.start()
+
+    def run(self, coro: Coroutine) -> Any:
+        """
+        run a coroutine in the event loop and wait for its outcome
+        :param coro: Coroutine
+        :return: result of the coroutine, its exception is raised
+        """
+        if current_thread() is self.__thread:
+            coro.close()
+            _throw_error("Synchronous client invoked from its own event "
+                         "loop, e.g. by a subscriber", 500)
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+
+# shared by all synchronous clients of a process, started on first use
+_event_loop: _EventLoopThread | None = None
+_event_loop_lock = Lock()
+
+
+def _engine() -> _EventLoopThread:
+    """
+    :return: _EventLoopThread - the event loop of the synchronous clients
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = _EventLoopThread()
+
+    return _event_loop
+
+
+async def _call(
+        function: Callable,
+        **kwargs
+) -> Any:
+    """invoke a function in the event loop"""
+    return function(**kwargs)
+
+
+def compile_config(
+        config_filename: str = None,
+        cache_dir: str = None
+) -> Dict:
+    """
+    see compile_config of the asynchronous client, the config file is
+    searched in configFiles/ of this package if none is provided
+    :param config_filename: str - optional path to config file
+    :param cache_dir: str - optional directory of the disk cache
+    :return: Dict - compiled config
+    """
+    return _compile_config(
+        config_filename=config_filename or _client_config_path(
+            config_filename=None, config_dir=CONFIG_DIR),
+        cache_dir=cache_dir
+    )
+
+
+def device_class(
+        config_filename: str = None,
+        cache_dir: str = None
+):
+    """
+    see device_class of the asynchronous client, the config file is
+    searched in configFiles/ of this package if none is provided
+    :param config_filename: str - optional path to config file
+    :param cache_dir: str - optional directory of the disk cache
+    :return: _DeviceClass
+    """
+    return _device_class(
+        config_filename=config_filename or _client_config_path(
+            config_filename=None, config_dir=CONFIG_DIR),
+        cache_dir=cache_dir
+    )
+
 
 class MODBUSClientSync(object):
 
@@ -143,196 +241,156 @@ class MODBUSClientSync(object):
             host: str,
             *,
             port: int = None,
+            unit: int = None,
             debug: bool = None,
-            config_filename: str = None
+            timeout_connect: float = None,
+            timeout_min: float = None,
+            timeout_max: float = None,
+            concurrency: int = None,
+            max_rate: float = None,
+            config_filename: str = None,
+            config_cache_dir: str = None,
+            breaker_threshold: int = None,
+            breaker_probe_interval: float = None,
+            write_window: float = None,
+            skip_unchanged: bool = None,
+            slow_cycle: int = None,
+            record: str = None,
+            replay: str = None,
+            replay_speed: float = None
     ):
         """
         initializing the sync modbus client and perform integrity checks on
-        mb_client_config_<device>.json:
-        :param host: str - device ip or name
+        mb_client_config_<device>.json. The connection is kept open until
+        close is invoked:
+        :param host: str - device ip or name, optionally host[:port][/unit]
         :param port: int - device port
+        :param unit: int - unit id behind a gateway (default: 1)
         :param debug: bool - debug mode True/False
+        :param timeout_connect: float - timeout for connecting to server, and
+        for requests until the first response (sec, default: 3)
+        :param timeout_min: float - lower bound of the request timeout derived
+        from the round-trip times (sec, default: 0.2)
+        :param timeout_max: float - upper bound of the request timeout (sec,
+        default: 10)
+        :param concurrency: int - requests in flight per gateway (default: 4)
+        :param max_rate: float - requests per second per gateway (default:
+        unlimited)
+        :param config_filename: str - alternative path to config file
+        :param config_cache_dir: str - directory of compiled configs and
+        device profiles (optional)
+        :param breaker_threshold: int - consecutive connection failures, after
+        which calls to the host fail fast (default: None, i.e. never)
+        :param breaker_probe_interval: float - seconds until a call is let
+        through again to probe the host (default: 30)
+        :param write_window: float - seconds writes are collected before
+        written at once, the last value of a parameter wins (default: None,
+        i.e. written at once)
+        :param skip_unchanged: bool - skip writes equal to the last-known
+        value of the parameter (default: False)
+        :param slow_cycle: int - parameters of poll class slow are read every
+        Nth readout (default: 10)
+        :param record: str - trace file the requests and responses are
+        appended to (optional)
+        :param replay: str - trace file the responses are served from in
+        place of the device (optional)
+        :param replay_speed: float - fraction of the original speed of the
+        responses replayed (default: None, i.e. maximum speed)
         """
-        logging.getLogger().setLevel(
-            getattr(logging,
-                    "DEBUG" if debug else "INFO")
-        )
         self._ip = host
-        client_config = _client_config(config_filename=config_filename)
+        self.__engine = _engine()
+        self.__client: MODBUSClientAsync = self.__engine.run(_call(
+            MODBUSClientAsync,
+            host=host,
+            port=port,
+            unit=unit,
+            debug=debug,
+            timeout_connect=timeout_connect,
+            timeout_min=timeout_min,
+            timeout_max=timeout_max,
+            concurrency=concurrency,
+            max_rate=max_rate,
+            config_filename=config_filename or _client_config_path(
+                config_filename=None, config_dir=CONFIG_DIR),
+            config_cache_dir=config_cache_dir,
+            persistent=True,
+            breaker_threshold=breaker_threshold,
+            breaker_probe_interval=breaker_probe_interval,
+            write_window=write_window,
+            skip_unchanged=skip_unchanged,
+            slow_cycle=slow_cycle,
+            record=record,
+            replay=replay,
+            replay_speed=replay_speed
+        ))
+        self.__closed = False
 
-        # integrity checks
-        self.__client_mapping_checks(mapping=client_config['mapping'])
+    @property
+    def device(self):
+        """shared device class model"""
+        return self.__client.device
 
-        client = ModbusTcpClient(
-            host=self._ip,
-            **defined_kwargs(port=port,
-                             debug=debug),
-        )
-        client.connect()
-        if not client.connected:
-            _throw_error("Could not connect to MODBUS server: IP={}"
-                         .format(self._ip), 503)
-        logging.debug("MODBUS Communication Parameters {}"
-                      .format(client.comm_params))
-
-        self.__init = {
-            "client": client,
-            "mapping": client_config['mapping'],
-            # if endianness not found, apply default:
-            # "byteorder": Endian.Little, "wordorder": Endian.Big
-            "endianness": client_config.get("endianness",
-                                            {"byteorder": "<",
-                                             "wordorder": ">"})
-        }
-        # initialize _ObjectType objects for each entity
-        self.__entity_list: List = []
-        for regs in ['0', '1', '3', '4']:
-            self.__entity_list.append(
-                _ObjectTypeSync(
-                    init=self.__init,
-                    entity=regs
-                )
-            )
-
-    def __existance_mapping_checks(
+    @property
+    def snapshot(self) -> Dict[str, Any] | None:
+        """last readout of this host, None if not read yet"""
+        return self.__client.snapshot
+
+    @property
+    def rtt(self) -> Dict[str, Any]:
+        """round-trip times and request timeout of this host"""
+        return self.__client.rtt
+
+    @property
+    def scheduler(self) -> Dict[str, Any]:
+        """request queue of this host"""
+        return self.__client.scheduler
+
+    @property
+    def breaker(self) -> Dict[str, Any]:
+        """state of the circuit breaker of this host"""
+        return self.__client.breaker
+
+    def subscribe(
             self,
-            wr: Dict
-    ) -> str:
+            callback: Callable[[Dict[str, Any] | None, List[Dict]], Any]
+    ) -> None:
         """
-        check if parameter exists in mapping at all
-        :param wr: list of dicts {parameter: value}
-        :return: str, empty (no error)
+        notify a callback of each update of the snapshot, see
+        MODBUSClientAsync.subscribe. It is invoked in the thread of the event
+        loop, hence must not call this client
+        :param callback: function - snapshot (None if not read yet) and the
+        items changed
         """
-        parms: List = []
-        text = "Parameter {0} not mapped to register"
-        for parameter in wr.keys():
-            for attributes in self.__init['mapping'].values():
-                if attributes['parameter'] == parameter:
-                    break
-            else:
-                parms.append("'{}'".format(parameter))
-        if parms:
-            return text.format(", ".join(parms))
-
-        return ""
-
-    @staticmethod
-    def __client_mapping_checks(mapping: Dict) -> None:
+        self.__engine.run(_call(self.__client.subscribe, callback=callback))
+
+    def unsubscribe(
+            self,
+            callback: Callable
+    ) -> None:
         """
-        perform checks on the client mapping: parameter must not be duplicate,
-        available features must be taken from README.md
-        :param mapping: Dict
-        :return:
+        :param callback: function - as subscribed
         """
+        self.__engine.run(_call(self.__client.unsubscribe, callback=callback))
 
-        # start nested functions
-        def check_register_integrity() -> None:
-            """
-            check registry integrity of dictionary keys in mapping file
-            key formate, e.g. '0xxxx', '3xxxx/3xxxx', or '4xxxx/y,
-            where x=0000-9999 and y=1|2
-            """
-            msg = "Wrong register in mapping: {0}".format(register)
-            if not re.match(r"^[0134][0-9]{4}(/([12]|[0134][0-9]{4}))?$",
-                            register):
-                _throw_error(msg, 422)
-            comp = register.split("/")
-            if len(comp) == 2:
-                if (comp[1] not in ["1", "2"]
-                    and (comp[0][0] != comp[1][0]  # same register class
-                         or int(comp[1]) - int(comp[0]) < 1)):  # ascending
-                    _throw_error(msg, 422)
-
-        def check_feature_integrity() -> None:
-            if feature not in FEATURE_ALLOWED_SET:
-                _throw_error(("Feature '{1}' in register '{0}' is not supported"
-                              .format(register, feature)), 422)
-            if re.match("(min|max)", feature):  # check features min or max
-                if not re.match("(int|long|float|double)", datatype):
-                    _throw_error(("Feature min or max not permitted for "
-                                  "register '{0}'".format(register)), 422)
-                if type(v) not in (int, float):
-                    _throw_error(("Feature '{1}' in register '{0}' is not "
-                                  "numerical".format(register, feature)), 422)
-            if re.match("map", feature):  # check feature map
-                if re.match("boolean", datatype):
-                    for binarystring in v.keys():
-                        if not re.match(r"^0b(?=[01]{8}$)(?=[^1]*1[^1]*$)",
-                                        binarystring):
-                            _throw_error("Binary string error in map for "
-                                         "register '{0}'".format(register),
-                                         422)
-
-        def function_available() -> str:
-            function = "decode_bits"
-            if register[0] in ['3', '4']:  # discrete input or holding
-                try:
-                    function = value['function']
-                    return MODBUS2AVRO(function).datatype
-                except ValueError:
-                    _throw_error(("Decoding function '{0}' not defined for "
-                                  "register '{1}'").format(function,
-                                                           register), 422)
-                except KeyError:
-                    _throw_error(("Decoding function not provided for "
-                                  "register '{0}'").format(register), 422)
-            return MODBUS2AVRO(function).datatype  # coil & input register
-
-        def parameter_available() -> str:
-            try:
-                return value["parameter"]
-            except KeyError:
-                _throw_error(("Feature parameter missing for register '{0}'"
-                              .format(register)), 422)
-
-        def seek_parameter_duplicate() -> None:
-            parameter_duplicate = [
-                reg for reg, parm in rev_dict.items() if len(parm) > 1
-            ]
-            if parameter_duplicate:
-                _throw_error(("Duplicate parameter '{0}'"
-                              .format(", ".join(parameter_duplicate))), 422)
-        # end nested functions
-
-        rev_dict: Dict = {}
-        for register, value in mapping.items():
-            check_register_integrity()
-            parameter = parameter_available()
-            rev_dict.setdefault(parameter, set()).add(register)
-            datatype = function_available()
-            for feature, v in value.items():  # investigate features
-                check_feature_integrity()
-        seek_parameter_duplicate()
-
-    @mytimer
-    def read_register(self) -> Dict[str, Any]:
+    def read_register(
+            self,
+            deadline: float = None,
+            on_error: str = "raise"
+    ) -> Dict[str, Any]:
         """
         invoke the read all mapped registers for monitoring
+        :param deadline: float - seconds the readout may take at most,
+        requests outstanding are cancelled then (optional)
+        :param on_error: str - raise: abort the readout at the first register
+        failing (default), partial: return all values acquired, each with
+        quality (good, bad, timeout), status if failed, and timestamp
         :return: List of Dict for housekeeping
         """
-        return {
-            "timestamp": datetime.datetime.now(
-                tz=datetime.timezone.utc
-            ).isoformat(),
-            "host": self._ip,
-            "data": [
-                item for entity in self.__entity_list for item in
-                entity.register_readout()
-            ]
-        }
-
-    def __updated_registers(self) -> Dict[str, Any]:
-        """
-        updated registers for coil and holding after write end or failure
-        :return: values of register content
-        """
-        tmp: Dict = {}
-        for entity in self.__entity_list:
-            if entity.entity in ['0', '4']:
-                tmp.update(entity.updated_items)
-        return tmp
+        return self.__engine.run(
+            self.__client.read_register(deadline=deadline,
+                                        on_error=on_error)
+        )
 
-    @mytimer
     def write_register(
             self,
             wr: Dict
@@ -342,35 +400,9 @@ class MODBUSClientSync(object):
         :param wr: list of dicts {parameter: value}
         :return: status
         """
-        detail = self.__existance_mapping_checks(wr=wr)
-        if detail:
-            raise MyException(
-                status_code=422,
-                detail="{0}, updated register content: {1}".format(
-                    detail,
-                    {}
-                )
-            )
-
-        try:
-            for entity in self.__entity_list:
-                entity.register_write(wr)
-        except MyException as e:
-            raise MyException(
-                status_code=e.status_code,
-                detail="{0}, updated register content: {1}".format(
-                    e.detail,
-                    self.__updated_registers()
-                )
-            )
-
-        return {
-            "status": "write success",
-            "updated register content": self.__updated_registers()
-        }
+        return self.__engine.run(self.__client.write_register(wr=wr))
 
     def close(self) -> None:
-        client = self.__init["client"]
-        if client.connected:
-            logging.debug("Closing {}".format(client))
-            client.close()
+        if not self.__closed:
+            self.__closed = True
+            self.__engine.run(_call(self.__client.close))
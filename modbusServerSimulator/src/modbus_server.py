@@ -7,11 +7,20 @@ Datum: 2020-03-30
 import sys
 import os
 import socket
-from pymodbus.server import StartTcpServer
-from pymodbus.server import StartTlsServer
+import asyncio
+import time
+import math
+import random
+import ipaddress
+import ssl
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server import ModbusTlsServer
+from pymodbus.server.async_io import ModbusServerRequestHandler
+from pymodbus.pdu import ModbusExceptions
 from pymodbus.device import ModbusDeviceIdentification
-from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSparseDataBlock
 from pymodbus.datastore import ModbusSlaveContext, ModbusServerContext
+from pymodbus.datastore.store import BaseModbusDataBlock
+from array import array
 # from pymodbus.transaction import ModbusRtuFramer, ModbusBinaryFramer
 import logging
 import argparse
@@ -19,7 +28,439 @@ import json
 
 # default configuration file path
 config_file = 'modbus_server.json'
-VERSION = '1.1.2'
+VERSION = '1.6.0'
+ADDRESS_SPACE = 65536  # registers per block
+"""
+###############################################################################
+# C L A S S E S
+###############################################################################
+"""
+
+
+class ModbusArrayDataBlock(BaseModbusDataBlock):
+    """
+    Compact datastore for the complete address space of a block, backed by an
+    array that is only as long as the highest address written. Reads beyond
+    return 0x00. If a mask of defined addresses is given, reads and writes
+    to undefined addresses are invalid (as with ModbusSparseDataBlock).
+    """
+
+    def __init__(self, typecode='H', values=None, defined=None):
+        """
+        @param typecode: string, 'H' for registers, 'B' for bits (default: 'H')
+        @param values: array, initial values starting at address 0 (default: None)
+        @param defined: bytearray, 0x01 for each defined address, None if all addresses are defined (default: None)
+        """
+        self.address = 0x00
+        self.default_value = 0x00
+        self.values = values if values is not None else array(typecode)
+        self.defined = defined
+
+    def reset(self):
+        """
+        Reset the datastore to 0x00
+        """
+        self.values = array(self.values.typecode)
+
+    def validate(self, address, count=1):
+        """
+        Check to see if the request is in range
+        @param address: integer, the starting address
+        @param count: integer, the number of values to test for
+        @return: boolean
+        """
+        if address < 0 or count < 1 or address + count > ADDRESS_SPACE:
+            return False
+        if self.defined is None:
+            return True
+        if address + count > len(self.defined):
+            return False
+        return 0 not in self.defined[address:address + count]
+
+    def getValues(self, address, count=1):
+        """
+        Return the requested values from the datastore
+        @param address: integer, the starting address
+        @param count: integer, the number of values to retrieve
+        @return: list(), the values
+        """
+        values = self.values[address:address + count].tolist()
+        if len(values) < count:  # beyond the highest address written
+            values += [self.default_value] * (count - len(values))
+        return values
+
+    def setValues(self, address, values):
+        """
+        Set the requested values of the datastore
+        @param address: integer, the starting address
+        @param values: list(), array() or value, the new values to be set
+        """
+        if not isinstance(values, (list, array)):
+            values = [values]
+        end = address + len(values)
+        if end > len(self.values):
+            self.values.extend([self.default_value] * (end - len(self.values)))
+        self.values[address:end] = array(self.values.typecode, values)
+
+    def copy(self):
+        """
+        Return an independent copy of the datastore, e.g. for another device
+        @return: ModbusArrayDataBlock
+        """
+        return (ModbusArrayDataBlock(
+            self.values.typecode, array(self.values.typecode, self.values),
+            bytearray(self.defined) if self.defined is not None else None))
+
+    def define(self, address, count=1):
+        """
+        Mark addresses as defined, e.g. if they are driven by a generator
+        @param address: integer, the starting address
+        @param count: integer, the number of addresses
+        """
+        end = address + count
+        if end > len(self.values):
+            self.values.extend([self.default_value] * (end - len(self.values)))
+        if self.defined is not None:
+            if end > len(self.defined):
+                self.defined.extend(bytes(end - len(self.defined)))
+            self.defined[address:end] = b'\x01' * count
+
+
+class RegisterGenerator(object):
+    """
+    Generator of dynamic values for a contiguous range of addresses of a block.
+    All values of the range are computed in one pass and written as one slice
+    per tick. Register values are 16 bit unsigned (negative values are stored
+    as two's complement), bit values are 0 or 1.
+    """
+    TYPES = ('sine', 'ramp', 'randomWalk', 'step', 'counter', 'toggle')
+
+    def __init__(self, block, definition, rng):
+        """
+        @param block: ModbusArrayDataBlock, the block to be updated
+        @param definition: dict(), the generator definition, loaded from json file
+        @param rng: random.Random, the seeded random number generator
+        """
+        if definition.get('type') not in self.TYPES:
+            raise ValueError('Unknown generator type: ' + str(definition.get('type')))
+        self.block = block
+        self.type = definition['type']
+        self.address = int(str(definition['address']), 0)
+        self.count = int(definition.get('count', 1))
+        self.period = float(definition.get('period', 60.0))
+        self.mask = 0x1 if block.values.typecode == 'B' else 0xFFFF
+        self.minimum = definition.get('min', 0)
+        self.maximum = definition.get('max', self.mask)
+        self.amplitude = definition.get('amplitude', (self.maximum - self.minimum) / 2)
+        self.offset = definition.get('offset', (self.maximum + self.minimum) / 2)
+        self.step = definition.get('step', 1)
+        self.values = [int(str(v), 0) for v in definition.get('values', [0, 1])]
+        self.pattern = [1 if int(str(v), 0) else 0 for v in definition.get('pattern', [1, 0])]
+        self.rng = rng
+        # phase shift between neighbouring addresses as a fraction of the period
+        phaseShift = definition.get('phaseShift', 1.0 / self.count)
+        self.phases = [i * phaseShift for i in range(self.count)]
+        # pattern repeated to cover the range at any rotation, see toggle
+        n = len(self.pattern)
+        self.tiled = array(block.values.typecode,
+                           self.pattern * (self.count // n + 2))
+        # lanes of the range as one integer, see __add
+        lane = array(block.values.typecode, [1]) * self.count
+        self.ones = int.from_bytes(lane.tobytes(), sys.byteorder)
+        self.high = self.ones << (8 * lane.itemsize - 1)
+        block.define(self.address, self.count)
+
+    def __add(self, current):
+        """
+        Add the step to all values of the range at once, with the values
+        packed into the lanes of one integer; the top bit of each lane is
+        added apart so that no carry crosses into the next lane
+        @param current: array(), the current values of the range
+        @return: array(), the values incremented, wrapped around
+        """
+        typecode, order = current.typecode, sys.byteorder
+        x = int.from_bytes(current.tobytes(), order)
+        y = (self.step & ((1 << 8 * current.itemsize) - 1)) * self.ones
+        z = ((x & ~self.high) + (y & ~self.high)) ^ ((x ^ y) & self.high)
+        result = array(typecode)
+        result.frombytes((z & self.mask * self.ones)
+                         .to_bytes(len(current) * current.itemsize, order))
+        return result
+
+    def update(self, t):
+        """
+        Compute and write the values of the address range
+        @param t: float, seconds since the generators were started
+        """
+        mask = self.mask
+        cycle = t / self.period
+        if self.type == 'sine':
+            a, o, w = self.amplitude, self.offset, 2.0 * math.pi
+            values = [int(round(o + a * math.sin(w * (cycle + p)))) & mask
+                      for p in self.phases]
+        elif self.type == 'ramp':
+            lo, span = self.minimum, self.maximum - self.minimum
+            values = [int(lo + span * ((cycle + p) % 1.0)) & mask
+                      for p in self.phases]
+        elif self.type == 'randomWalk':
+            lo, hi, step, r = self.minimum, self.maximum, self.step, self.rng.uniform
+            values = [int(min(hi, max(lo, v + round(r(-step, step))))) & mask
+                      for v in self.block.getValues(self.address, self.count)]
+        elif self.type == 'step':
+            values = array(self.block.values.typecode,
+                           [self.values[int(cycle) % len(self.values)] & mask]) * self.count
+        elif self.type == 'counter':
+            end = self.address + self.count  # defined, hence in the block
+            values = self.__add(self.block.values[self.address:end])
+        else:  # toggle: the pattern rotated by one address per period
+            k = int(cycle) % len(self.pattern)
+            values = self.tiled[k:k + self.count]
+        self.block.setValues(self.address, values)
+
+
+class FaultInjector(object):
+    """
+    Seeded injection of faults into the requests of a device. Faults of the
+    device apply to all requests, faults of a register range supersede them
+    for requests overlapping that range. The decisions are reproducible for
+    the same seed and sequence of requests.
+    """
+    BLOCKS = {  # function code -> block
+        1: 'coils', 5: 'coils', 15: 'coils',
+        2: 'discreteInput',
+        3: 'holdingRegister', 6: 'holdingRegister', 16: 'holdingRegister',
+        22: 'holdingRegister', 23: 'holdingRegister',
+        4: 'inputRegister'
+    }
+    FAULTS = ('delay', 'drop', 'reset', 'exception', 'hole')
+
+    def __init__(self, config, seed, zeroMode=False):
+        """
+        @param config: dict(), the faults section, loaded from json file
+        @param seed: string, the seed of the device, e.g. '<seed>/<address>:<port>/<unit>', None if not reproducible
+        @param zeroMode: boolean, request addresses map to datastore addresses (default: False)
+        """
+        self.defaults = {k: v for k, v in config.items() if k in self.FAULTS}
+        self.ranges = [
+            (r['block'], int(str(r['address']), 0), int(r.get('count', 1)),
+             {k: v for k, v in r.items() if k in self.FAULTS})
+            for r in config.get('ranges', list())
+        ]
+        self.shift = 0 if zeroMode else 1
+        self.rng = random.Random(seed)
+
+    def faults(self, request):
+        """
+        Faults applicable to a request
+        @param request: ModbusRequest, the decoded request
+        @return: dict(), the faults by kind
+        """
+        faults = dict(self.defaults)
+        block = self.BLOCKS.get(request.function_code)
+        if block is None or not self.ranges:
+            return (faults)
+        address, count = requestSpan(request)
+        address += self.shift
+        for rangeBlock, rangeAddress, rangeCount, rangeFaults in self.ranges:
+            if (rangeBlock == block and address < rangeAddress + rangeCount
+                    and rangeAddress < address + count):
+                faults.update(rangeFaults)
+        return (faults)
+
+    def delay(self, spec):
+        """
+        Draw a response delay
+        @param spec: dict(), distribution (constant, uniform, normal, exponential) and its parameters in seconds
+        @return: float, delay in seconds
+        """
+        distribution = spec.get('distribution', 'constant')
+        if distribution == 'uniform':
+            return (self.rng.uniform(spec.get('min', 0.0), spec['max']))
+        if distribution == 'normal':
+            return (max(0.0, self.rng.gauss(spec['mean'], spec.get('stddev', 0.0))))
+        if distribution == 'exponential':
+            return (self.rng.expovariate(1.0 / spec['mean']))
+        return (spec.get('value', 0.0))
+
+    def decide(self, request):
+        """
+        Decide on the fault injected into a request. A hole answers with an
+        illegal data address exception, otherwise the connection is reset, the
+        response dropped, an exception returned, or the response delayed
+        @param request: ModbusRequest, the decoded request
+        @return: tuple(), action (None, 'reset', 'drop', 'exception') and delay in seconds or exception code
+        """
+        faults = self.faults(request)
+        if faults.get('hole'):
+            return ('exception', ModbusExceptions.IllegalAddress)
+        draw = self.rng.random
+        if draw() < faults.get('reset', 0.0):
+            return ('reset', None)
+        if draw() < faults.get('drop', 0.0):
+            return ('drop', None)
+        exception = faults.get('exception')
+        if exception and draw() < exception.get('probability', 1.0):
+            return ('exception', exception.get('code', ModbusExceptions.SlaveFailure))
+        if 'delay' in faults:
+            return (None, self.delay(faults['delay']))
+        return (None, 0.0)
+
+
+class RequestStatistics(object):
+    """
+    Counters of the requests and registers (or bits) served per function code
+    and of the faults injected, shared by all servers of the process
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.requests = dict()  # function code -> number of requests
+        self.registers = dict()  # function code -> number of registers
+        self.faults = dict()  # action -> number of faults
+        self.rates = dict()  # function code -> rates of the last interval
+        self.last = (self.start, dict(), dict())
+
+    def count(self, request):
+        """
+        Count a request and its registers
+        @param request: ModbusRequest, the decoded request
+        """
+        fc = request.function_code
+        registers = requestSpan(request)[1] + len(getattr(request, 'write_registers', None) or [])
+        self.requests[fc] = self.requests.get(fc, 0) + 1
+        self.registers[fc] = self.registers.get(fc, 0) + registers
+
+    def countFault(self, action):
+        """
+        Count a fault injected
+        @param action: string, 'reset', 'drop', 'exception', or 'delay'
+        """
+        self.faults[action] = self.faults.get(action, 0) + 1
+
+    def update(self):
+        """
+        Compute the rates since the last update
+        @return: dict(), requests and registers per second by function code
+        """
+        now = time.monotonic()
+        last, requests, registers = self.last
+        elapsed = max(now - last, 1e-9)
+        self.rates = {
+            fc: {
+                'requestsPerSecond': (self.requests[fc] - requests.get(fc, 0)) / elapsed,
+                'registersPerSecond': (self.registers[fc] - registers.get(fc, 0)) / elapsed
+            }
+            for fc in self.requests
+        }
+        self.last = (now, dict(self.requests), dict(self.registers))
+        return (self.rates)
+
+    def report(self):
+        """
+        Counters and rates for the stats endpoint
+        @return: dict()
+        """
+        uptime = time.monotonic() - self.start
+        return ({
+            'version': VERSION,
+            'uptime': uptime,
+            'requests': sum(self.requests.values()),
+            'registers': sum(self.registers.values()),
+            'faults': dict(self.faults),
+            'functionCodes': {
+                str(fc): {
+                    'requests': self.requests[fc],
+                    'registers': self.registers[fc],
+                    'requestsPerSecondAverage': self.requests[fc] / uptime
+                } | self.rates.get(fc, dict())
+                for fc in sorted(self.requests)
+            }
+        })
+
+
+class SimulatorRequestHandler(ModbusServerRequestHandler):
+    """
+    Request handler counting the requests served and injecting the faults of
+    the device addressed
+    """
+
+    def execute(self, request, *addr):
+        """
+        Call with the resulting message
+        @param request: ModbusRequest, the decoded request
+        @param addr: tuple(), the address
+        """
+        if self.server.statistics is not None:
+            self.server.statistics.count(request)
+        injectors = self.server.injectors
+        context = self.server.context
+        injector = injectors.get(0 if context.single else request.slave_id)
+        if injector is None:
+            return (super().execute(request, *addr))
+
+        action, value = injector.decide(request)
+        if self.server.statistics is not None and (action or value > 0):
+            self.server.statistics.countFault(action or 'delay')
+        if action == 'reset':
+            log.debug('Fault: connection reset for unit ' + str(request.slave_id))
+            self.transport_close()
+            self.callback_disconnected(ConnectionResetError('fault injected'))
+        elif action == 'drop':
+            log.debug('Fault: response dropped for unit ' + str(request.slave_id))
+        elif action == 'exception':
+            log.debug('Fault: exception ' + str(value) + ' for unit ' + str(request.slave_id))
+            response = request.doException(value)
+            response.transaction_id = request.transaction_id
+            response.slave_id = request.slave_id
+            self.send(response, *addr)
+        elif value > 0:
+            asyncio.get_running_loop().call_later(value, self.executeDelayed, request, *addr)
+        else:
+            super().execute(request, *addr)
+
+    def executeDelayed(self, request, *addr):
+        """
+        Execute a delayed request, unless the connection was lost meanwhile
+        @param request: ModbusRequest, the decoded request
+        @param addr: tuple(), the address
+        """
+        if self.running:
+            super().execute(request, *addr)
+
+
+class SimulatorServerMixin(object):
+    """
+    Request statistics and fault injection per unit id, shared by the TCP and
+    the TLS server
+    """
+
+    def __init__(self, context, injectors=None, statistics=None, **kwargs):
+        """
+        @param context: ModbusServerContext, the datastore
+        @param injectors: dict(), FaultInjector by unit id, 0 if single context (default: None)
+        @param statistics: RequestStatistics, counters shared by all servers (default: None)
+        """
+        super().__init__(context, **kwargs)
+        self.injectors = injectors or dict()
+        self.statistics = statistics
+
+    def callback_new_connection(self):
+        return (SimulatorRequestHandler(self))
+
+
+class SimulatorTcpServer(SimulatorServerMixin, ModbusTcpServer):
+    """
+    Modbus TCP server with request statistics and fault injection per unit id
+    """
+
+
+class SimulatorTlsServer(SimulatorServerMixin, ModbusTlsServer):
+    """
+    Modbus TCP server with TLS, request statistics and fault injection per
+    unit id
+    """
+
+
 """
 ###############################################################################
 # F U N C T I O N S
@@ -27,6 +468,18 @@ VERSION = '1.1.2'
 """
 
 
+def requestSpan(request):
+    """
+    Function to determine the addresses a request refers to
+    @param request: ModbusRequest, the decoded request
+    @return: tuple(), starting address and number of registers or bits read or written
+    """
+    if hasattr(request, 'read_address'):  # read/write multiple registers
+        return (request.read_address, request.read_count)
+    return (getattr(request, 'address', 0),
+            getattr(request, 'count', None) or len(getattr(request, 'values', None) or [0]))
+
+
 def get_ip_address():
     """
     get_ip_address is a small function that determines the IP address of the outbound ethernet interface
@@ -42,77 +495,113 @@ def get_ip_address():
     return ipaddr
 
 
-def run_server(listener_address='0.0.0.0', listener_port=5020, tls_cert=None,
-               tls_key=None, zeroMode=False, discreteInputs=dict(),
-               coils=dict(), holdingRegisters=dict(), inputRegisters=dict()):
+async def runGenerators(generators, tickRate=1.0):
+    """
+    Update all generators at the tick rate within the event loop of the server.
+    Ticks are scheduled on an absolute time grid, such that they do not drift
+    @param generators: list(), RegisterGenerator
+    @param tickRate: float, ticks per second (default: 1.0)
+    """
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / tickRate
+    start = loop.time()
+    tick = 0
+    log.info('Starting ' + str(len(generators)) + ' generator(s) at ' + str(
+        tickRate) + ' ticks per second')
+    while True:
+        now = loop.time()
+        for generator in generators:
+            generator.update(now - start)
+        tick += 1
+        delay = start + tick * interval - loop.time()
+        if delay < 0:  # overrun, skip missed ticks
+            log.debug('Generator tick overrun by ' + str(-delay) + ' s')
+            tick += int(-delay / interval) + 1
+            delay = start + tick * interval - loop.time()
+        await asyncio.sleep(delay)
+
+
+def createGenerators(config, blocks, rng=None):
+    """
+    Function to create the generators from the configuration
+    @param config: dict(), the generators section, loaded from json file
+    @param blocks: dict(), ModbusArrayDataBlock by block name
+    @param rng: random.Random, shared by the generators of all devices (default: None, seeded from the configuration)
+    @return: list(), RegisterGenerator
+    """
+    rng = rng or random.Random(config.get('seed'))
+    generators = list()
+    for definition in config.get('definitions', list()):
+        generators.append(
+            RegisterGenerator(blocks[definition['block']], definition, rng))
+        log.debug('  Generator ' + definition['type'] + ' for ' + definition[
+            'block'] + ' at address: ' + str(definition['address']))
+    return (generators)
+
+
+async def runStatistics(statistics, interval=60.0):
     """
-    Run the modbus server(s)
-    @param listener_address: string, IP address to bind the listener (default: '0.0.0.0')
-    @param listener_port: integer, TCP port to bin the listener (default: 5020)
+    Log the requests and registers served per second periodically
+    @param statistics: RequestStatistics, the counters
+    @param interval: float, seconds between log lines (default: 60.0)
+    """
+    while True:
+        await asyncio.sleep(interval)
+        rates = statistics.update()
+        log.info('Served ' + '{0:.1f} requests/s, {1:.1f} registers/s'.format(
+            sum(r['requestsPerSecond'] for r in rates.values()),
+            sum(r['registersPerSecond'] for r in rates.values())) + ''.join(
+            '; fc{0}: {1:.1f} req/s, {2:.1f} reg/s'.format(
+                fc, r['requestsPerSecond'], r['registersPerSecond'])
+            for fc, r in sorted(rates.items())))
+
+
+async def serveStatistics(statistics, listener_address='127.0.0.1',
+                          listener_port=8020):
+    """
+    Serve the counters as JSON on a small HTTP endpoint (GET /stats)
+    @param statistics: RequestStatistics, the counters
+    @param listener_address: string, IP address to bind the listener (default: '127.0.0.1')
+    @param listener_port: integer, TCP port to bind the listener (default: 8020)
+    """
+
+    async def handle(reader, writer):
+        try:
+            requestLine = (await reader.readline()).decode('latin-1').split()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass  # skip headers
+            if len(requestLine) >= 2 and requestLine[0] == 'GET' and requestLine[1] in ('/', '/stats'):
+                status, body = '200 OK', json.dumps(statistics.report())
+            else:
+                status, body = '404 Not Found', json.dumps({'detail': 'Not Found'})
+            writer.write(('HTTP/1.0 ' + status + '\r\nContent-Type: application/json\r\n'
+                          'Content-Length: ' + str(len(body)) + '\r\n\r\n' + body).encode())
+            await writer.drain()
+        except (ConnectionError, UnicodeDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    log.info('Starting stats endpoint on http://' + listener_address + ':' + str(listener_port) + '/stats')
+    server = await asyncio.start_server(handle, listener_address, listener_port)
+    async with server:
+        await server.serve_forever()
+
+
+async def run_server(listeners, tls_cert=None, tls_key=None, generators=None,
+                     tickRate=1.0, faults=None, statistics=None):
+    """
+    Run the modbus server(s), one per listener, all within one event loop
+    @param listeners: dict(), ModbusServerContext by (IP address, TCP port) to bind the listener
     @param tls_cert: boolean, path to certificate to start tcp server with TLS (default: None)
     @param tls_key: boolean, path to private key to start tcp server with TLS (default: None)
-    @param zeroMode: boolean, request to address(0-7) will map to the address (0-7) instead of (1-8) (default: False)
-    @param discreteInputs: dict(), initial addresses and their values (default: dict())
-    @param coils: dict(), initial addresses and their values (default: dict())
-    @param holdingRegisters: dict(), initial addresses and their values (default: dict())
-    @param inputRegisters: dict(), initial addresses and their values (default: dict())
-    """
-
-    # initialize data store
-    log.debug('Initialize discrete input')
-    if isinstance(discreteInputs, dict) and len(discreteInputs) > 0:
-        # log.debug('using dictionary from configuration file:')
-        # log.debug(discreteInputs)
-        di = ModbusSparseDataBlock(discreteInputs)
-    else:
-        # log.debug('set all registers to 0xaa')
-        # di = ModbusSequentialDataBlock(0x00, [0xaa]*65536)
-        log.debug('set all registers to 0x00')
-        di = ModbusSequentialDataBlock.create()
-
-    log.debug('Initialize coils')
-    if isinstance(coils, dict) and len(coils) > 0:
-        # log.debug('using dictionary from configuration file:')
-        # log.debug(coils)
-        co = ModbusSparseDataBlock(coils)
-    else:
-        # log.debug('set all registers to 0xbb')
-        # co = ModbusSequentialDataBlock(0x00, [0xbb]*65536)
-        log.debug('set all registers to 0x00')
-        co = ModbusSequentialDataBlock.create()
-
-    log.debug('Initialize holding registers')
-    if isinstance(holdingRegisters, dict) and len(holdingRegisters) > 0:
-        # log.debug('using dictionary from configuration file:')
-        # log.debug(holdingRegisters)
-        hr = ModbusSparseDataBlock(holdingRegisters)
-    else:
-        # log.debug('set all registers to 0xcc')
-        # hr = ModbusSequentialDataBlock(0x00, [0xcc]*65536)
-        log.debug('set all registers to 0x00')
-        hr = ModbusSequentialDataBlock.create()
-
-    log.debug('Initialize input registers')
-    if isinstance(inputRegisters, dict) and len(inputRegisters) > 0:
-        # log.debug('using dictionary from configuration file:')
-        # log.debug(inputRegisters)
-        ir = ModbusSparseDataBlock(inputRegisters)
-    else:
-        # log.debug('set all registers to 0xdd')
-        # ir = ModbusSequentialDataBlock(0x00, [0xdd]*65536)
-        log.debug('set all registers to 0x00')
-        ir = ModbusSequentialDataBlock.create()
-
-    store = ModbusSlaveContext(
-        di=di,
-        co=co,
-        hr=hr,
-        ir=ir,
-        zero_mode=zeroMode
-    )
-
-    log.debug('Define Modbus server context')
-    context = ModbusServerContext(slaves=store, single=True)
+    @param generators: list(), RegisterGenerator updating the blocks (default: None)
+    @param tickRate: float, generator ticks per second (default: 1.0)
+    @param faults: dict(), FaultInjector by unit id by (IP address, TCP port) (default: None)
+    @param statistics: dict(), the statistics section: interval of the log line in seconds, listener of the stats endpoint (default: None, no statistics)
+    """
+    faults = faults or dict()
+    counters = RequestStatistics() if statistics is not None else None
 
     # ----------------------------------------------------------------------- #
     # initialize the server information
@@ -134,29 +623,151 @@ def run_server(listener_address='0.0.0.0', listener_port=5020, tls_cert=None,
     startTLS = False
     if tls_cert and tls_key and os.path.isfile(tls_cert) and os.path.isfile(
         tls_key): startTLS = True
-
+    elif tls_cert or tls_key:
+        log.warning('TLS certificate or private key not found, starting without TLS: '
+                    + str(tls_cert) + ', ' + str(tls_key))
     if startTLS:
-        log.info(
-            'Starting Modbus TCP server with TLS on ' + listener_address + ':' + str(
-                listener_port))
-        StartTlsServer(context=context, identity=identity, certfile=tls_cert,
-                       keyfile=tls_key,
-                       address=(listener_address, listener_port))
-    else:
-        log.info(
-            'Starting Modbus TCP server on ' + listener_address + ':' + str(
-                listener_port))
-        StartTcpServer(context=context, identity=identity,
-                       address=(listener_address, listener_port))
-        # TCP with different framer
-        # StartTcpServer(context, identity=identity, framer=ModbusRtuFramer, address=(listener_address, listener_port))
+        # fail at start-up rather than on the first connection
+        try:
+            ssl.create_default_context(ssl.Purpose.CLIENT_AUTH).load_cert_chain(
+                certfile=tls_cert, keyfile=tls_key)
+        except (ssl.SSLError, OSError) as e:
+            log.error('TLS certificate or private key invalid: ' + str(e))
+            sys.exit(1)
+
+    tasks = list()
+    if generators:
+        tasks.append(runGenerators(generators, tickRate))
+    if counters is not None:
+        if statistics.get('interval'):
+            tasks.append(runStatistics(counters, statistics['interval']))
+        if statistics.get('listenerPort'):
+            tasks.append(serveStatistics(counters,
+                                         statistics.get('listenerAddress', '127.0.0.1'),
+                                         statistics['listenerPort']))
+
+    servers = list()
+    for (listener_address, listener_port), context in listeners.items():
+        if startTLS:
+            log.info(
+                'Starting Modbus TCP server with TLS on ' + listener_address + ':' + str(
+                    listener_port))
+            servers.append(SimulatorTlsServer(context, faults.get((listener_address, listener_port)),
+                                           counters, identity=identity,
+                                           certfile=tls_cert, keyfile=tls_key,
+                                           address=(listener_address, listener_port)))
+        else:
+            log.info(
+                'Starting Modbus TCP server on ' + listener_address + ':' + str(
+                    listener_port))
+            servers.append(SimulatorTcpServer(context, faults.get((listener_address, listener_port)),
+                                           counters, identity=identity,
+                                           address=(listener_address, listener_port)))
+            # TCP with different framer
+            # ModbusTcpServer(context, framer=ModbusRtuFramer, identity=identity, address=(listener_address, listener_port))
+    await asyncio.gather(*tasks, *[server.serve_forever() for server in servers])
+
+
+def expandRange(value):
+    """
+    Function to expand a single value, a range 'first-last' or a list of both
+    @param value: integer, string or list(), e.g. 5020, '1-10', ['127.0.0.40-127.0.0.49']
+    @return: list(), the values, IP addresses as strings
+    """
+    if isinstance(value, list):
+        return ([v for item in value for v in expandRange(item)])
+    if isinstance(value, str) and '-' in value:
+        first, last = value.split('-', 1)
+        if '.' in first:  # IP address range
+            first, last = ipaddress.ip_address(first), ipaddress.ip_address(last)
+            return ([str(first + i) for i in range(int(last) - int(first) + 1)])
+        return (list(range(int(first, 0), int(last, 0) + 1)))
+    if isinstance(value, str) and '.' not in value:
+        return ([int(value, 0)])
+    return ([value])
+
+
+def createBlocks(registers):
+    """
+    Function to create the register blocks of a device
+    @param registers: dict(), the registers section, loaded from json file
+    @return: dict(), ModbusArrayDataBlock by block name
+    """
+    # be sure the data types within the dictionaries are correct (json will only allow strings as keys)
+    initializeUndefinedRegisters = registers['initializeUndefinedRegisters']
+    images = registers.get('images', dict())
+    return ({
+        block: createDataBlock(
+            prepareRegister(registers.get(block, dict())),
+            initializeUndefinedRegisters, typecode, images.get(block))
+        for block, typecode in (('discreteInput', 'B'), ('coils', 'B'),
+                                ('holdingRegister', 'H'), ('inputRegister', 'H'))
+    })
+
+
+def createDevices(config):
+    """
+    Function to create the simulated devices. Each entry of section devices is
+    expanded to all combinations of its listener addresses, ports and unit ids.
+    An entry may override the sections registers, generators and faults,
+    each device gets its own copy of the register blocks and its own seeded
+    fault injector. Without section devices, one device answering all unit
+    ids is served on the listener of section server
+    @param config: dict(), the configuration, loaded from json file
+    @return: dict(), ModbusServerContext by (IP address, TCP port), list(), RegisterGenerator, dict(), FaultInjector by unit id by (IP address, TCP port)
+    """
+    entries = config.get('devices')
+    single = entries is None
+    if single:
+        entries = [{'listenerAddress': config['server']['listenerAddress'],
+                    'listenerPort': config['server']['listenerPort'],
+                    'unitId': 0}]
+    slaves = dict()
+    generators = list()
+    faults = dict()
+    rng = random.Random(config.get('generators', dict()).get('seed'))
+    for entry in entries:
+        registers = entry.get('registers', config['registers'])
+        generatorConfig = entry.get('generators', config.get('generators', dict()))
+        faultConfig = entry.get('faults', config.get('faults'))
+        templates = createBlocks(registers)
+        for address in expandRange(entry['listenerAddress']):
+            for port in expandRange(entry['listenerPort']):
+                for unit in expandRange(entry.get('unitId', 1)):
+                    if unit in slaves.setdefault((address, port), dict()):
+                        log.error('Duplicate device: ' + address + ':' + str(port) + '/' + str(unit))
+                        sys.exit(1)
+                    blocks = {name: block.copy() for name, block in templates.items()}
+                    generators += createGenerators(generatorConfig, blocks, rng)
+                    slaves[(address, port)][unit] = ModbusSlaveContext(
+                        di=blocks['discreteInput'],
+                        co=blocks['coils'],
+                        hr=blocks['holdingRegister'],
+                        ir=blocks['inputRegister'],
+                        zero_mode=registers['zeroMode']
+                    )
+                    if faultConfig:
+                        seed = faultConfig.get('seed')
+                        if seed is not None:  # one reproducible sequence per device
+                            seed = str(seed) + '/' + address + ':' + str(port) + '/' + str(unit)
+                        faults.setdefault((address, port), dict())[unit] = FaultInjector(
+                            faultConfig, seed, registers['zeroMode'])
+    log.info('Simulating ' + str(sum(len(units) for units in slaves.values())) +
+             ' device(s) on ' + str(len(slaves)) + ' listener(s)')
+
+    log.debug('Define Modbus server context')
+    listeners = {
+        listener: ModbusServerContext(slaves=units[0], single=True) if single
+        else ModbusServerContext(slaves=units, single=False)
+        for listener, units in slaves.items()
+    }
+    return (listeners, generators, faults)
 
 
-def prepareRegister(register, initializeUndefinedRegisters=False):
+def prepareRegister(register):
     """
     Function to prepare the register to have the correct data types
     @param register: dict(), the register dictionary, loaded from json file
-    @param initializeUndefinedRegisters: boolean, fill undefined registers with 0x00 (default: False)
     @return: dict(), register with correct data types
     """
     outRegister = dict()
@@ -184,16 +795,57 @@ def prepareRegister(register, initializeUndefinedRegisters=False):
                 type(valOut)) + ')')
         outRegister[keyOut] = valOut
 
-    if initializeUndefinedRegisters:
-        log.debug('  Fill undefined registers with 0x00')
-        for r in range(0, 65536, 1):
-            if r not in outRegister:
-                # log.debug('  Initialize address: ' + str(r) + ' with 0')
-                outRegister[r] = 0
-
     return (outRegister)
 
 
+def loadImage(imageFile, typecode='H'):
+    """
+    Function to load a binary register image, starting at address 0. Registers
+    are stored as 16 bit big-endian words, bits as one byte each
+    @param imageFile: string, path to image file, relative to the configuration file
+    @param typecode: string, 'H' for registers, 'B' for bits (default: 'H')
+    @return: array, the values
+    """
+    if not os.path.isabs(imageFile):
+        imageFile = os.path.join(os.path.dirname(os.path.abspath(config_file)),
+                                 imageFile)
+    values = array(typecode)
+    with open(imageFile, 'rb') as f:
+        values.frombytes(f.read())
+    if typecode == 'H' and sys.byteorder == 'little':
+        values.byteswap()
+    log.debug('  Loaded ' + str(len(values)) + ' values from image: ' + imageFile)
+    return (values)
+
+
+def createDataBlock(register, initializeUndefinedRegisters=False,
+                    typecode='H', imageFile=None):
+    """
+    Function to create the compact datastore of a register block
+    @param register: dict(), addresses and their values, see prepareRegister
+    @param initializeUndefinedRegisters: boolean, undefined registers read 0x00, otherwise they are invalid (default: False)
+    @param typecode: string, 'H' for registers, 'B' for bits (default: 'H')
+    @param imageFile: string, path to binary register image (default: None)
+    @return: ModbusArrayDataBlock
+    """
+    values = loadImage(imageFile, typecode) if imageFile else array(typecode)
+    defined = None
+    if not initializeUndefinedRegisters and (register or imageFile):
+        defined = bytearray(b'\x01') * len(values)
+
+    length = max(max(register, default=-1) + 1, len(values))
+    if length > len(values):
+        values.extend(array(typecode, [0]) * (length - len(values)))
+    if defined is not None and length > len(defined):
+        defined.extend(bytes(length - len(defined)))
+    for address, value in register.items():
+        values[address] = (1 if value else 0) if typecode == 'B' else value
+        if defined is not None:
+            defined[address] = 1
+
+    return (ModbusArrayDataBlock(typecode, values, defined))
+
+
 """
 ###############################################################################
 # M A I N
@@ -232,32 +884,19 @@ elif CONFIG['server']['logging']['logLevel'].lower() == 'error':
 else:
     log.setLevel(logging.INFO)
 
-# be sure the data types within the dictionaries are correct (json will only allow strings as keys)
-discreteInputs = prepareRegister(CONFIG['registers']['discreteInput'],
-                                 CONFIG['registers'][
-                                     'initializeUndefinedRegisters'])
-coils = prepareRegister(CONFIG['registers']['coils'],
-                        CONFIG['registers']['initializeUndefinedRegisters'])
-holdingRegisters = prepareRegister(CONFIG['registers']['holdingRegister'],
-                                   CONFIG['registers'][
-                                       'initializeUndefinedRegisters'])
-inputRegisters = prepareRegister(CONFIG['registers']['inputRegister'],
-                                 CONFIG['registers'][
-                                     'initializeUndefinedRegisters'])
+listeners, generators, faults = createDevices(CONFIG)
 
 # start the server
 log.info('Starting Modbus TCP Server, v' + str(VERSION))
 # try to get the interface IP address
 localIPAddr = get_ip_address()
 if localIPAddr != '': log.info('Outbund device IP address is: ' + localIPAddr)
-run_server(
-    listener_address=CONFIG['server']['listenerAddress'],
-    listener_port=CONFIG['server']['listenerPort'],
-    tls_cert=CONFIG['server']['tlsParams']['privateKey'],
-    tls_key=CONFIG['server']['tlsParams']['certificate'],
-    zeroMode=CONFIG['registers']['zeroMode'],
-    discreteInputs=discreteInputs,
-    coils=coils,
-    holdingRegisters=holdingRegisters,
-    inputRegisters=inputRegisters
-)
+asyncio.run(run_server(
+    listeners,
+    tls_cert=CONFIG['server']['tlsParams']['certificate'],
+    tls_key=CONFIG['server']['tlsParams']['privateKey'],
+    generators=generators,
+    tickRate=CONFIG.get('generators', dict()).get('tickRate', 1.0),
+    faults=faults,
+    statistics=CONFIG['server'].get('statistics')
+))